@@ -1,39 +1,39 @@
-from util.HomePage import getHomePageAttendance, getHomePageCGPA
+from util.SessionPool import getPooledHomePageAttendance, discardPooledSessions, session_pool
+from util.SessionPool import getPooledHomePageAttendanceAsync, getPooledHomePageCGPAAsync, PortalLogins
+from util.AsyncPortal import closePortalTransport
+from util.PortalUrls import portalUrl
+from util.Metrics import metrics, span, timed, collectSpans, logSlowRequest, TimedJSONResponse, PROMETHEUS_CONTENT_TYPE
+from util.ResponseCache import response_cache, stale_kinds, collectStaleKinds
+from util.CircuitBreaker import portal_breaker, PortalUnavailable, PortalError
+from util.AttendanceSync import attendance_snapshots, etagMatches
+from util.LoginTokens import cgpa_login_tokens
+from util.CourseCache import course_map_cache
+from util.PortalLimiter import portal_limiter
+from util.SingleFlight import single_flight
 from util.Attendance import *
-from util.Feedback import auto_feedback_task
-from util.Cgpa import getStudentCourses, getCompletedSemester, getCGPA
-from util.Timetable import getExamSchedule
-from util.Internals import getInternals, getTargetScore, calculateTarget
-import pandas as pd
+from util.Feedback import auto_feedback_task, browser_pool, FEEDBACK_DISABLED
+from util.BrowserPool import BROWSER_POOL_PREWARM
+from util.FeedbackQueue import createFeedbackQueue
+from util.Cgpa import getStudentCoursesAsync, getCompletedSemesterAsync
+from util.Cgpa import getSemesterTotals, getSemesterRecords, projectCGPA
+from util.Timetable import getExamScheduleAsync
+from util.Internals import getTargetScore, getInternalsAsync, GRADE_BOUNDARIES
+from util.Records import toRecords
 import os
 import traceback
 import logging
 import base64
 import json
 import asyncio
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
-from fastapi.responses import JSONResponse
+import threading
+import time
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.exceptions import RequestValidationError
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
-import pytz
-from bs4 import BeautifulSoup
-
-# Setup logging
-logging.basicConfig(level=logging.WARNING)  # Default to WARNING, will be updated after env vars
-logger = logging.getLogger("nimora-api")
-import logging
-import base64
-import json
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
-from fastapi.responses import JSONResponse
-from fastapi.exceptions import RequestValidationError
-from pydantic import BaseModel
-from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
-import pytz
-from bs4 import BeautifulSoup
+from datetime import datetime, timezone
 
 # Setup logging
 logging.basicConfig(level=logging.WARNING)  # Default to WARNING, will be updated after env vars
@@ -42,6 +42,7 @@ logger = logging.getLogger("nimora-api")
 # Payload security utilities
 class PayloadSecurity:
     @staticmethod
+    @timed("decode")
     def decode_payload(encoded_data):
         try:
             # Ensure encoded_data is a string
@@ -83,11 +84,57 @@ IS_VERCEL = DEPLOYMENT_ENV != "development"
 # Security configuration
 PAYLOAD_SALT = os.environ.get("PAYLOAD_SALT", "nimora_secure_payload_2025")  # Default for development
 
+# Latency budgets for /data in seconds, for the request as a whole and for each section
+DATA_REQUEST_BUDGET = float(os.environ.get("DATA_REQUEST_BUDGET", "20"))
+DATA_SECTION_BUDGETS = {
+    "attendance": float(os.environ.get("DATA_BUDGET_ATTENDANCE", "15")),
+    "cgpa":       float(os.environ.get("DATA_BUDGET_CGPA", "15")),
+    "timetable":  float(os.environ.get("DATA_BUDGET_TIMETABLE", "15")),
+    "internals":  float(os.environ.get("DATA_BUDGET_INTERNALS", "15")),
+    "user_info":  float(os.environ.get("DATA_BUDGET_USER_INFO", "10")),
+}
+
+# Limits for /attendance/batch: students per request and students scraped at once
+BATCH_MAX_STUDENTS = int(os.environ.get("BATCH_MAX_STUDENTS", "200"))
+BATCH_CONCURRENCY  = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+
 # Update logging level based on environment
 log_level = os.environ.get("LOG_LEVEL", "WARNING" if DEPLOYMENT_ENV == "production" else "INFO")
 logging.getLogger().setLevel(getattr(logging, log_level.upper()))
 
-app = FastAPI()
+# Responses are rendered through TimedJSONResponse so serialization shows up as a stage in /metrics
+app = FastAPI(default_response_class=TimedJSONResponse)
+
+# Feedback jobs run on a capped number of worker threads instead of the web worker.
+# The queue opens its job store and marks unfinished jobs abandoned, so importing app
+# must not create it: startup does, or the first request that needs it where no startup runs
+feedback_queue = None
+feedback_queue_lock = threading.Lock()
+
+def get_feedback_queue():
+    global feedback_queue
+    with feedback_queue_lock:
+        if feedback_queue is None:
+            feedback_queue = createFeedbackQueue(auto_feedback_task)
+        return feedback_queue
+
+@app.on_event("startup")
+async def start_feedback_queue():
+    get_feedback_queue()
+
+@app.on_event("startup")
+async def prewarm_browsers():
+    # Launch feedback browsers in the background so the first jobs skip Chrome startup
+    if BROWSER_POOL_PREWARM > 0 and not FEEDBACK_DISABLED:
+        threading.Thread(target=browser_pool.prewarm, daemon=True).start()
+
+@app.on_event("shutdown")
+async def close_portal_connections():
+    # Release the keep-alive connections shared by the async portal clients
+    await closePortalTransport()
+    if feedback_queue is not None:
+        feedback_queue.shutdown()
+    browser_pool.shutdown()
 
 # Request/Response logging middleware
 @app.middleware("http")
@@ -96,18 +143,42 @@ async def log_requests(request: Request, call_next):
     logger.info(f"Sending Request to the Target: {request.method} {request.url.path}")
     
     try:
+        # Note which cached kinds get served stale while the portal is down
+        stale = collectStaleKinds()
+        
+        # Time the request and each stage of it for /metrics and the slow request log
+        spans = collectSpans()
+        started = time.perf_counter()
+        
         # Process the request
         response = await call_next(request)
+        if stale:
+            response.headers["X-Data-Stale"] = ",".join(sorted(stale))
         
         # Log successful response
         logger.info(f"Received Response from the Target: {response.status_code} {request.url.path}")
         
+        # Streamed endpoints do their work while the body is sent, so stop the clock after the last chunk
+        response.body_iterator = observe_request(request, response.body_iterator, started, spans)
         return response
     except Exception as e:
         # Log error response
         logger.error(f"Request failed: {request.method} {request.url.path} - {str(e)}")
         raise
 
+async def observe_request(request, body, started, spans):
+    """
+    Pass the response body through, then record how long the request took including sending it
+    """
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        elapsed = time.perf_counter() - started
+        route = request.scope.get("route")
+        metrics.observeRequest(route.path if route is not None else "unmatched", elapsed)
+        logSlowRequest(request.method, request.url.path, elapsed, spans)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -119,6 +190,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Data-Stale", "Retry-After"],  # Attendance versions, stale data and outage hints
 )
 
 # Custom exception handlers
@@ -132,11 +204,18 @@ async def custom_404_handler(request: Request, exc):
                 "/": "API information",
                 "/login": "DEPRECATED: Use /data instead - Authenticate and get combined data",
                 "/attendance": "Get detailed attendance information",
+                "/attendance/leaves": "Get affordable leaves at several attendance thresholds",
+                "/attendance/batch": "Stream the attendance of many students as NDJSON",
                 "/cgpa": "Get CGPA and semester-wise GPA",
+                "/cgpa/what-if": "Project CGPA for hypothetical grades in pending courses",
                 "/exam-schedule": "Get upcoming exam schedule",
                 "/auto-feedback": "Submit automated feedback",
+                "/auto-feedback/{job_id}": "Get the status of a feedback job",
                 "/internals": "Get internal marks and assessment data",
+                "/internals/targets": "Get end semester marks needed for each grade",
                 "/data": "Get combined data for attendance, timetable, cgpa, internals, and user info",
+                "/data/stream": "Stream the /data sections as NDJSON as soon as each is ready",
+                "/metrics": "Request, stage and portal metrics in the Prometheus text format",
             }
         }
     )
@@ -187,11 +266,31 @@ def health_check():
     """
     return {
         "status": "healthy",
-        "timestamp": datetime.now(pytz.UTC).isoformat(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
         "service": "nimora-api",
         "version": "1.0.0",
-        "environment": DEPLOYMENT_ENV
+        "environment": DEPLOYMENT_ENV,
+        "coalescing": single_flight.stats(),
+        "attendance_snapshots": attendance_snapshots.stats(),
+        "login_tokens": cgpa_login_tokens.stats(),
+        "portal_limiter": portal_limiter.stats(),
+        "portal_breaker": portal_breaker.stats(),
+        "response_cache": response_cache.stats(),
+        "browsers": browser_pool.stats(),
+        "feedback_queue": feedback_queue.stats() if feedback_queue is not None else None
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """
+    Latency histograms per route and per stage, portal status codes and cache hit ratios
+    """
+    caches = {
+        "response": response_cache.stats(),
+        "session_pool": session_pool.stats(),
+        "course_map": course_map_cache.stats()
     }
+    return Response(metrics.render(caches), media_type=PROMETHEUS_CONTENT_TYPE)
 
 class UserCredentials(BaseModel):
     rollno: str
@@ -208,6 +307,152 @@ class FeedbackRequest(BaseModel):
     feedback_index: int = 0  # 0 for endsem, other values for intermediate
 
 
+def read_force_refresh(request):
+    """
+    Whether the client asked to bypass the response cache, sent next to the credentials
+    """
+    options = PayloadSecurity.decode_payload(request['data']) if 'data' in request else request
+    return bool(options.get('force_refresh', False))
+
+def format_attendance(data):
+    # Convert the list of lists to a list of dictionaries for better JSON representation
+    result = []
+    for row in data:
+        total_classes = int(row[1])
+        present = int(row[4])
+        # Correctly calculate absent as total_classes minus present
+        absent = total_classes - present
+        result.append({
+            "course_code": row[0],
+            "total_classes": total_classes,
+            "present": present,
+            "absent": absent,
+            "percentage": row[6]
+        })
+    return result
+
+async def scrape_attendance(client):
+    return format_attendance(await getStudentAttendanceAsync(client))
+
+async def scrape_pooled(rollno, password, scrape, client):
+    """
+    Run a scrape on a student's pooled portal session, dropping their pooled sessions if it fails
+    """
+    try:
+        return await scrape(client)
+    except PortalUnavailable:
+        # The circuit breaker refused the request, the session is as good as it was
+        raise
+    except Exception:
+        # The pooled portal session may have expired mid-scrape, log in afresh next time
+        discardPooledSessions(rollno, password)
+        raise
+
+async def cached_attendance(rollno, password, force_refresh=False):
+    """
+    Attendance rows of a student, served from the response cache and scraped only on a miss or forced refresh
+    """
+    async def load_attendance():
+        client = await getPooledHomePageAttendanceAsync(rollno, password)
+        if not client:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        
+        # Get the attendance data
+        return await scrape_pooled(rollno, password, scrape_attendance, client)
+    
+    return await response_cache.get("attendance", rollno, password, load_attendance, force_refresh)
+
+async def scrape_internals(client):
+    internals_data = await getInternalsAsync(client)
+    return internals_data or []
+
+async def scrape_timetable(client):
+    schedule = await getExamScheduleAsync(client)
+    return toRecords(schedule)
+
+async def scrape_cgpa_totals(client_cgpa):
+    course_data, completed_semester = await asyncio.gather(
+        getStudentCoursesAsync(client_cgpa),
+        getCompletedSemesterAsync(client_cgpa)
+    )
+    return getSemesterTotals(course_data, completed_semester)
+
+async def scrape_cgpa(client_cgpa):
+    return toRecords(getSemesterRecords(await scrape_cgpa_totals(client_cgpa)))
+
+async def scrape_user_info(client, rollno):
+    # BeautifulSoup and pytz are only needed here, so they load on the first call instead of every cold start
+    from bs4 import BeautifulSoup
+    import pytz
+    
+    # Initialize default response
+    default_response = {"username": rollno, "is_birthday": False}
+    
+    # Try multiple pages to get user info
+    pages_to_try = [
+        portalUrl("/studzone/Scholar/VallalarScholarship"),  # Primary source
+        portalUrl("/studzone/Profile")  # Backup source
+    ]
+    
+    for page_url in pages_to_try:
+        try:
+            page_response = await client.get(page_url, timeout=10)
+            
+            if not page_response.is_success:
+                continue
+            
+            with span("parse:user_info"):
+                page_soup = BeautifulSoup(page_response.text, "html.parser")
+            
+            # Check if we're on the scholarship page
+            if "VallalarScholarship" in page_url:
+                personal_info_table = page_soup.find("td", {"class": "personal-info"})
+                if personal_info_table:
+                    personal_info = personal_info_table.find_all("td")
+                    
+                    # Get username (first item in personal info)
+                    if personal_info and len(personal_info) > 0:
+                        username = personal_info[0].string.strip()
+                        if username and len(username) > 0:
+                            default_response["username"] = username
+                    
+                    # Get birthday (third item in personal info)
+                    if personal_info and len(personal_info) > 2:
+                        try:
+                            birthdate_str = personal_info[2].string.strip()
+                            birthdate = datetime.strptime(birthdate_str, "%d/%m/%Y").date()
+                            
+                            # Get current date in India timezone
+                            IST = pytz.timezone('Asia/Kolkata')
+                            today = datetime.now(IST).date()
+                            
+                            is_birthday = (birthdate.month == today.month and birthdate.day == today.day)
+                            default_response["is_birthday"] = is_birthday
+                        except Exception as e:
+                            pass
+            
+            # Check if we're on the profile page
+            elif "Profile" in page_url and default_response["username"] == rollno:
+                # Try to find username in profile page if we couldn't from scholarship page
+                name_element = page_soup.find("input", {"id": "txtName"})
+                if name_element and name_element.has_attr("value"):
+                    username = name_element["value"].strip()
+                    if username and len(username) > 0:
+                        default_response["username"] = username
+            
+            # If we got a username that's not the roll number, we can stop
+            if default_response["username"] != rollno:
+                break
+                
+        except (PortalError, httpx.TransportError):
+            # The portal failed, so the roll number fallback must not be cached as the student's name
+            raise
+        except Exception as page_error:
+            continue
+    
+    return default_response
+
+
 @app.post("/login")
 async def login(request: dict):
     """
@@ -239,13 +484,17 @@ async def login(request: dict):
         # Return the combined data instead of just attendance
         return combined_data
         
+    except PortalError:
+        # The portal is down or failing and nothing is cached, say so instead of blaming the request
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail="Invalid request format")
 
 @app.post("/attendance")
-def get_attendance(request: dict):
+async def get_attendance(request: dict, http_request: Request):
     """
-    Get raw attendance data for a student
+    Get raw attendance data for a student. The response carries an ETag; send it back
+    as If-None-Match for a 304 when nothing changed, or as "since" for only the changed rows
     """
     try:
         
@@ -255,43 +504,169 @@ def get_attendance(request: dict):
             decoded_data = PayloadSecurity.decode_payload(request['data'])
             rollno = decoded_data.get('rollno')
             password = decoded_data.get('password')
+            since = decoded_data.get('since')
         else:
             # Fallback to old format for backward compatibility
             rollno = request.get('rollno')
             password = request.get('password')
+            since = request.get('since')
         
         if not rollno or not password:
             raise HTTPException(status_code=400, detail="Missing credentials")
         
-        session = getHomePageAttendance(rollno, password)
-        if not session:
-            raise HTTPException(status_code=401, detail="Invalid credentials")
+        attendance = await cached_attendance(rollno, password, read_force_refresh(request))
         
-        # Get the attendance data
-        data = getStudentAttendance(session)
-        
-        # Convert the list of lists to a list of dictionaries for better JSON representation
-        result = []
-        for row in data:
-            total_classes = int(row[1])
-            present = int(row[4])
-            # Correctly calculate absent as total_classes minus present
-            absent = total_classes - present
-            result.append({
-                "course_code": row[0],
-                "total_classes": total_classes,
-                "present": present,
-                "absent": absent,
-                "percentage": row[6]
-            })
-        
-        return result
+        # Version the table so unchanged or barely changed dashboards cost next to nothing
+        version = attendance_snapshots.record(rollno, password, attendance)
+        headers = {"ETag": f'"{version}"'}
+        if etagMatches(http_request.headers.get("if-none-match"), version):
+            return Response(status_code=304, headers=headers)
+        if since:
+            return TimedJSONResponse(attendance_snapshots.delta(rollno, password, attendance, since), headers=headers)
+        return TimedJSONResponse(attendance, headers=headers)
+    except PortalError:
+        # The portal is down or failing and nothing is cached, say so instead of blaming the request
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail="Invalid request format")
 
+def read_batch_student(entry):
+    """
+    Credentials of one student in an /attendance/batch request, in the encoded or the old format
+    """
+    if not isinstance(entry, dict):
+        raise HTTPException(status_code=400, detail="Invalid request format")
+    credentials = PayloadSecurity.decode_payload(entry['data']) if 'data' in entry else entry
+    rollno = credentials.get('rollno')
+    password = credentials.get('password')
+    if not rollno or not password:
+        raise HTTPException(status_code=400, detail="Missing credentials")
+    return rollno, password
+
+@app.post("/attendance/batch")
+async def get_attendance_batch(request: dict):
+    """
+    Attendance of many students at once, e.g. a whole section for its class representative.
+    Streams NDJSON with one line per student as soon as it is ready, then a final summary line
+    """
+    students = request.get('students')
+    if not isinstance(students, list) or not students:
+        raise HTTPException(status_code=400, detail="Missing students")
+    if len(students) > BATCH_MAX_STUDENTS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_STUDENTS} students per batch")
+    
+    threshold = request.get('threshold', 75)
+    if not isinstance(threshold, (int, float)) or isinstance(threshold, bool) or not 0 < threshold < 100:
+        raise HTTPException(status_code=400, detail="Threshold must be between 0 and 100")
+    force_refresh = read_force_refresh(request)
+    
+    # Students share the session pool, response cache and course map cache like single requests do,
+    # and their portal calls queue fairly per student at the outbound limiter
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    failed = []
+    stale = []
+    
+    async def fetch(index, entry):
+        line = {"index": index}
+        # Note, for this student alone, whether the portal was down and the cache answered
+        stale_for_student = collectStaleKinds()
+        try:
+            async with slots:
+                rollno, password = read_batch_student(entry)
+                line["rollno"] = rollno
+                attendance = await cached_attendance(rollno, password, force_refresh)
+            line.update({
+                "status": "success",
+                "stale": bool(stale_for_student),
+                "version": attendance_snapshots.record(rollno, password, attendance),
+                "below_threshold": [row["course_code"] for row in attendance
+                                    if float(row["percentage"]) < threshold],
+                "data": attendance
+            })
+        except Exception as e:
+            logger.error(f"Error fetching attendance in batch: {e}")
+            line.update({
+                "status": "error",
+                "stale": False,
+                "status_code": e.status_code if isinstance(e, HTTPException) else 500,
+                "detail": e.detail if isinstance(e, HTTPException) else "Error retrieving attendance"
+            })
+        return line
+    
+    async def lines():
+        tasks = [asyncio.ensure_future(fetch(index, entry)) for index, entry in enumerate(students)]
+        try:
+            # Flush each student the moment they complete, in whatever order that is
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                if line["status"] == "error":
+                    failed.append(line["index"])
+                elif line["stale"]:
+                    stale.append(line["index"])
+                with span("serialize"):
+                    encoded = json.dumps(line)
+                yield encoded + "\n"
+            
+            yield json.dumps({"status": "success", "done": True, "students": len(students),
+                              "succeeded": len(students) - len(failed), "failed": sorted(failed),
+                              "stale": sorted(stale)}) + "\n"
+        finally:
+            # The client went away, stop scraping for it
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+# Thresholds used by /attendance/leaves when the request does not list any
+DEFAULT_LEAVE_THRESHOLDS = [65, 75, 80, 85]
+MAX_LEAVE_THRESHOLDS = 50
+
+@app.post("/attendance/leaves")
+async def get_affordable_leaves(request: dict):
+    """
+    Get the classes each course can skip at several attendance thresholds at once,
+    sent as "thresholds": [65, 75, 80, 85]
+    """
+    try:
+        # Check if this is the new encoded format or old format
+        if 'data' in request:
+            # Decode the encoded payload
+            decoded_data = PayloadSecurity.decode_payload(request['data'])
+            rollno = decoded_data.get('rollno')
+            password = decoded_data.get('password')
+            thresholds = decoded_data.get('thresholds', DEFAULT_LEAVE_THRESHOLDS)
+        else:
+            # Fallback to old format for backward compatibility
+            rollno = request.get('rollno')
+            password = request.get('password')
+            thresholds = request.get('thresholds', DEFAULT_LEAVE_THRESHOLDS)
+
+        if not rollno or not password:
+            raise HTTPException(status_code=400, detail="Missing credentials")
+
+        if (not isinstance(thresholds, list) or not 0 < len(thresholds) <= MAX_LEAVE_THRESHOLDS
+                or not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in thresholds)):
+            raise HTTPException(status_code=400,
+                               detail=f"thresholds must be a list of 1 to {MAX_LEAVE_THRESHOLDS} percentages")
+        if not all(0 < value < 100 for value in thresholds):
+            raise HTTPException(status_code=400, detail="thresholds must be between 0 and 100")
+
+        # Shares the cached attendance with /attendance and /data
+        attendance = await cached_attendance(rollno, password, read_force_refresh(request))
+
+        courses = [(row["course_code"], row["present"], row["total_classes"]) for row in attendance]
+        return toRecords(getAffordableLeavesTable(courses, thresholds))
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error in /attendance/leaves endpoint: {e}")
+        raise HTTPException(status_code=500,
+                           detail="Error calculating affordable leaves. Please try again or contact support if the issue persists.")
+
 @app.post("/auto-feedback")
-async def auto_feedback(request: dict, background_tasks: BackgroundTasks):
-    """API endpoint to trigger auto-feedback process"""
+async def auto_feedback(request: dict):
+    """API endpoint to queue the auto-feedback process, polled at /auto-feedback/{job_id}"""
     try:
         # Check if this is the new encoded format or old format
         if 'data' in request:
@@ -309,14 +684,36 @@ async def auto_feedback(request: dict, background_tasks: BackgroundTasks):
         if not rollno or not password:
             raise HTTPException(status_code=400, detail="Missing credentials")
         
-        # Start feedback task in the background
-        background_tasks.add_task(auto_feedback_task, feedback_index, rollno, password)
-        return {"status": "started", "message": "Feedback automation started in background"}
+        if FEEDBACK_DISABLED:
+            raise HTTPException(status_code=503, 
+                               detail="Feedback automation is currently disabled. Please try again later or contact support.")
+        
+        # Queue the feedback job, the workers pick it up in order
+        job_id = get_feedback_queue().submit(int(feedback_index), rollno, password)
+        return {
+            "status": "queued",
+            "job_id": job_id,
+            "message": "Feedback automation queued. Check its progress with the job id."
+        }
+    except HTTPException as he:
+        if he.status_code == 503:
+            raise he
+        raise HTTPException(status_code=400, detail="Invalid request format")
     except Exception as e:
         raise HTTPException(status_code=400, detail="Invalid request format")
 
+@app.get("/auto-feedback/{job_id}")
+def auto_feedback_status(job_id: str):
+    """
+    Get the status of a queued feedback job: queued, running, succeeded or failed
+    """
+    job = get_feedback_queue().status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Feedback job not found")
+    return job
+
 @app.post("/cgpa")
-def get_cgpa(request: dict):
+async def get_cgpa(request: dict):
     """
     Get CGPA and GPA data for a student
     """
@@ -335,29 +732,30 @@ def get_cgpa(request: dict):
         if not rollno or not password:
             raise HTTPException(status_code=400, detail="Missing credentials")
         
-        session = getHomePageCGPA(rollno, password)
-        if not session:
-            raise HTTPException(status_code=401, detail="Invalid credentials")
+        async def scrape_cgpa_or_empty(client_cgpa):
+            try:
+                return await scrape_cgpa(client_cgpa)
+            except HTTPException as he:
+                # For students with no course data, return an empty array
+                # instead of a placeholder semester
+                if he.status_code == 404 and ("No completed courses found" in he.detail or 
+                                              "Could not find completed courses data" in he.detail):
+                    # Return empty array for new students
+                    return []
+                # Re-raise other HTTP exceptions
+                raise he
         
-        try:
-            # Get course data and completed semester
-            course_data = getStudentCourses(session)
-            completed_semester = getCompletedSemester(session)
-            
-            # Calculate CGPA
-            cgpa_data = getCGPA(course_data, completed_semester)
+        async def load_cgpa():
+            client_cgpa = await getPooledHomePageCGPAAsync(rollno, password)
+            if not client_cgpa:
+                raise HTTPException(status_code=401, detail="Invalid credentials")
             
-            # Return the CGPA data as JSON
-            return cgpa_data.to_dict(orient='records')
-        except HTTPException as he:
-            # For students with no course data, return an empty array
-            # instead of a placeholder semester
-            if he.status_code == 404 and ("No completed courses found" in he.detail or 
-                                          "Could not find completed courses data" in he.detail):
-                # Return empty array for new students
-                return []
-            # Re-raise other HTTP exceptions
-            raise he
+            # Get course data and completed semester, then calculate CGPA
+            return await scrape_pooled(rollno, password, scrape_cgpa_or_empty, client_cgpa)
+        
+        # Serve from the response cache, scraping only on a miss or forced refresh
+        return await response_cache.get("cgpa", rollno, password, load_cgpa,
+                                        read_force_refresh(request))
             
     except HTTPException as he:
         # Re-raise HTTP exceptions
@@ -366,8 +764,59 @@ def get_cgpa(request: dict):
         raise HTTPException(status_code=500, 
                            detail=f"Error calculating CGPA. Please try again or contact support if the issue persists.")
 
+@app.post("/cgpa/what-if")
+async def get_cgpa_what_if(request: dict):
+    """
+    Project the CGPA for hypothetical grades in pending courses,
+    sent as "courses": [{"grade": "A+", "credits": 3}, ...]
+    """
+    try:
+        # Check if this is the new encoded format or old format
+        if 'data' in request:
+            # Decode the encoded payload
+            decoded_data = PayloadSecurity.decode_payload(request['data'])
+            rollno = decoded_data.get('rollno')
+            password = decoded_data.get('password')
+            courses = decoded_data.get('courses', [])
+        else:
+            # Fallback to old format for backward compatibility
+            rollno = request.get('rollno')
+            password = request.get('password')
+            courses = request.get('courses', [])
+
+        if not rollno or not password:
+            raise HTTPException(status_code=400, detail="Missing credentials")
+
+        try:
+            pending_courses = [(course['grade'], course['credits']) for course in courses]
+        except (KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Each course needs a grade and credits")
+
+        async def load_cgpa_totals():
+            client_cgpa = await getPooledHomePageCGPAAsync(rollno, password)
+            if not client_cgpa:
+                raise HTTPException(status_code=401, detail="Invalid credentials")
+
+            return await scrape_pooled(rollno, password, scrape_cgpa_totals, client_cgpa)
+
+        # The semester totals are cached, so each projection is only a few additions
+        totals = await response_cache.get("cgpa_totals", rollno, password, load_cgpa_totals,
+                                          read_force_refresh(request))
+
+        try:
+            return projectCGPA(totals, pending_courses)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error in /cgpa/what-if endpoint: {e}")
+        raise HTTPException(status_code=500,
+                           detail=f"Error projecting CGPA. Please try again or contact support if the issue persists.")
+
 @app.post("/internals")
-def get_internals(request: dict):
+async def get_internals(request: dict):
     """
     Get internal marks and continuous assessment data
     """
@@ -386,25 +835,26 @@ def get_internals(request: dict):
         if not rollno or not password:
             raise HTTPException(status_code=400, detail="Missing credentials")
         
-        session = getHomePageAttendance(rollno, password)
-        if not session:
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-        
-        try:
-            # Get internal marks data
-            internals_data = getInternals(session)
-            
-            if not internals_data:
-                raise HTTPException(status_code=404, detail="No internal marks data found")
+        async def load_internals():
+            client = await getPooledHomePageAttendanceAsync(rollno, password)
+            if not client:
+                raise HTTPException(status_code=401, detail="Invalid credentials")
             
-            # Return the internals data
-            return {
-                "internals": internals_data,
-                "message": "Internal marks data retrieved successfully"
-            }
-            
-        except HTTPException as he:
-            raise he
+            # Get internal marks data
+            return await scrape_pooled(rollno, password, scrape_internals, client)
+        
+        # Serve from the response cache, scraping only on a miss or forced refresh
+        internals_data = await response_cache.get("internals", rollno, password, load_internals,
+                                                  read_force_refresh(request))
+        
+        if not internals_data:
+            raise HTTPException(status_code=404, detail="No internal marks data found")
+        
+        # Return the internals data
+        return {
+            "internals": internals_data,
+            "message": "Internal marks data retrieved successfully"
+        }
             
     except HTTPException as he:
         # Re-raise HTTP exceptions
@@ -413,6 +863,73 @@ def get_internals(request: dict):
         raise HTTPException(status_code=500, 
                            detail=f"Error retrieving internal marks. Please try again or contact support if the issue persists.")
 
+@app.post("/internals/targets")
+async def get_internal_targets(request: dict):
+    """
+    Get the end semester marks each course needs to pass and to reach every grade,
+    or the grades named in "grades": ["O", "A+"]
+    """
+    try:
+        # Check if this is the new encoded format or old format
+        if 'data' in request:
+            # Decode the encoded payload
+            decoded_data = PayloadSecurity.decode_payload(request['data'])
+            rollno = decoded_data.get('rollno')
+            password = decoded_data.get('password')
+            grades = decoded_data.get('grades', list(GRADE_BOUNDARIES))
+        else:
+            # Fallback to old format for backward compatibility
+            rollno = request.get('rollno')
+            password = request.get('password')
+            grades = request.get('grades', list(GRADE_BOUNDARIES))
+        
+        if not rollno or not password:
+            raise HTTPException(status_code=400, detail="Missing credentials")
+        
+        if not isinstance(grades, list) or not grades or any(grade not in GRADE_BOUNDARIES for grade in grades):
+            raise HTTPException(status_code=400,
+                               detail=f"grades must be a list of {', '.join(GRADE_BOUNDARIES)}")
+        
+        async def load_internals():
+            client = await getPooledHomePageAttendanceAsync(rollno, password)
+            if not client:
+                raise HTTPException(status_code=401, detail="Invalid credentials")
+            
+            return await scrape_pooled(rollno, password, scrape_internals, client)
+        
+        # Shares the cached internal marks with /internals and /data
+        internals_data = await response_cache.get("internals", rollno, password, load_internals,
+                                                  read_force_refresh(request))
+        
+        if not internals_data:
+            raise HTTPException(status_code=404, detail="No internal marks data found")
+        
+        # Every grade of every course in one pass over the marks
+        targets = []
+        for row in getTargetScore(internals_data, [GRADE_BOUNDARIES[grade] for grade in grades]):
+            if len(row) < 4:
+                # Marks not entered yet
+                targets.append({"course_code": row[0], "internal": "*", "pass": "*", "targets": None})
+            else:
+                targets.append({
+                    "course_code": row[0],
+                    "internal": row[1],
+                    "pass": row[2],
+                    "targets": dict(zip(grades, row[3]))
+                })
+        
+        return {
+            "targets": targets,
+            "message": "Target marks calculated successfully"
+        }
+            
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error in /internals/targets endpoint: {e}")
+        raise HTTPException(status_code=500, 
+                           detail=f"Error calculating target marks. Please try again or contact support if the issue persists.")
+
 @app.post("/diagnose-cgpa")
 def diagnose_cgpa(request: dict):
     """
@@ -433,12 +950,12 @@ def diagnose_cgpa(request: dict):
         if not rollno or not password:
             raise HTTPException(status_code=400, detail="Missing credentials")
         
-        session = getHomePageAttendance(rollno, password)
+        session = getPooledHomePageAttendance(rollno, password)
         if not session:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
         # Get the courses page and check the HTML
-        courses_page_url = "https://ecampus.psgtech.ac.in/studzone2/AttWfStudCourseSelection.aspx"
+        courses_page_url = portalUrl("/studzone2/AttWfStudCourseSelection.aspx")
         courses_page = session.get(courses_page_url)
         
         import re
@@ -465,7 +982,7 @@ def diagnose_cgpa(request: dict):
         raise HTTPException(status_code=500, detail=f"Diagnostic error: {str(e)}")
 
 @app.post("/exam-schedule")
-def get_exam_schedule(request: dict):
+async def get_exam_schedule(request: dict):
     """
     Get the exam schedule for the student
     """
@@ -484,31 +1001,31 @@ def get_exam_schedule(request: dict):
         if not rollno or not password:
             raise HTTPException(status_code=400, detail="Missing credentials")
         
-        session = getHomePageAttendance(rollno, password)
-        if not session:
-            raise HTTPException(status_code=401, detail="Invalid credentials")
+        async def load_timetable():
+            client = await getPooledHomePageAttendanceAsync(rollno, password)
+            if not client:
+                raise HTTPException(status_code=401, detail="Invalid credentials")
+            
+            # Get the exam schedule
+            return await scrape_pooled(rollno, password, scrape_timetable, client)
         
-        # Get the exam schedule
-        schedule = getExamSchedule(session)
+        # Serve from the response cache, scraping only on a miss or forced refresh
+        exams = await response_cache.get("timetable", rollno, password, load_timetable,
+                                         read_force_refresh(request))
         
-        # Check if schedule is a DataFrame 
-        if isinstance(schedule, pd.DataFrame):
-            # Check if it's empty
-            if schedule.empty:
-                return {"exams": [], "message": "No upcoming exams found."}
-            else:
-                # Convert DataFrame to dict for JSON serialization
-                return {"exams": schedule.to_dict(orient='records')}
-        else:
-            # Handle non-DataFrame return (like empty list)
+        if not exams:
             return {"exams": [], "message": "No upcoming exams found."}
+        return {"exams": exams}
         
+    except PortalError:
+        # The portal is down or failing and nothing is cached, say so instead of blaming the request
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, 
                           detail=f"Error retrieving exam schedule. Please try again or contact support if the issue persists.")
 
 @app.post("/user-info")
-def get_user_info(request: dict):
+async def get_user_info(request: dict):
     """
     Get user information for personalized greetings
     """
@@ -528,72 +1045,15 @@ def get_user_info(request: dict):
         if not rollno or not password:
             raise HTTPException(status_code=400, detail="Missing credentials")
         
-        session = getHomePageAttendance(rollno, password)
-        if not session:
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-        
-        # Initialize default response
-        default_response = {"username": rollno, "is_birthday": False}
+        async def load_user_info():
+            client = await getPooledHomePageAttendanceAsync(rollno, password)
+            if not client:
+                raise HTTPException(status_code=401, detail="Invalid credentials")
+            return await scrape_user_info(client, rollno)
         
-        # Try multiple pages to get user info
-        pages_to_try = [
-            "https://ecampus.psgtech.ac.in/studzone/Scholar/VallalarScholarship",  # Primary source
-            "https://ecampus.psgtech.ac.in/studzone/Profile"  # Backup source
-        ]
-        
-        for page_url in pages_to_try:
-            try:
-                page_response = session.get(page_url, timeout=10)  # Add timeout
-                
-                if not page_response.ok:
-                    continue
-                
-                page_soup = BeautifulSoup(page_response.text, "html.parser")
-                
-                # Check if we're on the scholarship page
-                if "VallalarScholarship" in page_url:
-                    personal_info_table = page_soup.find("td", {"class": "personal-info"})
-                    if personal_info_table:
-                        personal_info = personal_info_table.find_all("td")
-                        
-                        # Get username (first item in personal info)
-                        if personal_info and len(personal_info) > 0:
-                            username = personal_info[0].string.strip()
-                            if username and len(username) > 0:
-                                default_response["username"] = username
-                        
-                        # Get birthday (third item in personal info)
-                        if personal_info and len(personal_info) > 2:
-                            try:
-                                birthdate_str = personal_info[2].string.strip()
-                                birthdate = datetime.strptime(birthdate_str, "%d/%m/%Y").date()
-                                
-                                # Get current date in India timezone
-                                IST = pytz.timezone('Asia/Kolkata')
-                                today = datetime.now(IST).date()
-                                
-                                is_birthday = (birthdate.month == today.month and birthdate.day == today.day)
-                                default_response["is_birthday"] = is_birthday
-                            except Exception as e:
-                                pass
-                
-                # Check if we're on the profile page
-                elif "Profile" in page_url and default_response["username"] == rollno:
-                    # Try to find username in profile page if we couldn't from scholarship page
-                    name_element = page_soup.find("input", {"id": "txtName"})
-                    if name_element and name_element.has_attr("value"):
-                        username = name_element["value"].strip()
-                        if username and len(username) > 0:
-                            default_response["username"] = username
-                
-                # If we got a username that's not the roll number, we can stop
-                if default_response["username"] != rollno:
-                    break
-                    
-            except Exception as page_error:
-                continue
-        
-        return default_response
+        # Shares the cached entry and any in-flight scrape with /data
+        return await response_cache.get("user_info", rollno, password, load_user_info,
+                                        read_force_refresh(request))
             
     except Exception as e:
         # Return default response on error instead of raising exception
@@ -601,166 +1061,168 @@ def get_user_info(request: dict):
         username = locals().get('rollno', 'User')
         return {"username": username, "is_birthday": False}
 
+def combined_data_sections(rollno, password, force_refresh=False, attendance_since=None):
+    """
+    Loaders for every /data section sharing one lazy login, a lookup of each section's
+    last cached value, and a check for a failed login
+    """
+    # Log in to each portal once, and only if some of its sections is not served from the cache.
+    # Both logins start together right away instead of the CGPA one waiting its turn
+    logins = PortalLogins(rollno, password)
+    logins.start(
+        attendance=force_refresh or not all(response_cache.isFresh(kind, rollno, password)
+                                            for kind in ("attendance", "timetable", "internals", "user_info")),
+        cgpa=force_refresh or not response_cache.isFresh("cgpa", rollno, password)
+    )
+    
+    async def get_client():
+        client = await logins.attendance()
+        if not client:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        return client
+    
+    async def load_section(kind, scrape):
+        async def load():
+            client = await get_client()
+            return await scrape_pooled(rollno, password, scrape, client)
+        return await response_cache.get(kind, rollno, password, load, force_refresh)
+    
+    def attendance_result(attendance):
+        version = attendance_snapshots.record(rollno, password, attendance)
+        if attendance_since:
+            attendance = attendance_snapshots.delta(rollno, password, attendance, attendance_since)
+        return {"attendance": attendance, "attendance_version": version}
+    
+    async def load_attendance():
+        return attendance_result(await load_section("attendance", scrape_attendance))
+    
+    async def load_cgpa():
+        async def load():
+            client_cgpa = await logins.cgpa()
+            if not client_cgpa:
+                return []
+            return await scrape_pooled(rollno, password, scrape_cgpa, client_cgpa)
+        return {"cgpa": await response_cache.get("cgpa", rollno, password, load, force_refresh)}
+    
+    async def load_timetable():
+        return {"timetable": await load_section("timetable", scrape_timetable)}
+    
+    async def load_internals():
+        return {"internals": await load_section("internals", scrape_internals)}
+    
+    async def load_user_info():
+        return {"user_info": await load_section("user_info", lambda client: scrape_user_info(client, rollno))}
+    
+    def cached_section(section):
+        # The last value stored for the section however old, each section caches under its own name
+        payload = response_cache.peek(section, rollno, password)
+        if payload is None:
+            return None
+        return attendance_result(payload) if section == "attendance" else {section: payload}
+    
+    def login_error():
+        # A failed login surfaces as failed sections, report it as such instead
+        login_task = logins.attendance_task
+        if login_task is None or not login_task.done() or login_task.cancelled():
+            return None
+        if login_task.exception() is not None:
+            return login_task.exception()
+        if not login_task.result():
+            return HTTPException(status_code=401, detail="Invalid credentials")
+        return None
+    
+    sections = {
+        "attendance": load_attendance,
+        "cgpa": load_cgpa,
+        "timetable": load_timetable,
+        "internals": load_internals,
+        "user_info": load_user_info
+    }
+    return sections, cached_section, login_error
+
+async def load_within_budget(section, load, cached_section, deadline):
+    """
+    Run a section loader within its own budget and what is left of the request's.
+    Returns the section data and whether it timed out; a section that runs out of time
+    is cancelled and falls back to its last cached value, or None when there is none.
+    The scrape itself carries on in the background and fills the cache for the next poll
+    """
+    budget = min(DATA_SECTION_BUDGETS[section], deadline - asyncio.get_running_loop().time())
+    try:
+        return await asyncio.wait_for(load(), max(budget, 0)), False
+    except asyncio.TimeoutError:
+        logger.warning(f"{section} missed its {budget:.1f}s budget")
+        return cached_section(section), True
+
+def section_fallback(section, rollno):
+    """
+    What /data reports for a section that could not be loaded
+    """
+    if section == "user_info":
+        return {"user_info": {"username": rollno, "is_birthday": False}}
+    return {section: []}
+
+def read_combined_request(request):
+    """
+    Credentials and options of a /data request, in the encoded or the old format
+    """
+    # Check if this is the new encoded format or old format
+    if 'data' in request:
+        # Decode the encoded payload
+        decoded_data = PayloadSecurity.decode_payload(request['data'])
+        rollno = decoded_data.get('rollno')
+        password = decoded_data.get('password')
+        # The attendance version the client already holds, if it only wants the changes
+        attendance_since = decoded_data.get('attendance_since')
+    else:
+        # Fallback to old format for backward compatibility
+        rollno = request.get('rollno')
+        password = request.get('password')
+        attendance_since = request.get('attendance_since')
+    
+    if not rollno or not password:
+        raise HTTPException(status_code=400, detail="Missing credentials")
+    
+    return rollno, password, attendance_since
+
 @app.post("/data")
 async def get_combined_data(request: dict):
     """
     Get combined data for attendance, timetable, cgpa, internals, and user info
     """
     try:
-        # Check if this is the new encoded format or old format
-        if 'data' in request:
-            # Decode the encoded payload
-            decoded_data = PayloadSecurity.decode_payload(request['data'])
-            rollno = decoded_data.get('rollno')
-            password = decoded_data.get('password')
-        else:
-            # Fallback to old format for backward compatibility
-            rollno = request.get('rollno')
-            password = request.get('password')
+        rollno, password, attendance_since = read_combined_request(request)
+        sections, cached_section, login_error = combined_data_sections(rollno, password,
+                                                                       read_force_refresh(request),
+                                                                       attendance_since)
+        deadline = asyncio.get_running_loop().time() + DATA_REQUEST_BUDGET
+        timed_out = []
+        stale = []
         
-        if not rollno or not password:
-            raise HTTPException(status_code=400, detail="Missing credentials")
-        
-        # Create session once
-        session = getHomePageAttendance(rollno, password)
-        if not session:
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-        
-        # Define async functions for each data type
-        async def fetch_attendance():
+        async def fetch(section, load):
             try:
-                data = await asyncio.to_thread(getStudentAttendance, session)
-                result = []
-                for row in data:
-                    total_classes = int(row[1])
-                    present = int(row[4])
-                    absent = total_classes - present
-                    result.append({
-                        "course_code": row[0],
-                        "total_classes": total_classes,
-                        "present": present,
-                        "absent": absent,
-                        "percentage": row[6]
-                    })
-                return {"attendance": result}
+                result, late = await load_within_budget(section, load, cached_section, deadline)
             except Exception as e:
-                logger.error(f"Error fetching attendance: {e}")
-                return {"attendance": []}
+                logger.error(f"Error fetching {section}: {e}")
+                return section_fallback(section, rollno)
+            if not late:
+                return result
+            timed_out.append(section)
+            if result is None:
+                return section_fallback(section, rollno)
+            stale.append(section)
+            return result
         
-        async def fetch_cgpa():
-            try:
-                session_cgpa = await asyncio.to_thread(getHomePageCGPA, rollno, password)
-                if not session_cgpa:
-                    return {"cgpa": []}
-                
-                course_data = await asyncio.to_thread(getStudentCourses, session_cgpa)
-                completed_semester = await asyncio.to_thread(getCompletedSemester, session_cgpa)
-                cgpa_data = await asyncio.to_thread(getCGPA, course_data, completed_semester)
-                return {"cgpa": cgpa_data.to_dict(orient='records')}
-            except Exception as e:
-                logger.error(f"Error fetching CGPA: {e}")
-                return {"cgpa": []}
+        # Run all fetches concurrently
+        results = await asyncio.gather(*(fetch(section, load) for section, load in sections.items()))
         
-        async def fetch_timetable():
-            try:
-                schedule = await asyncio.to_thread(getExamSchedule, session)
-                if isinstance(schedule, pd.DataFrame):
-                    if schedule.empty:
-                        return {"timetable": []}
-                    else:
-                        return {"timetable": schedule.to_dict(orient='records')}
-                else:
-                    return {"timetable": []}
-            except Exception as e:
-                logger.error(f"Error fetching timetable: {e}")
-                return {"timetable": []}
+        # Sections the cache served stale while the portal is down count as stale too
+        stale += [section for section in sections if section in (stale_kinds.get() or ()) and section not in stale]
         
-        async def fetch_internals():
-            try:
-                internals_data = await asyncio.to_thread(getInternals, session)
-                if not internals_data:
-                    return {"internals": []}
-                return {"internals": internals_data}
-            except Exception as e:
-                logger.error(f"Error fetching internals: {e}")
-                return {"internals": []}
-        
-        async def fetch_user_info():
-            try:
-                # Initialize default response
-                default_response = {"username": rollno, "is_birthday": False}
-                
-                # Try multiple pages to get user info
-                pages_to_try = [
-                    "https://ecampus.psgtech.ac.in/studzone/Scholar/VallalarScholarship",  # Primary source
-                    "https://ecampus.psgtech.ac.in/studzone/Profile"  # Backup source
-                ]
-                
-                for page_url in pages_to_try:
-                    try:
-                        page_response = await asyncio.to_thread(session.get, page_url, timeout=10)
-                        
-                        if not page_response.ok:
-                            continue
-                        
-                        page_soup = BeautifulSoup(page_response.text, "html.parser")
-                        
-                        # Check if we're on the scholarship page
-                        if "VallalarScholarship" in page_url:
-                            personal_info_table = page_soup.find("td", {"class": "personal-info"})
-                            if personal_info_table:
-                                personal_info = personal_info_table.find_all("td")
-                                
-                                # Get username (first item in personal info)
-                                if personal_info and len(personal_info) > 0:
-                                    username = personal_info[0].string.strip()
-                                    if username and len(username) > 0:
-                                        default_response["username"] = username
-                                
-                                # Get birthday (third item in personal info)
-                                if personal_info and len(personal_info) > 2:
-                                    try:
-                                        birthdate_str = personal_info[2].string.strip()
-                                        birthdate = datetime.strptime(birthdate_str, "%d/%m/%Y").date()
-                                        
-                                        # Get current date in India timezone
-                                        IST = pytz.timezone('Asia/Kolkata')
-                                        today = datetime.now(IST).date()
-                                        
-                                        is_birthday = (birthdate.month == today.month and birthdate.day == today.day)
-                                        default_response["is_birthday"] = is_birthday
-                                    except Exception as e:
-                                        pass
-                        
-                        # Check if we're on the profile page
-                        elif "Profile" in page_url and default_response["username"] == rollno:
-                            # Try to find username in profile page if we couldn't from scholarship page
-                            name_element = page_soup.find("input", {"id": "txtName"})
-                            if name_element and name_element.has_attr("value"):
-                                username = name_element["value"].strip()
-                                if username and len(username) > 0:
-                                    default_response["username"] = username
-                        
-                        # If we got a username that's not the roll number, we can stop
-                        if default_response["username"] != rollno:
-                            break
-                            
-                    except Exception as page_error:
-                        continue
-                
-                return {"user_info": default_response}
-            except Exception as e:
-                logger.error(f"Error fetching user info: {e}")
-                return {"user_info": {"username": rollno, "is_birthday": False}}
-        
-        # Run all fetches concurrently
-        results = await asyncio.gather(
-            fetch_attendance(),
-            fetch_cgpa(),
-            fetch_timetable(),
-            fetch_internals(),
-            fetch_user_info()
-        )
+        # A portal outage or error still gets whatever the cache had, anything else fails the request
+        error = login_error()
+        if error is not None and not (isinstance(error, PortalError) and stale):
+            raise error
         
         # Combine results
         combined_data = {}
@@ -770,7 +1232,11 @@ async def get_combined_data(request: dict):
         return {
             "status": "success",
             "data": combined_data,
-            "message": "Combined data retrieved successfully"
+            "message": "Combined data retrieved successfully",
+            # Sections that ran out of time, and which of them hold their last cached value instead
+            "partial": bool(timed_out),
+            "timed_out": timed_out,
+            "stale": stale
         }
         
     except HTTPException as he:
@@ -780,3 +1246,71 @@ async def get_combined_data(request: dict):
         raise HTTPException(status_code=500, 
                            detail="Error retrieving combined data. Please try again or contact support if the issue persists.")
 
+@app.post("/data/stream")
+async def stream_combined_data(request: dict):
+    """
+    Same sections as /data, streamed as NDJSON with one line per section as soon as it is ready,
+    then a final line with the overall status
+    """
+    try:
+        rollno, password, attendance_since = read_combined_request(request)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error in /data/stream endpoint: {e}")
+        raise HTTPException(status_code=400, detail="Invalid request format")
+    
+    sections, cached_section, login_error = combined_data_sections(rollno, password,
+                                                                   read_force_refresh(request),
+                                                                   attendance_since)
+    deadline = asyncio.get_running_loop().time() + DATA_REQUEST_BUDGET
+    timed_out = []
+    stale = []
+    
+    async def fetch(section, load):
+        # Headers are long gone by the time a section is ready, so each line says whether the cache answered for it
+        stale_for_section = collectStaleKinds()
+        try:
+            result, late = await load_within_budget(section, load, cached_section, deadline)
+            if not late:
+                return {"section": section, "status": "success", "stale": bool(stale_for_section), "data": result}
+            timed_out.append(section)
+            if result is None:
+                return {"section": section, "status": "timeout", "stale": False,
+                        "data": section_fallback(section, rollno)}
+            return {"section": section, "status": "timeout", "stale": True, "data": result}
+        except Exception as e:
+            logger.error(f"Error fetching {section}: {e}")
+            status_code = e.status_code if isinstance(e, HTTPException) else 500
+            detail = e.detail if isinstance(e, HTTPException) else f"Error retrieving {section}"
+            return {"section": section, "status": "error", "stale": False, "status_code": status_code,
+                    "detail": detail, "data": section_fallback(section, rollno)}
+    
+    async def lines():
+        tasks = [asyncio.ensure_future(fetch(section, load)) for section, load in sections.items()]
+        try:
+            # Flush each section the moment it completes, fastest first
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                if line.get("stale"):
+                    stale.append(line["section"])
+                with span("serialize"):
+                    encoded = json.dumps(line)
+                yield encoded + "\n"
+            
+            # A portal outage or error still streams whatever the cache had
+            error = login_error()
+            if error is None or (isinstance(error, PortalError) and stale):
+                yield json.dumps({"status": "success", "done": True, "timed_out": timed_out, "stale": stale,
+                                  "message": "Combined data retrieved successfully"}) + "\n"
+            else:
+                status_code = error.status_code if isinstance(error, HTTPException) else 500
+                detail = error.detail if isinstance(error, HTTPException) else "Error logging in to the portal"
+                yield json.dumps({"status": "error", "done": True, "status_code": status_code,
+                                  "detail": detail, "timed_out": timed_out}) + "\n"
+        finally:
+            # The client went away, stop scraping for it
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
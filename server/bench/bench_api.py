@@ -0,0 +1,91 @@
+"""End to end benchmark: /data latency and throughput under concurrency against a mock portal
+
+Drives the FastAPI app in process with concurrent /data requests while every portal
+request it makes is answered by an in-process MockPortal, and reports the latency
+percentiles, the requests per second and the portal traffic caused.
+
+    python bench/bench_api.py [--requests N] [--concurrency N] [--students N]
+                              [--latency SECONDS] [--jitter SECONDS] [--error-rate SHARE]
+                              [--session-ttl SECONDS] [--scale N] [--force-refresh]
+                              [--portal-rate N]
+
+With as many students as requests every request is a cold login; fewer students
+let the response cache and session pool answer the repeats.
+"""
+from collections import Counter
+from fixtures import percentile
+from mock_portal import installMockPortal
+import argparse
+import asyncio
+import httpx
+import logging
+import time
+
+import app as api
+from util.PortalLimiter import portal_limiter
+
+
+async def run(args):
+    portal = installMockPortal(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                               session_ttl=args.session_ttl, scale=args.scale)
+    transport = httpx.ASGITransport(app=api.app)
+    latencies = []
+    statuses = Counter()
+    queue = asyncio.Queue()
+    for index in range(args.requests):
+        queue.put_nowait(index)
+
+    async def worker(client):
+        while not queue.empty():
+            index = queue.get_nowait()
+            payload = {
+                "rollno": f"22z{index % args.students:03d}",
+                "password": "benchmark",
+                "force_refresh": args.force_refresh
+            }
+            started = time.perf_counter()
+            response = await client.post("/data", json=payload)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        duration = time.perf_counter() - started
+
+    latencies.sort()
+    return latencies, statuses, duration, portal
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="total /data requests")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight at once")
+    parser.add_argument("--students", type=int, default=200, help="distinct roll numbers the requests cycle through")
+    parser.add_argument("--latency", type=float, default=0.05, help="portal response time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds per portal response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of portal requests failing with a 500")
+    parser.add_argument("--session-ttl", type=float, default=900, help="idle seconds before a portal login expires")
+    parser.add_argument("--scale", type=int, default=1, help="record multiplier of the served pages")
+    parser.add_argument("--force-refresh", action="store_true", help="bypass the response cache")
+    parser.add_argument("--portal-rate", type=float, help="outbound portal requests per second, 0 for no limit")
+    args = parser.parse_args()
+
+    #Request logs would drown the report
+    for name in ("nimora-api", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    if args.portal_rate is not None:
+        portal_limiter.rate = args.portal_rate
+
+    latencies, statuses, duration, portal = asyncio.run(run(args))
+
+    print(f"requests      {len(latencies)} at concurrency {args.concurrency}, {args.students} students")
+    print(f"statuses      {dict(sorted(statuses.items()))}")
+    print(f"throughput    {len(latencies) / duration:.1f} req/s over {duration:.2f}s")
+    for label, share in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+        print(f"{label:<14}{percentile(latencies, share) * 1000:.1f} ms")
+    print(f"portal calls  {portal.total()} ({portal.total() / len(latencies):.1f} per request)")
+
+
+if __name__ == "__main__":
+    main()
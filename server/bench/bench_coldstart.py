@@ -0,0 +1,128 @@
+"""Cold start benchmark: import time of app.py and time to the first /health and /attendance response
+
+Starts fresh interpreters, as a serverless cold start does, and measures from
+process spawn to the first response of /health and of /attendance (a full login
+against an in-process mock portal with no latency). Also lists the heaviest
+imports from python -X importtime and which optional dependencies got loaded.
+Exits non-zero when the median time misses a target.
+
+    python bench/bench_coldstart.py [--runs N] [--health-target S] [--attendance-target S]
+"""
+from pathlib import Path
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+SERVER = Path(__file__).resolve().parent.parent
+
+#Imported by the child only after its clock starts, so nothing the app needs is loaded early
+sys.path.insert(0, str(SERVER))
+
+#Dependencies only some routes need, which a cold start should not load
+OPTIONAL_MODULES = ("selenium", "webdriver_manager", "requests", "bs4", "pytz")
+
+
+def loaded():
+    return [name for name in OPTIONAL_MODULES if name in sys.modules]
+
+
+def child():
+    """One cold start: import the app, answer /health, then /attendance"""
+    import asyncio
+    import logging
+    logging.disable(logging.WARNING)
+
+    started = time.time()
+    import app as api
+    import httpx
+    imported = time.time()
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://bench") as client:
+            await client.get("/health")
+            health = time.time()
+            after_health = loaded()
+
+            #The mock portal is test scaffolding, its setup is left out of the /attendance time
+            setup = time.time()
+            from mock_portal import installMockPortal
+            installMockPortal(latency=0)
+            setup = time.time() - setup
+
+            response = await client.post("/attendance", json={"rollno": "22z000", "password": "benchmark"})
+            response.raise_for_status()
+            return health, after_health, time.time() - setup
+
+    health, after_health, attendance = asyncio.run(run())
+    print(json.dumps({"import": imported - started, "health": health, "attendance": attendance,
+                      "after_health": after_health, "after_attendance": loaded()}))
+
+
+def coldStart():
+    spawned = time.time()
+    output = subprocess.run([sys.executable, __file__, "--child"], cwd=SERVER, check=True,
+                            capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["health"] -= spawned
+    result["attendance"] -= spawned
+    return result
+
+
+def heaviestImports(count):
+    #Top level imports of app by cumulative time, from python -X importtime
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=SERVER,
+                            check=True, capture_output=True, text=True).stderr
+    imports, children = [], []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = len(name) - len(name.lstrip()) - 1
+        #A module is listed after everything it imported, indented two spaces deeper
+        if depth == 2:
+            children.append((int(cumulative) / 1000, name.strip()))
+        elif depth == 0:
+            if name.strip() == "app":
+                imports = children
+            children = []
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to measure")
+    parser.add_argument("--health-target", type=float, default=1.0, help="seconds to the first /health response")
+    parser.add_argument("--attendance-target", type=float, default=1.5, help="seconds to the first /attendance response")
+    args = parser.parse_args()
+    if args.child:
+        return child()
+    from fixtures import percentile
+
+    print("heaviest imports of app.py (python -X importtime, cumulative)")
+    for ms, name in heaviestImports(10):
+        print(f"  {ms:>8.1f} ms  {name}")
+
+    runs = [coldStart() for _ in range(args.runs)]
+    print(f"\ncold starts    {args.runs}")
+    print(f"optional deps  after /health {runs[-1]['after_health'] or 'none'}, "
+          f"after /attendance {runs[-1]['after_attendance'] or 'none'}")
+
+    missed = False
+    for label, key, target in (("import app", "import", None),
+                               ("first /health", "health", args.health_target),
+                               ("first /attendance", "attendance", args.attendance_target)):
+        samples = sorted(run[key] for run in runs)
+        median = percentile(samples, 0.5)
+        verdict = ""
+        if target is not None:
+            verdict = f"target {target:.2f}s {'ok' if median <= target else 'MISSED'}"
+            missed = missed or median > target
+        print(f"{label:<18} median {median:.3f}s  max {samples[-1]:.3f}s  {verdict}")
+    sys.exit(1 if missed else 0)
+
+
+if __name__ == "__main__":
+    main()
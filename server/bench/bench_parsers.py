@@ -0,0 +1,158 @@
+"""Parser microbenchmark: lxml XPath extraction against the old BeautifulSoup parsing
+
+Runs every portal page parser over the recorded pages in bench/pages, checks the
+output matches the BeautifulSoup implementation it replaced, and reports the
+per-page time of each.
+
+    python bench/bench_parsers.py [--repeat N]
+"""
+from bs4 import BeautifulSoup
+from pathlib import Path
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.Attendance import parseStudentAttendance, parseCourseNames
+from util.Internals import parseInternals
+from util.Cgpa import parseStudentCourses, parseCompletedSemester
+from util.Timetable import findExamContainers
+from util.HomePage import buildAttendancePayload, buildCGPAPayload, isStudentHomePage
+from util.Parsing import hasClass, text
+
+PAGES = Path(__file__).parent / "pages"
+
+LETTER_GRADE = {"O": 10, "A+": 9, "A": 8, "B+": 7, "B": 6, "C": 5}
+
+
+#BeautifulSoup versions of each parser, as they were before the switch to lxml
+
+def soupRecords(rows):
+    return [[cell.text for cell in row.find_all("td")] for row in rows]
+
+
+def soupStudentAttendance(html):
+    soup = BeautifulSoup(html, "lxml")
+    return soupRecords(soup.find("table", {"id": "example"}).find("tbody").find_all("tr"))
+
+
+def soupCourseNames(html):
+    soup = BeautifulSoup(html, "lxml")
+    course_map = {}
+    for course in soup.find_all("div", {"class": "col-md-8"}):
+        initials = [words[0] for words in course.find("h6").text.split() if ord(words[0]) in range(65, 91)]
+        course_map[course.find("h5").text] = ''.join(initials)
+    return course_map
+
+
+def soupInternals(html):
+    tables = BeautifulSoup(html, "lxml").find_all("table")
+    if len(tables) != 2:
+        return False
+    return soupRecords(tables[1].find("tbody").find_all("tr"))
+
+
+def soupStudentCourses(html):
+    soup = BeautifulSoup(html, "lxml")
+    data = soupRecords(soup.find("table", {"id": "PDGCourse"}).find_all("tr"))
+    for row in data[1:]:
+        row[4] = int(row[4].strip())
+        row[6] = LETTER_GRADE[row[6].strip()]
+        row[7] = int(row[7].strip())
+    return data
+
+
+def soupCompletedSemester(html):
+    soup = BeautifulSoup(html, "lxml")
+    data = soupRecords(soup.find("table", {"id": "DgResult"}).find_all("tr"))
+    for record in data[1:]:
+        if record[0] != ' ':
+            semester = int(record[0])
+        if record[5] == "RA":
+            return semester
+    return semester + 1
+
+
+def soupExamDetails(html):
+    soup = BeautifulSoup(html, "lxml")
+    return [[span.text.strip() for span in exam.find_all("span", {"class": "sol"})]
+            for exam in soup.find_all("div", {"class": "text-left"})]
+
+
+def soupAttendancePayload(html):
+    soup = BeautifulSoup(html, "lxml")
+    return soup.find("input", {"name": "__RequestVerificationToken"})["value"]
+
+
+def soupCGPAPayload(html):
+    soup = BeautifulSoup(html, "lxml")
+    return [soup.find("input", {"name": name})["value"]
+            for name in ("__VIEWSTATE", "__VIEWSTATEGENERATOR", "__EVENTVALIDATION", "abcd3")]
+
+
+def soupIsStudentHomePage(html):
+    soup = BeautifulSoup(html, "lxml")
+    return soup.find("nav", {"class": "navbar navbar-expand-lg navbar-light"}) is not None
+
+
+#The lxml side, shaped to return what the BeautifulSoup versions above return
+
+def examDetails(html):
+    return [[text(span).strip() for span in exam.xpath(f".//span[{hasClass('sol')}]")]
+            for exam in findExamContainers(html)]
+
+
+def attendancePayload(html):
+    return buildAttendancePayload(html, "", "")["__RequestVerificationToken"]
+
+
+def cgpaPayload(html):
+    payload = buildCGPAPayload(html, "", "")
+    return [payload[name] for name in ("__VIEWSTATE", "__VIEWSTATEGENERATOR", "__EVENTVALIDATION", "abcd3")]
+
+
+CASES = [
+    ("attendance",        "StudentPercentage.html",        parseStudentAttendance, soupStudentAttendance),
+    ("course names",      "courseplan.html",               parseCourseNames,       soupCourseNames),
+    ("internals",         "CAMarksView.html",              parseInternals,         soupInternals),
+    ("exam schedule",     "CATestTimeTable.html",          examDetails,            soupExamDetails),
+    ("completed courses", "AttWfStudCourseSelection.html", parseStudentCourses,    soupStudentCourses),
+    ("completed semester","FrmEpsStudResult.html",         parseCompletedSemester, soupCompletedSemester),
+    ("studzone login",    "studzone_login.html",           attendancePayload,      soupAttendancePayload),
+    ("studzone home",     "studzone_home.html",            isStudentHomePage,      soupIsStudentHomePage),
+    ("studzone2 login",   "studzone2_login.html",          cgpaPayload,            soupCGPAPayload),
+]
+
+
+def perCall(fn, html, repeat):
+    #Best of five runs, in milliseconds per call
+    return min(timeit.repeat(lambda: fn(html), number=repeat, repeat=5)) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50, help="calls per timing run")
+    args = parser.parse_args()
+
+    print(f"{'parser':<20}{'page':>10}{'soup ms':>10}{'lxml ms':>10}{'speedup':>10}")
+    total_soup = total_lxml = 0
+    for name, page, parse, soup_parse in CASES:
+        html = (PAGES / page).read_text(encoding="utf-8")
+
+        #Both implementations must extract exactly the same data
+        expected, actual = soup_parse(html), parse(html)
+        assert actual == expected, f"{name}: lxml output differs from BeautifulSoup\n{actual}\n{expected}"
+
+        soup_ms = perCall(soup_parse, html, args.repeat)
+        lxml_ms = perCall(parse, html, args.repeat)
+        total_soup += soup_ms
+        total_lxml += lxml_ms
+        print(f"{name:<20}{len(html) // 1024:>8}KB{soup_ms:>10.3f}{lxml_ms:>10.3f}{soup_ms / lxml_ms:>9.1f}x")
+
+    print(f"{'all pages':<20}{'':>10}{total_soup:>10.3f}{total_lxml:>10.3f}{total_soup / total_lxml:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
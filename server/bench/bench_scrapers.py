@@ -0,0 +1,83 @@
+"""Scraper benchmark: latency and memory of every portal page parser across page sizes
+
+Runs each util parser over the recorded pages in bench/pages, grown by scalePage()
+to several times the records of the capture, and reports the per-call time and
+the peak memory allocated while parsing.
+
+    python bench/bench_scrapers.py [--repeat N] [--scales 1,4,16]
+"""
+from fixtures import scalePage
+import argparse
+import timeit
+import tracemalloc
+
+from util.Attendance import parseStudentAttendance, parseCourseNames
+from util.Internals import parseInternals
+from util.Cgpa import parseStudentCourses, parseCompletedSemester
+from util.Timetable import findExamContainers, buildExamSchedule
+from util.HomePage import buildAttendancePayload, isStudentHomePage
+from util.LoginTokens import extractLoginTokens
+
+
+def examSchedule(html):
+    return buildExamSchedule(findExamContainers(html), {})
+
+
+def attendancePayload(html):
+    return buildAttendancePayload(html, "", "")
+
+
+#Login pages have no records to repeat, they are only measured as recorded
+CASES = [
+    ("attendance",         "StudentPercentage.html",        parseStudentAttendance, True),
+    ("course names",       "courseplan.html",               parseCourseNames,       True),
+    ("internals",          "CAMarksView.html",              parseInternals,         True),
+    ("exam schedule",      "CATestTimeTable.html",          examSchedule,           True),
+    ("completed courses",  "AttWfStudCourseSelection.html", parseStudentCourses,    True),
+    ("completed semester", "FrmEpsStudResult.html",         parseCompletedSemester, True),
+    ("studzone login",     "studzone_login.html",           attendancePayload,      False),
+    ("studzone home",      "studzone_home.html",            isStudentHomePage,      False),
+    ("studzone2 login",    "studzone2_login.html",          extractLoginTokens,     False),
+]
+
+
+def perCall(fn, html, repeat):
+    #Best of five runs, in milliseconds per call
+    return min(timeit.repeat(lambda: fn(html), number=repeat, repeat=5)) / repeat * 1000
+
+
+def peakMemory(fn, html):
+    #Peak traced memory of one call in KiB, and the blocks it left allocated
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        result = fn(html)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del result
+    retained = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return (peak - start) / 1024, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="calls per timing run")
+    parser.add_argument("--scales", default="1,4,16", help="comma separated record multipliers")
+    args = parser.parse_args()
+    scales = [int(scale) for scale in args.scales.split(",")]
+
+    print(f"{'parser':<20}{'scale':>6}{'page':>10}{'ms':>10}{'peak KiB':>10}{'blocks':>8}")
+    for name, page, parse, scalable in CASES:
+        for scale in (scales if scalable else [1]):
+            html = scalePage(page, scale)
+            ms = perCall(parse, html, args.repeat)
+            peak, blocks = peakMemory(parse, html)
+            print(f"{name:<20}{scale:>5}x{len(html) // 1024:>8}KB{ms:>10.3f}{peak:>10.1f}{blocks:>8}")
+
+
+if __name__ == "__main__":
+    main()
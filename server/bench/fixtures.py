@@ -0,0 +1,68 @@
+"""Recorded portal pages shared by the benchmarks and the mock portal
+
+The pages in bench/pages are anonymised captures of the eCampus portal. scalePage()
+grows a page by repeating its records, so parsers can be measured on students
+with more courses or semesters than the capture has; mock_portal.py serves them
+in place of the real portal.
+"""
+from copy import deepcopy
+from lxml import html as lxml_html
+from pathlib import Path
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PAGES = Path(__file__).parent / "pages"
+
+#Portal path of each recorded page
+PORTAL_PAGES = {
+    "/studzone/Attendance/courseplan"                : "courseplan.html",
+    "/studzone/Attendance/StudentPercentage"         : "StudentPercentage.html",
+    "/studzone/ContinuousAssessment/CAMarksView"     : "CAMarksView.html",
+    "/studzone/ContinuousAssessment/CATestTimeTable" : "CATestTimeTable.html",
+    "/studzone2/AttWfStudCourseSelection.aspx"       : "AttWfStudCourseSelection.html",
+    "/studzone2/FrmEpsStudResult.aspx"               : "FrmEpsStudResult.html",
+    "/studzone/Scholar/VallalarScholarship"          : "VallalarScholarship.html",
+}
+
+#The repeating record of each page, copied to scale it up
+RECORDS = {
+    "StudentPercentage.html"        : "//table[@id='example']/tbody/tr",
+    "CAMarksView.html"              : "(//table)[2]/tbody/tr",
+    "courseplan.html"               : "//div[@class='row']/div[@class='col-md-4']",
+    "CATestTimeTable.html"          : "//div[@class='row']/div[@class='col-md-4']",
+    "AttWfStudCourseSelection.html" : "//table[@id='PDGCourse']/tr[position()>1]",
+    "FrmEpsStudResult.html"         : "//table[@id='DgResult']/tr[position()>1]",
+}
+
+def loadPage(name):
+    return (PAGES / name).read_text(encoding="utf-8")
+
+
+def scalePage(name, factor):
+    """The recorded page with its records repeated factor times
+
+    Pages with records are always re-serialised, even at factor 1, so every
+    size of a page is laid out the same way and only the record count differs.
+    """
+    page = loadPage(name)
+    if name not in RECORDS:
+        return page
+
+    document = lxml_html.fromstring(page)
+    records = document.xpath(RECORDS[name])
+    last = records[-1]
+    for _ in range(factor - 1):
+        for record in records:
+            copy = deepcopy(record)
+            last.addnext(copy)
+            last = copy
+    return lxml_html.tostring(document, encoding="unicode", doctype="<!DOCTYPE html>")
+
+
+def percentile(samples, share):
+    #Nearest rank percentile of already sorted samples
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, max(0, round(share * len(samples)) - 1))]
@@ -0,0 +1,250 @@
+"""Stand-in eCampus portal for load and soak tests
+
+A small ASGI app that implements both portal logins the way the API drives them:
+studzone checks the __RequestVerificationToken of its login form against the
+antiforgery cookie, studzone2 checks the __VIEWSTATE and __EVENTVALIDATION it
+handed out with the session cookie. Behind each login it serves the recorded
+pages in bench/pages. Latency, server errors and session expiry are injectable,
+so capacity can be measured without touching the real portal.
+
+    python bench/mock_portal.py [--port 9000] [--latency 0.05] [--jitter 0.02]
+                                [--error-rate 0.01] [--session-ttl 900] [--scale 1]
+    PORTAL_BASE_URL=http://127.0.0.1:9000 uvicorn app:app
+
+Any roll number logs in; with --password set, only that password does.
+GET /__stats reports the traffic served.
+"""
+from collections import Counter
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fixtures import PORTAL_PAGES, loadPage, scalePage
+from urllib.parse import parse_qsl
+import argparse
+import asyncio
+import httpx
+import os
+import random
+import re
+import secrets
+import time
+
+from util.AsyncPortal import portal_transport
+
+#Injected behaviour (times in seconds, error rate as a share of requests)
+MOCK_PORTAL_LATENCY     = float(os.environ.get("MOCK_PORTAL_LATENCY", "0.05"))
+MOCK_PORTAL_JITTER      = float(os.environ.get("MOCK_PORTAL_JITTER", "0"))
+MOCK_PORTAL_ERROR_RATE  = float(os.environ.get("MOCK_PORTAL_ERROR_RATE", "0"))
+MOCK_PORTAL_SESSION_TTL = float(os.environ.get("MOCK_PORTAL_SESSION_TTL", "900"))
+MOCK_PORTAL_TOKEN_TTL   = float(os.environ.get("MOCK_PORTAL_TOKEN_TTL", "600"))
+
+ATTENDANCE_LOGIN = "/studzone"
+CGPA_LOGIN       = "/studzone2/"
+
+ANTIFORGERY_COOKIE = ".AspNetCore.Antiforgery"
+ATTENDANCE_COOKIE  = ".AspNetCore.Session"
+CGPA_COOKIE        = "ASP.NET_SessionId"
+
+#What a successful studzone2 login lands on: anything without the login form
+CGPA_HOME = "<html><body><h4>Student Zone</h4></body></html>"
+
+SERVER_ERROR = "<html><body><h1>Server Error in '/' Application.</h1></body></html>"
+
+
+def withInputValues(page, values):
+    """The page with the value of each named input replaced"""
+    for name, value in values.items():
+        page = re.sub(rf'(<input\b[^>]*\bname="{re.escape(name)}"[^>]*\bvalue=")[^"]*(")',
+                      lambda match: match.group(1) + value + match.group(2), page, count=1)
+    return page
+
+
+class MockPortal:
+    """The portal's logins and pages, with latency, errors and session expiry injected
+
+    Login tokens are single use and expire after token_ttl; a session expires
+    session_ttl after its last request, after which pages behind the login
+    redirect to the login form as the real portal does.
+    """
+
+    def __init__(self, latency=MOCK_PORTAL_LATENCY, jitter=MOCK_PORTAL_JITTER, error_rate=MOCK_PORTAL_ERROR_RATE,
+                 session_ttl=MOCK_PORTAL_SESSION_TTL, token_ttl=MOCK_PORTAL_TOKEN_TTL, scale=1, password=None):
+        self.latency     = latency
+        self.jitter      = jitter
+        self.error_rate  = error_rate
+        self.session_ttl = session_ttl
+        self.token_ttl   = token_ttl
+        self.password    = password
+        self.requests    = Counter()
+        self.counters    = Counter()
+        self._tokens     = {}
+        self._sessions   = {}
+        self._pruned_at  = time.monotonic()
+        self._pages      = {path: scalePage(name, scale) for path, name in PORTAL_PAGES.items()}
+        self._login_page = {
+            ATTENDANCE_LOGIN : loadPage("studzone_login.html"),
+            CGPA_LOGIN       : loadPage("studzone2_login.html"),
+        }
+        self._home_page  = loadPage("studzone_home.html")
+
+        self.app = FastAPI(title="Mock eCampus portal", docs_url=None, redoc_url=None, openapi_url=None)
+        self.app.add_api_route("/__stats", self.stats, methods=["GET"])
+        self.app.add_api_route("/{path:path}", self.handle, methods=["GET", "POST"])
+
+    async def stats(self):
+        return JSONResponse({
+            "requests": sum(self.requests.values()),
+            "by_path": {f"{method} {path}": count for (method, path), count in sorted(self.requests.items())},
+            "sessions": len(self._sessions),
+            **self.counters
+        })
+
+    def total(self):
+        return sum(self.requests.values())
+
+    async def handle(self, request: Request, path: str):
+        path = "/" + path
+        self.requests[(request.method, path)] += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            self.counters["errors"] += 1
+            return HTMLResponse(SERVER_ERROR, status_code=500)
+
+        form = dict(parse_qsl((await request.body()).decode())) if request.method == "POST" else {}
+        if path.rstrip("/") == ATTENDANCE_LOGIN:
+            return self.attendanceLogin(request, form)
+        if path.rstrip("/") == CGPA_LOGIN.rstrip("/"):
+            return self.cgpaLogin(request, form)
+
+        page = self._pages.get(path)
+        if page is None:
+            return HTMLResponse("<html><body>Not Found</body></html>", status_code=404)
+        if path.startswith(CGPA_LOGIN):
+            session, login = request.cookies.get(CGPA_COOKIE), CGPA_LOGIN
+        else:
+            session, login = request.cookies.get(ATTENDANCE_COOKIE), ATTENDANCE_LOGIN
+        if not self.isLoggedIn(session, login):
+            return RedirectResponse(login, status_code=302)
+        return HTMLResponse(page)
+
+    def attendanceLogin(self, request, form):
+        if request.method == "POST":
+            #The form token must be one we issued for this browser's antiforgery cookie
+            token = form.get("__RequestVerificationToken", "")
+            if (self.takeToken(token, request.cookies.get(ANTIFORGERY_COOKIE))
+                    and form.get("rollno") and self.acceptsPassword(form.get("password"))):
+                response = HTMLResponse(self._home_page)
+                response.set_cookie(ATTENDANCE_COOKIE, self.openSession(ATTENDANCE_LOGIN, secrets.token_hex(16)),
+                                    httponly=True)
+                return response
+            self.counters["rejected_logins"] += 1
+
+        antiforgery = request.cookies.get(ANTIFORGERY_COOKIE) or secrets.token_urlsafe(24)
+        token = self.issueToken(antiforgery)
+        response = HTMLResponse(withInputValues(self._login_page[ATTENDANCE_LOGIN],
+                                                {"__RequestVerificationToken": token}))
+        response.set_cookie(ANTIFORGERY_COOKIE, antiforgery, httponly=True)
+        return response
+
+    def cgpaLogin(self, request, form):
+        session = request.cookies.get(CGPA_COOKIE)
+        if request.method == "POST":
+            #The view state must be one we issued to this session, with its event validation
+            viewstate = form.get("__VIEWSTATE", "")
+            issued = self._tokens.get(viewstate)
+            if (issued is not None and form.get("__EVENTVALIDATION") == issued[2]
+                    and self.takeToken(viewstate, session)
+                    and form.get("txtusercheck") and self.acceptsPassword(form.get("txtpwdcheck"))):
+                self.openSession(CGPA_LOGIN, session)
+                return HTMLResponse(CGPA_HOME)
+            self.counters["rejected_logins"] += 1
+
+        #ASP.NET hands out the session cookie with the login form, before anyone logs in
+        if session is None:
+            session = secrets.token_hex(12)
+        viewstate = self.issueToken(session, secrets.token_urlsafe(18))
+        response = HTMLResponse(withInputValues(self._login_page[CGPA_LOGIN], {
+            "__VIEWSTATE": viewstate,
+            "__EVENTVALIDATION": self._tokens[viewstate][2]
+        }))
+        response.set_cookie(CGPA_COOKIE, session, httponly=True)
+        return response
+
+    def acceptsPassword(self, password):
+        return bool(password) and (self.password is None or password == self.password)
+
+    def issueToken(self, owner, validation=None):
+        self._prune()
+        token = secrets.token_urlsafe(48)
+        self._tokens[token] = (owner, time.monotonic(), validation)
+        return token
+
+    def takeToken(self, token, owner):
+        #Tokens are single use and only valid with the cookie they were issued to
+        issued = self._tokens.pop(token, None)
+        if issued is None or owner is None or issued[0] != owner:
+            return False
+        if time.monotonic() - issued[1] >= self.token_ttl:
+            self.counters["expired_tokens"] += 1
+            return False
+        return True
+
+    def openSession(self, portal, session):
+        self._sessions[session] = (portal, time.monotonic())
+        self.counters["logins"] += 1
+        return session
+
+    def isLoggedIn(self, session, portal):
+        entry = self._sessions.get(session)
+        if entry is None or entry[0] != portal:
+            return False
+        now = time.monotonic()
+        if now - entry[1] >= self.session_ttl:
+            del self._sessions[session]
+            self.counters["expired_sessions"] += 1
+            return False
+        #Sliding expiry: every request keeps the session alive
+        self._sessions[session] = (portal, now)
+        return True
+
+    def _prune(self):
+        #Drop tokens and sessions nobody came back for, so soak tests do not grow memory
+        now = time.monotonic()
+        if now - self._pruned_at < min(self.token_ttl, self.session_ttl):
+            return
+        self._pruned_at = now
+        self._tokens = {token: issued for token, issued in self._tokens.items()
+                        if now - issued[1] < self.token_ttl}
+        self._sessions = {session: entry for session, entry in self._sessions.items()
+                          if now - entry[1] < self.session_ttl}
+
+
+def installMockPortal(**options):
+    """Route the API's async portal requests to a new in-process MockPortal and return it"""
+    portal = MockPortal(**options)
+    portal_transport.useTransport(httpx.ASGITransport(app=portal.app))
+    return portal
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=MOCK_PORTAL_LATENCY, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=MOCK_PORTAL_JITTER, help="up to this many more seconds, at random")
+    parser.add_argument("--error-rate", type=float, default=MOCK_PORTAL_ERROR_RATE, help="share of requests answered with a 500")
+    parser.add_argument("--session-ttl", type=float, default=MOCK_PORTAL_SESSION_TTL, help="idle seconds before a login expires")
+    parser.add_argument("--token-ttl", type=float, default=MOCK_PORTAL_TOKEN_TTL, help="seconds a login form stays valid")
+    parser.add_argument("--scale", type=int, default=1, help="record multiplier of the served pages")
+    parser.add_argument("--password", help="the only password accepted, any when unset")
+    args = parser.parse_args()
+
+    import uvicorn
+    portal = MockPortal(args.latency, args.jitter, args.error_rate, args.session_ttl, args.token_ttl,
+                        args.scale, args.password)
+    uvicorn.run(portal.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+from pathlib import Path
+import sys
+
+#The tests import util like app.py does, from the server directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,30 @@
+import asyncio
+import httpx
+import pytest
+
+from util.AsyncPortal import SharedPortalTransport
+from util.CircuitBreaker import portal_breaker, PortalError
+from util.PortalLimiter import portal_limiter
+
+
+def test_server_errors_raise_instead_of_returning_the_error_page():
+    async def run():
+        statuses = iter([500, 200])
+
+        def portal(request):
+            return httpx.Response(next(statuses), text="<html>Runtime Error</html>")
+
+        transport = SharedPortalTransport()
+        transport.useTransport(httpx.MockTransport(portal))
+        async with httpx.AsyncClient(transport=transport) as client:
+            with pytest.raises(PortalError) as raised:
+                await client.get("https://portal.test/attendance")
+            assert raised.value.status_code == 502
+            #The error still released its slot, and a healthy page comes through as usual
+            assert portal_limiter.stats()["in_flight"] == 0
+
+            response = await client.get("https://portal.test/attendance")
+            assert response.status_code == 200
+        assert portal_breaker.stats()["failure_streak"] == 0
+
+    asyncio.run(run())
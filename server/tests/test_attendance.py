@@ -0,0 +1,50 @@
+"""calculateLeaves against the loop it replaced"""
+import pytest
+
+from util.Attendance import calculateLeaves, getAffordableLeaves, getAffordableLeavesTable
+
+
+def loopLeaves(classes_present, classes_total, maintenance_percentage):
+    #The simulation calculateLeaves used before it was solved in closed form
+    affordable_leaves = 0
+    i = 1
+    if float(classes_present/classes_total)*100 < maintenance_percentage:
+        while float((classes_present + i)/(classes_total + i))*100 <= maintenance_percentage:
+            affordable_leaves -= 1
+            i += 1
+    else:
+        while float(classes_present/(classes_total + i))*100 >= maintenance_percentage:
+            affordable_leaves += 1
+            i += 1
+    return affordable_leaves
+
+
+#Thresholds below 100 and above 0, where the old loop always ends
+THRESHOLDS = [1, 33.3, 50, 65, 66.67, 74.5, 75, 80, 85, 90, 99, 99.9]
+
+
+@pytest.mark.parametrize("maintenance", THRESHOLDS)
+def test_leaves_match_loop(maintenance):
+    for classes_total in range(1, 61):
+        for classes_present in range(classes_total + 1):
+            assert calculateLeaves(classes_present, classes_total, maintenance) == \
+                loopLeaves(classes_present, classes_total, maintenance), (classes_present, classes_total)
+
+
+def test_leaves_at_full_threshold():
+    #At 100% a full record can skip nothing, and anything less can never catch up (the loop never ended)
+    for classes_total in range(1, 61):
+        assert calculateLeaves(classes_total, classes_total, 100) == loopLeaves(classes_total, classes_total, 100) == 0
+        for classes_present in range(classes_total):
+            assert calculateLeaves(classes_present, classes_total, 100) is None
+
+
+def test_leaves_without_classes():
+    assert calculateLeaves(0, 0, 75) is None
+    assert getAffordableLeaves([["X", "0", "0", "0", "0"]], 75)[0].toDict() == \
+        {"Course Code": "X", "Attendance": 0, "Bunks": None}
+
+    table = getAffordableLeavesTable([("X", 0, 0), ("Y", 30, 40)], [75, 80])
+    assert table[0].toDict() == {"Course Code": "X", "Attendance": 0, "Bunks": {"75": None, "80": None}}
+    assert table[1].bunks == {"75": loopLeaves(30, 40, 75), "80": loopLeaves(30, 40, 80)}
+
@@ -0,0 +1,72 @@
+"""The running-totals CGPA against the per-semester computation it replaced"""
+import random
+import pytest
+
+from util.Cgpa import getSemesterTotals, getSemesterRecords, projectCGPA
+
+
+def groupedCGPA(data, completed_semester):
+    #The per-semester grouping getCGPA used before the running totals
+    most_recent_semester = data[1][4]
+
+    result = []
+    overall_product = 0
+    overall_credits = 0
+
+    backlogs = False
+    for semester in range(1, most_recent_semester+1):
+        if not backlogs:
+            courses = [row for row in data[1:] if row[4] == semester]
+            if semester >= completed_semester:
+                backlogs = True
+                result.append([semester, "-", "-"])
+            else:
+                semester_product = sum(row[6] * row[7] for row in courses)
+                semester_credits = sum(row[7] for row in courses)
+
+                overall_product += semester_product
+                overall_credits += semester_credits
+
+                semester_gpa  = '{:.5f}'.format(float(semester_product / semester_credits))[:-1]
+                semester_cgpa = '{:.5f}'.format(float(overall_product / overall_credits))[:-1]
+
+                result.append([semester, semester_gpa, semester_cgpa])
+        else:
+            result.append([semester, "-", "-"])
+
+    return result
+
+
+def coursesTable(rng, semesters):
+    #Rows as parseStudentCourses returns them, the most recent semester first
+    data = [["S.NO", "COURSE CODE", "COURSE TITLE", "COURSE TYPE", "SEMESTER", "MONTH/YEAR", "GRADE", "CREDITS"]]
+    for semester in range(semesters, 0, -1):
+        for course in range(rng.randint(1, 8)):
+            data.append([str(len(data)), f"20XC{semester}{course}", "Course", "Theory", semester, "NOV 2024",
+                         rng.choice([10, 9, 8, 7, 6, 5]), rng.randint(1, 4)])
+    return data
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_running_totals_match_grouped(seed):
+    rng = random.Random(seed)
+    data = coursesTable(rng, rng.randint(1, 8))
+    most_recent_semester = data[1][4]
+
+    #Every backlog position, including none (the next semester) and the first semester
+    for completed_semester in range(1, most_recent_semester + 2):
+        records = getSemesterRecords(getSemesterTotals(data, completed_semester))
+        assert [[record.semester, record.gpa, record.cgpa] for record in records] == \
+            groupedCGPA(data, completed_semester), completed_semester
+
+
+@pytest.mark.parametrize("grade", [["A"], {"A": 1}, None, True, "Z", 11, -1])
+def test_projection_rejects_invalid_grades(grade):
+    totals = getSemesterTotals(coursesTable(random.Random(0), 3), 4)
+    with pytest.raises(ValueError):
+        projectCGPA(totals, [(grade, 3)])
+
+
+def test_projection_takes_letters_or_points():
+    totals = getSemesterTotals(coursesTable(random.Random(0), 3), 4)
+    assert projectCGPA(totals, [("A+", 3), (8, 4)]) == projectCGPA(totals, [(9, 3), ("A", 4)])
@@ -0,0 +1,116 @@
+import asyncio
+import time
+import pytest
+
+from util.CircuitBreaker import CircuitBreaker, PortalError, PortalUnavailable, CLOSED, OPEN, HALF_OPEN
+from util.ResponseCache import ResponseCache, MemoryStore, collectStaleKinds
+
+
+def fail(breaker, times):
+    for _ in range(times):
+        breaker.after(False, breaker.before())
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failures=3, cooldown=30)
+
+    fail(breaker, 2)
+    assert breaker.state == CLOSED
+
+    #A healthy response resets the streak
+    breaker.after(True, breaker.before())
+    fail(breaker, 2)
+    assert breaker.state == CLOSED
+
+    fail(breaker, 1)
+    assert breaker.state == OPEN
+    assert breaker.stats()["opened"] == 1
+
+    with pytest.raises(PortalUnavailable) as raised:
+        breaker.before()
+    assert raised.value.status_code == 503
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_unanswered_requests_do_not_count():
+    breaker = CircuitBreaker(failures=2, cooldown=30)
+    for _ in range(5):
+        breaker.after(None, breaker.before())
+    assert breaker.state == CLOSED
+    assert breaker.stats()["failure_streak"] == 0
+
+
+def test_retry_after_is_the_rest_of_the_cooldown():
+    breaker = CircuitBreaker(failures=1, cooldown=30)
+    fail(breaker, 1)
+
+    with pytest.raises(PortalUnavailable) as raised:
+        breaker.before()
+    assert raised.value.headers["Retry-After"] == "30"
+
+    #Never below a second, even at the very end of the cooldown
+    breaker._opened_at -= 29.99
+    with pytest.raises(PortalUnavailable) as raised:
+        breaker.before()
+    assert raised.value.headers["Retry-After"] == "1"
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(failures=1, cooldown=0.05)
+    fail(breaker, 1)
+    time.sleep(0.06)
+
+    assert breaker.before() is True
+    assert breaker.state == HALF_OPEN
+    #Everyone else keeps failing fast while the probe is out
+    with pytest.raises(PortalUnavailable):
+        breaker.before()
+
+    #A failed probe reopens the breaker for another cooldown
+    breaker.after(False, True)
+    assert breaker.state == OPEN
+    with pytest.raises(PortalUnavailable):
+        breaker.before()
+
+    time.sleep(0.06)
+    assert breaker.before() is True
+    breaker.after(True, True)
+    assert breaker.state == CLOSED
+    assert breaker.before() is False
+    assert breaker.stats()["probes"] == 2
+
+
+def test_unanswered_probe_frees_the_probe_slot():
+    breaker = CircuitBreaker(failures=1, cooldown=0.05)
+    fail(breaker, 1)
+    time.sleep(0.06)
+
+    #A probe that was cancelled before it got an answer lets the next request probe instead
+    breaker.after(None, breaker.before())
+    assert breaker.before() is True
+
+
+def test_cache_serves_the_last_entry_on_portal_errors():
+    async def run():
+        cache = ResponseCache(MemoryStore())
+        payload = [["20XC51", "40", "0", "2", "38", "95"]]
+
+        async def fetch():
+            return payload
+
+        async def failing():
+            raise PortalError()
+
+        assert await cache.get("attendance", "22z000", "pw", fetch) is payload
+
+        #A portal error with the breaker still closed falls back like an outage does
+        kinds = collectStaleKinds()
+        assert await cache.get("attendance", "22z000", "pw", failing, force_refresh=True) is payload
+        assert kinds == {"attendance"}
+        assert cache.stats()["fallbacks"] == 1
+
+        #With nothing cached the error reaches the caller
+        with pytest.raises(PortalError):
+            await cache.get("attendance", "22z001", "pw", failing)
+
+    asyncio.run(run())
@@ -0,0 +1,23 @@
+"""calculateTarget against the search it replaced"""
+import pytest
+
+from util.Internals import calculateTarget, GRADE_BOUNDARIES
+
+
+def loopTarget(internal, final):
+    #The search calculateTarget used before it was solved in closed form
+    internal = float(internal)
+    final = float(final)
+    for target in range(45, 101):
+        if float(0.8 * internal) + float(0.6 * target) >= final:
+            return target
+    return '-'
+
+
+@pytest.mark.parametrize("final", [0, 20, 45, 50, *GRADE_BOUNDARIES.values(), 95, 100, 101])
+def test_target_matches_loop(final):
+    for tenths in range(0, 501, 5):
+        internal = tenths / 10
+        assert calculateTarget(internal, final) == loopTarget(internal, final), internal
+        #Marks arrive as text from the portal
+        assert calculateTarget(str(internal), final) == loopTarget(internal, final), internal
@@ -0,0 +1,158 @@
+import asyncio
+import httpx
+import time
+import pytest
+
+from util.AsyncPortal import SharedPortalTransport
+from util.PortalLimiter import PortalLimiter, portal_limiter
+
+
+def test_token_bucket_allows_a_burst_then_refills():
+    limiter = PortalLimiter(rate=20, burst=2, start_window=64, queue_timeout=1)
+
+    assert limiter.acquire("a") and limiter.acquire("a")
+    assert limiter.stats()["tokens"] < 1
+
+    #The third request waits for the next token, 1/20 s away
+    started = time.monotonic()
+    assert limiter.acquire("a")
+    assert time.monotonic() - started >= 0.03
+    assert limiter.stats()["waited"] == 1
+
+    for _ in range(3):
+        limiter.release(0.01, True)
+    time.sleep(0.15)
+    #Refilled up to the burst, never beyond it
+    assert limiter.stats()["tokens"] == 2
+
+
+def test_queue_timeout_rejects_the_request():
+    limiter = PortalLimiter(rate=1, burst=1, start_window=64, queue_timeout=0.05)
+    assert limiter.acquire("a")
+    assert limiter.acquire("a") is False
+
+    stats = limiter.stats()
+    assert stats["rejected"] == 1
+    assert stats["queued"] == 0
+    assert stats["in_flight"] == 1
+
+
+def test_window_halves_on_failures_and_slow_responses():
+    limiter = PortalLimiter(rate=0, min_window=2, start_window=16, max_window=64, latency_target=0.05)
+
+    def respond(latency, healthy):
+        assert limiter.acquire("a")
+        limiter.release(latency, healthy)
+
+    respond(0.01, False)
+    assert limiter.window == 8
+
+    #At most one decrease per latency target, a burst of errors is one congestion event
+    respond(0.01, False)
+    respond(None, False)
+    assert limiter.window == 8
+
+    time.sleep(0.06)
+    respond(0.2, True)
+    assert limiter.window == 4
+
+    time.sleep(0.06)
+    respond(0.01, False)
+    time.sleep(0.06)
+    respond(0.01, False)
+    assert limiter.window == 2
+    assert limiter.stats()["decreases"] == 4
+    assert limiter.stats()["failures"] == 5
+
+
+def test_window_grows_additively_up_to_the_max():
+    limiter = PortalLimiter(rate=0, min_window=2, start_window=4, max_window=5, latency_target=1)
+
+    #One full window of fast healthy responses adds one slot
+    for _ in range(4):
+        assert limiter.acquire("a")
+        limiter.release(0.01, True)
+    assert limiter.window == pytest.approx(5, abs=0.1)
+
+    for _ in range(50):
+        assert limiter.acquire("a")
+        limiter.release(0.01, True)
+    assert limiter.window == 5
+
+
+def test_in_flight_requests_are_capped_by_the_window():
+    limiter = PortalLimiter(rate=0, min_window=2, start_window=2, max_window=2, queue_timeout=0.05)
+    assert limiter.acquire("a") and limiter.acquire("b")
+    assert limiter.acquire("c") is False
+
+    limiter.release(0.01, True)
+    assert limiter.acquire("c")
+
+
+def test_owners_are_served_round_robin():
+    async def run():
+        limiter = PortalLimiter(rate=0, min_window=1, start_window=1, max_window=1, queue_timeout=5)
+        assert await limiter.acquireAsync("busy")
+        order = []
+
+        async def request(owner, name):
+            assert await limiter.acquireAsync(owner)
+            order.append(name)
+
+        #One student queues three requests before another student queues one
+        tasks = []
+        for owner, name in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1")]:
+            tasks.append(asyncio.ensure_future(request(owner, name)))
+            await asyncio.sleep(0)
+        assert limiter.stats()["queued"] == 4
+
+        for _ in tasks:
+            limiter.release(0.01, True)
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+
+        assert order == ["a1", "b1", "a2", "a3"]
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        limiter = PortalLimiter(rate=0, min_window=1, start_window=1, max_window=1, queue_timeout=5)
+        assert await limiter.acquireAsync("busy")
+
+        waiting = asyncio.ensure_future(limiter.acquireAsync("a"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+        stats = limiter.stats()
+        assert stats["queued"] == 0
+        assert stats["in_flight"] == 1
+
+    asyncio.run(run())
+
+
+class PageStream(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        yield b"<html>"
+        yield b"</html>"
+
+
+def test_transport_holds_the_slot_until_the_body_is_read():
+    async def run():
+        pages = iter([httpx.Response(200, text="<html></html>"), httpx.Response(200, stream=PageStream())])
+        transport = SharedPortalTransport()
+        transport.useTransport(httpx.MockTransport(lambda request: next(pages)))
+        async with httpx.AsyncClient(transport=transport) as client:
+            #A body the transport already read hands the slot back at once
+            await client.get("https://portal.test/attendance")
+            assert portal_limiter.stats()["in_flight"] == 0
+
+            async with client.stream("GET", "https://portal.test/attendance") as response:
+                assert portal_limiter.stats()["in_flight"] == 1
+                await response.aread()
+            assert portal_limiter.stats()["in_flight"] == 0
+
+    asyncio.run(run())
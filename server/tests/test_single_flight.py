@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+
+from util.SingleFlight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    async def run():
+        flights = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await release.wait()
+            return {"rows": [1, 2, 3]}
+
+        callers = [asyncio.ensure_future(flights.do("attendance", "22z000", fetch)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert flights.inflight() == 1
+        release.set()
+        results = await asyncio.gather(*callers)
+
+        assert len(calls) == 1
+        assert all(result is results[0] for result in results)
+        assert flights.stats() == {"attendance": {"calls": 5, "executions": 1, "coalesced": 4}}
+        assert flights.inflight() == 0
+
+        #Once landed, the next call runs again
+        release.set()
+        await flights.do("attendance", "22z000", fetch)
+        assert len(calls) == 2
+
+    asyncio.run(run())
+
+
+def test_different_keys_do_not_coalesce():
+    async def run():
+        flights = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return object()
+
+        first, second = await asyncio.gather(flights.do("attendance", "22z000", fetch),
+                                             flights.do("attendance", "22z001", fetch))
+        assert first is not second
+        assert flights.stats()["attendance"]["executions"] == 2
+
+    asyncio.run(run())
+
+
+def test_exception_reaches_every_waiter():
+    async def run():
+        flights = SingleFlight()
+        error = ValueError("portal changed")
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise error
+
+        results = await asyncio.gather(*(flights.do("cgpa", "22z000", fetch) for _ in range(4)),
+                                       return_exceptions=True)
+        assert all(result is error for result in results)
+        assert flights.stats()["cgpa"]["executions"] == 1
+        assert flights.inflight() == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def run():
+        flights = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        leaving = asyncio.ensure_future(flights.do("timetable", "22z000", fetch))
+        staying = asyncio.ensure_future(flights.do("timetable", "22z000", fetch))
+        await asyncio.sleep(0)
+        leaving.cancel()
+
+        assert await staying == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+
+    asyncio.run(run())
@@ -0,0 +1,167 @@
+from .PortalLimiter import portal_limiter, SHARED_OWNER
+from .CircuitBreaker import portal_breaker, PortalError
+from .Metrics import metrics
+import asyncio
+import httpx
+import logging
+import os
+import time
+
+# Setup logging
+logger = logging.getLogger("nimora-api")
+
+#Connection limits shared by every student's client (timeouts in seconds)
+PORTAL_MAX_CONNECTIONS = int(os.environ.get("PORTAL_MAX_CONNECTIONS", "200"))
+PORTAL_MAX_KEEPALIVE   = int(os.environ.get("PORTAL_MAX_KEEPALIVE", "50"))
+PORTAL_KEEPALIVE_TTL   = float(os.environ.get("PORTAL_KEEPALIVE_TTL", "30"))
+PORTAL_TIMEOUT         = float(os.environ.get("PORTAL_TIMEOUT", "20"))
+
+
+class SharedPortalTransport(httpx.AsyncBaseTransport):
+    """Keep-alive connection pool shared by all portal clients
+
+    Each student gets their own httpx.AsyncClient so cookies never mix, but every
+    client sends through this transport, so connections to the portal are reused
+    across students and capped by PORTAL_MAX_CONNECTIONS. Closing a client leaves
+    the shared pool open; call shutdown() when the application stops.
+    """
+
+    def __init__(self):
+        self._transport = None
+
+    def _pool(self):
+        if self._transport is None:
+            self._transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=PORTAL_MAX_CONNECTIONS,
+                    max_keepalive_connections=PORTAL_MAX_KEEPALIVE,
+                    keepalive_expiry=PORTAL_KEEPALIVE_TTL
+                )
+            )
+        return self._transport
+
+    async def handle_async_request(self, request):
+        return await self.send(request, SHARED_OWNER)
+
+    async def send(self, request, owner):
+        #Fail fast while the portal is down, then wait a turn at the shared limiter, queued fairly per owner
+        probe = portal_breaker.before()
+        try:
+            if not await portal_limiter.acquireAsync(owner):
+                raise httpx.PoolTimeout("Portal request queue is full", request=request)
+        except BaseException:
+            portal_breaker.after(None, probe)
+            raise
+
+        started = time.monotonic()
+        try:
+            response = await self._pool().handle_async_request(request)
+        except BaseException as e:
+            self._finish(request, probe, started, error=e)
+            raise
+
+        #An error page is not the page asked for, scrapers would read it as "no data" and cache that
+        if response.status_code >= 500:
+            await response.aclose()
+            self._finish(request, probe, started, response.status_code)
+            raise PortalError()
+
+        #The slot is held until the body has been read, so the window caps transfers and not just headers
+        def finished(error):
+            self._finish(request, probe, started, response.status_code, error)
+        if response.is_closed:
+            #Already read in full by the transport, nothing will iterate or close the body again
+            finished(None)
+            return response
+        response.stream = PortalResponseStream(response.stream, finished)
+        return response
+
+    def _finish(self, request, probe, started, status=None, error=None):
+        """Hand the limiter slot back and tell the breaker and metrics how the request went"""
+        if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            #Cancelled requests hand their slot back without counting against the portal
+            portal_limiter.release(None, True)
+            portal_breaker.after(None, probe)
+            return
+        latency = time.monotonic() - started
+        if error is not None:
+            portal_limiter.release(None, False)
+            portal_breaker.after(False, probe)
+            metrics.observePortal(request.method, request.url.path, None, latency)
+            return
+        healthy = status < 500
+        portal_limiter.release(latency, healthy)
+        portal_breaker.after(healthy, probe)
+        metrics.observePortal(request.method, request.url.path, status, latency)
+
+    async def aclose(self):
+        #Clients share the pool, so closing one of them must not close it
+        pass
+
+    def useTransport(self, transport):
+        """Send through the given transport instead of the network, e.g. to a stub portal in benchmarks"""
+        self._transport = transport
+
+    async def shutdown(self):
+        if self._transport is not None:
+            transport, self._transport = self._transport, None
+            await transport.aclose()
+
+
+class PortalResponseStream(httpx.AsyncByteStream):
+    """Body of a portal response that calls on_done once it has been read and closed
+
+    on_done gets the exception that cut the body short, or None.
+    """
+
+    def __init__(self, stream, on_done):
+        self._stream  = stream
+        self._on_done = on_done
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        except BaseException as e:
+            self._done(e)
+            raise
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._done(None)
+
+    def _done(self, error):
+        if self._on_done is not None:
+            on_done, self._on_done = self._on_done, None
+            on_done(error)
+
+
+portal_transport = SharedPortalTransport()
+
+
+class StudentPortalTransport(httpx.AsyncBaseTransport):
+    """One student's handle on the shared transport, so the limiter can tell students apart"""
+
+    def __init__(self, owner):
+        self.owner = owner
+
+    async def handle_async_request(self, request):
+        return await portal_transport.send(request, self.owner)
+
+    async def aclose(self):
+        pass
+
+
+def createPortalClient(owner=SHARED_OWNER):
+    """Create a cookie-isolated client that sends through the shared portal transport"""
+    return httpx.AsyncClient(
+        transport=StudentPortalTransport(owner),
+        timeout=PORTAL_TIMEOUT,
+        follow_redirects=True
+    )
+
+
+async def closePortalTransport():
+    await portal_transport.shutdown()
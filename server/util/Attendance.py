@@ -1,30 +1,41 @@
-from bs4 import BeautifulSoup
-from pandas import DataFrame
+from .CourseCache import course_map_cache
+from .Parsing import parseDocument, findFirst, hasClass, tableRecords, text
+from .Metrics import timed
+from .PortalUrls import portalUrl
+from .Records import LeaveRecord, LeaveTableRecord
+import math
 
-def getStudentAttendance(session):
-    #Get the student attendance page using the current session
-    student_percentage_url = "https://ecampus.psgtech.ac.in/studzone/Attendance/StudentPercentage"
-    student_percentage_page = session.get(student_percentage_url)
+STUDENT_PERCENTAGE_URL = portalUrl("/studzone/Attendance/StudentPercentage")
+COURSE_PLAN_URL        = portalUrl("/studzone/Attendance/courseplan")
 
+async def getStudentAttendanceAsync(client):
+    #Get the student attendance page using the current client
+    student_percentage_page = await client.get(STUDENT_PERCENTAGE_URL)
+
+    records = parseStudentAttendance(student_percentage_page.text)
+    course_map = await getCourseNamesAsync(client, codes=courseCodes(records))
+
+    return mapCourseNames(records, course_map)
+
+@timed("parse:attendance")
+def parseStudentAttendance(html):
     #Get the html from the student attendance page
-    attendance_soup = BeautifulSoup(student_percentage_page.text,"lxml")
+    attendance_page = parseDocument(html)
 
     #Get the table element from the html
-    attendance_table = attendance_soup.find("table",{"id":"example"}).find("tbody")
+    attendance_table = findFirst(findFirst(attendance_page, "//table[@id='example']"), ".//tbody")
 
-    #Get the list of table rows
-    table_rows = attendance_table.find_all("tr")
+    #Extract the cell values of each table row
+    return tableRecords(attendance_table.iter("tr"))
 
-    #Get the mapping of course code to course name's initials
-    course_map = getCourseNames(session)
+def courseCodes(records):
+    return [record[0] for record in records if record]
 
-    #Extract the values and append it to a list of records/rows
+def mapCourseNames(records, course_map):
+    #Append the course initials to each record, dropping courses missing from the course plan
     data = []
 
-    for row in table_rows:
-        record = []
-        for cell in row.find_all("td"):
-            record.append(cell.text)
+    for record in records:
         try:
             record[0] = ''.join( [ record[0], '   -   ', course_map[record[0]] ] )
         except KeyError:
@@ -33,84 +44,145 @@ def getStudentAttendance(session):
         
     return data
 
-def getCourseNames(session):
-    #Find the course details page url
-    courses_url = "https://ecampus.psgtech.ac.in/studzone/Attendance/courseplan"
+async def getCourseNamesAsync(client, codes=None):
+    #Serve the map from the course map cache, fetching the course plan at most once per client
+    #A cached map missing any of the given course codes is refetched
+    return await course_map_cache.getAsync(client, fetchCourseNamesAsync, codes)
 
-    #Get the course details page
-    courses_page = session.get(courses_url)
+async def fetchCourseNamesAsync(client):
+    courses_page = await client.get(COURSE_PLAN_URL)
 
+    return parseCourseNames(courses_page.text)
+
+@timed("parse:course_names")
+def parseCourseNames(html):
     #Get the html of the course details page
-    courses_soup = BeautifulSoup(courses_page.text, "lxml")
+    courses_page = parseDocument(html)
 
     #Get the list of div elements containing course details of each course
-    courses = courses_soup.find_all("div",{"class":"col-md-8"})
+    courses = courses_page.xpath(f"//div[{hasClass('col-md-8')}]")
 
     #Create an empty dictionary
     course_map = {}
 
     #Iterate through the list of divs to get the contents
     for course in courses:
-        course_code = course.find("h5")
-        course_name = course.find("h6")
+        course_code = findFirst(course, ".//h5")
+        course_name = findFirst(course, ".//h6")
 
         #Initialize an empty list
         course_initials = []
-        for words in course_name.text.split():
-            #Check for special characters
-            if ord(words[0]) in list(range(65,91)):
+        for words in text(course_name).split():
+            #Check for special characters (only capital letters start an initial)
+            if 65 <= ord(words[0]) <= 90:
                 #Append the first letter of each word in course name
                 course_initials.append(words[0])
 
         #Convert the list of initials to string and map it to the course code
-        course_map[course_code.text] = ''.join(course_initials)
+        course_map[text(course_code)] = ''.join(course_initials)
 
     return course_map
 
+@timed("compute:leaves")
 def getAffordableLeaves(data,custom_percentage):
     #Declare an empty result table
     result = []
 
     #Calculate affordable leaves for each course and update result
     for i in range(len(data)):
-        row=[data[i][0]]                #initialize row with course id
+        course_code = data[i][0]
         classes_total = int(data[i][1])  #typecast attendance values to int
         classes_present = int(data[i][4])
         
-        #Calculate attendance percentage
-        attendance_percentage = int((classes_present/classes_total)*100)
+        #Calculate attendance percentage, 0 for a course with no classes yet
+        attendance_percentage = attendancePercentage(classes_present, classes_total)
         
         #Calculate the customized leaves for the user and update row
         custom_leaves = calculateLeaves(classes_present,classes_total,custom_percentage)
 
-        #Update the row with calculated leaves and attendance percentage
-        row.append(attendance_percentage)
-        row.append(custom_leaves)
-        result.append(row)
-
-    #Create a dataframe from the result list with headers
-    result_header = ["Course Code", "Attendance", f"Bunks"]
-    df = DataFrame(result,columns=result_header)
+        #Update the result with calculated leaves and attendance percentage
+        result.append(LeaveRecord(course_code, attendance_percentage, custom_leaves))
 
-    return df
+    return result
     
 
+@timed("compute:leaves")
+def getAffordableLeavesTable(courses, custom_percentages):
+    """Affordable leaves of every course at each of the thresholds, in one pass over the courses
+
+    courses are (course_code, classes_present, classes_total) tuples. The bunks of each
+    course are keyed by the threshold as text, None where it can never be reached.
+    """
+    thresholds = [(f"{percentage:g}", percentage) for percentage in custom_percentages]
+
+    result = []
+    for course_code, classes_present, classes_total in courses:
+        #Calculate attendance percentage, 0 for a course with no classes yet
+        attendance_percentage = attendancePercentage(classes_present, classes_total)
+
+        bunks = {key: calculateLeaves(classes_present, classes_total, percentage) for key, percentage in thresholds}
+        result.append(LeaveTableRecord(course_code, attendance_percentage, bunks))
+
+    return result
+
+
+def attendancePercentage(classes_present, classes_total):
+    if classes_total == 0:
+        return 0
+    return int((classes_present/classes_total)*100)
+
+
 def calculateLeaves(classes_present , classes_total , maintenance_percentage):
-    #Initialize leaves with 0
-    affordable_leaves = 0
-    #Let i represent the ith class from last updated date
-    i=1
+    """Classes that can be skipped (negative: must be attended) to stay at the maintenance percentage
+
+    Solves for the count directly instead of simulating one class at a time, then
+    settles the boundary with the same float comparison the simulation used, so the
+    result is identical. Returns None when the percentage can never be crossed, and
+    for a course with no classes yet.
+    """
+    if classes_total == 0:
+        return None
 
     #First check whether or not current attendance meets maintenance and then proceed
     if float(classes_present/classes_total)*100 < maintenance_percentage:
-        #Simulate attendance after attending i classes while also checking if attendance met at each i
-        while float((classes_present + i)/(classes_total + i))*100 <= maintenance_percentage:
-            affordable_leaves -=1 #negative leaves denote number of unskippable classes to meet maintenance
-            i+=1
-    #Else block is run if maintenance is met
-    else:
-        while float(classes_present/(classes_total + i))*100 >= maintenance_percentage:
-            affordable_leaves +=1
-            i+=1
+        #Attending more classes only approaches 100%, so a maintenance of 100% or more is never met
+        if maintenance_percentage >= 100:
+            return None
+
+        #Attendance after attending i more classes is still at or below maintenance
+        def belowMaintenance(i):
+            return float((classes_present + i)/(classes_total + i))*100 <= maintenance_percentage
+
+        #(present + i) / (total + i) <= maintenance / 100, solved for i
+        estimate = (maintenance_percentage*classes_total - 100*classes_present) / (100 - maintenance_percentage)
+        unskippable = settleCount(belowMaintenance, estimate)
 
-    return affordable_leaves
\ No newline at end of file
+        #Negative leaves denote number of unskippable classes to meet maintenance
+        return -unskippable
+
+    #Else block is run if maintenance is met
+    #Skipping classes only approaches 0%, so a maintenance of 0% or less is never crossed
+    if maintenance_percentage <= 0:
+        return None
+
+    #Attendance after skipping i more classes still meets maintenance
+    def meetsMaintenance(i):
+        return float(classes_present/(classes_total + i))*100 >= maintenance_percentage
+
+    #present / (total + i) >= maintenance / 100, solved for i
+    estimate = 100*classes_present/maintenance_percentage - classes_total
+    return settleCount(meetsMaintenance, estimate)
+
+
+def settleCount(condition, estimate):
+    """The number of consecutive i = 1, 2, ... for which the condition holds
+
+    The condition must flip only once as i grows. estimate is the exact real-valued
+    crossing point; float rounding can move the true count by a step either way.
+    """
+    count = max(0, math.floor(estimate))
+    while count > 0 and not condition(count):
+        count -= 1
+    while condition(count + 1):
+        count += 1
+    return count
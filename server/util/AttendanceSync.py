@@ -0,0 +1,114 @@
+from collections import OrderedDict, deque
+from .SessionPool import credentialKey
+import hashlib
+import json
+import os
+import threading
+import time
+
+#How many students' snapshots are kept, and how many past versions for each
+ATTENDANCE_SNAPSHOTS = int(os.environ.get("ATTENDANCE_SNAPSHOTS", os.environ.get("CACHE_SIZE", "10000")))
+ATTENDANCE_HISTORY   = int(os.environ.get("ATTENDANCE_HISTORY", "20"))
+
+
+def attendanceVersion(rows):
+    """Version tag of an attendance table, derived from its content alone
+
+    The same table always gets the same version, so a version handed out by one
+    worker (or before a restart) still validates against another.
+    """
+    encoded = json.dumps(rows, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(encoded.encode()).hexdigest()[:16]
+
+
+def etagMatches(if_none_match, version):
+    """Whether an If-None-Match header names the given version"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"') == version:
+            return True
+    return False
+
+
+def diffAttendance(old_rows, new_rows):
+    """Rows of new_rows that differ from old_rows, with their class count deltas, and the course codes dropped"""
+    old = {row["course_code"]: row for row in old_rows}
+    changed = []
+    for row in new_rows:
+        before = old.pop(row["course_code"], None)
+        if before == row:
+            continue
+        change = dict(row)
+        change["total_classes_delta"] = row["total_classes"] - (before["total_classes"] if before else 0)
+        change["present_delta"] = row["present"] - (before["present"] if before else 0)
+        changed.append(change)
+    return changed, list(old)
+
+
+class AttendanceSnapshots:
+    """Recent versions of each student's attendance table, for conditional and delta responses
+
+    Every table served is recorded; a new version is kept only when the content
+    changed, so the history is a list of actual attendance updates with the time
+    they were first seen. Students are evicted least recently used first.
+    """
+
+    def __init__(self, max_students=ATTENDANCE_SNAPSHOTS, history=ATTENDANCE_HISTORY):
+        self.max_students = max_students
+        self.history      = history
+        self._students    = OrderedDict()
+        self._lock        = threading.Lock()
+
+    def record(self, rollno, password, rows):
+        """Remember the table as the student's latest snapshot and return its version"""
+        version = attendanceVersion(rows)
+        key = credentialKey(rollno, password)
+        with self._lock:
+            snapshots = self._students.get(key)
+            if snapshots is None:
+                snapshots = self._students[key] = deque(maxlen=self.history)
+            self._students.move_to_end(key)
+            if not snapshots or snapshots[-1][0] != version:
+                snapshots.append((version, rows, time.time()))
+            while len(self._students) > self.max_students:
+                self._students.popitem(last=False)
+        return version
+
+    def delta(self, rollno, password, rows, since):
+        """Changes from the since version to rows; the full table when since is no longer known"""
+        version = attendanceVersion(rows)
+        base = None
+        if since == version:
+            base = rows
+        else:
+            with self._lock:
+                for snapshot_version, snapshot_rows, _ in self._students.get(credentialKey(rollno, password), ()):
+                    if snapshot_version == since:
+                        base = snapshot_rows
+
+        if base is None:
+            return {"version": version, "since": since, "full": True, "changed": rows, "removed": []}
+
+        changed, removed = diffAttendance(base, rows)
+        return {"version": version, "since": since, "full": False, "changed": changed, "removed": removed}
+
+    def snapshots(self, rollno, password):
+        """Past versions of the student's table, oldest first, as (version, rows, first seen at)"""
+        with self._lock:
+            return list(self._students.get(credentialKey(rollno, password), ()))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "students": len(self._students),
+                "snapshots": sum(len(snapshots) for snapshots in self._students.values())
+            }
+
+
+attendance_snapshots = AttendanceSnapshots()
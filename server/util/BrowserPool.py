@@ -0,0 +1,209 @@
+from contextlib import contextmanager
+from fastapi import HTTPException
+from .PortalUrls import PORTAL_BASE_URL
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("nimora-feedback")
+
+#Pool configuration (sizes in browsers, times in seconds)
+BROWSER_POOL_SIZE    = int(os.environ.get("BROWSER_POOL_SIZE", "2"))
+BROWSER_POOL_PREWARM = int(os.environ.get("BROWSER_POOL_PREWARM", "0"))
+BROWSER_MAX_JOBS     = int(os.environ.get("BROWSER_MAX_JOBS", "25"))
+BROWSER_IDLE_TTL     = float(os.environ.get("BROWSER_IDLE_TTL", "600"))
+BROWSER_WAIT_TIMEOUT = float(os.environ.get("BROWSER_WAIT_TIMEOUT", "300"))
+
+#Site whose cookies and storage are wiped between jobs
+PORTAL_ORIGIN = PORTAL_BASE_URL
+
+
+class _PooledBrowser:
+    __slots__ = ("driver", "jobs", "idle_since")
+
+    def __init__(self, driver):
+        self.driver     = driver
+        self.jobs       = 0
+        self.idle_since = time.monotonic()
+
+
+class BrowserPool:
+    """Bounded pool of warm browsers reused across feedback jobs
+
+    At most max_size browsers exist at once; a job that finds none idle waits for
+    one to be returned. Each browser is health-checked before it is handed out,
+    wiped of cookies and storage when it comes back, and quit after max_jobs jobs
+    or idle_ttl seconds unused, so a leaking or crashed browser never lingers.
+    """
+
+    def __init__(self, create, max_size=BROWSER_POOL_SIZE, max_jobs=BROWSER_MAX_JOBS, idle_ttl=BROWSER_IDLE_TTL):
+        self.create    = create
+        self.max_size  = max_size
+        self.max_jobs  = max_jobs
+        self.idle_ttl  = idle_ttl
+        self._idle     = []
+        self._open     = 0
+        self._ready    = threading.Condition()
+        self.launched  = 0
+        self.reused    = 0
+        self.recycled  = 0
+        self.unhealthy = 0
+
+    @contextmanager
+    def browser(self, timeout=BROWSER_WAIT_TIMEOUT):
+        """Lend a clean browser for one job and take it back afterwards"""
+        entry = self._acquire(timeout)
+        try:
+            yield entry.driver
+        finally:
+            #A failed job does not spoil the browser, the reset on release tells
+            self._release(entry)
+
+    def prewarm(self, count=BROWSER_POOL_PREWARM):
+        """Launch browsers ahead of the first job, up to the pool size"""
+        for _ in range(min(count, self.max_size)):
+            with self._ready:
+                if self._open >= self.max_size:
+                    return
+                self._open += 1
+            try:
+                entry = self._launch()
+            except Exception as e:
+                self._closed()
+                logger.warning(f"Could not pre-warm browser: {e}")
+                return
+            with self._ready:
+                self._idle.append(entry)
+                self._ready.notify()
+
+    def shutdown(self):
+        """Quit every idle browser; browsers lent out are quit when they come back"""
+        with self._ready:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self.max_size = 0
+        for entry in idle:
+            self._quit(entry)
+
+    def stats(self):
+        with self._ready:
+            return {
+                "open": self._open,
+                "idle": len(self._idle),
+                "launched": self.launched,
+                "reused": self.reused,
+                "recycled": self.recycled,
+                "unhealthy": self.unhealthy
+            }
+
+    def _acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            entry, launch, expired = self._take(deadline)
+            for stale in expired:
+                self._quit(stale)
+
+            if launch:
+                try:
+                    return self._launch()
+                except Exception:
+                    self._closed()
+                    raise
+
+            if entry is None:
+                continue
+            if self._isHealthy(entry):
+                with self._ready:
+                    self.reused += 1
+                return entry
+
+            with self._ready:
+                self.unhealthy += 1
+            self._closed()
+            self._quit(entry)
+
+    def _take(self, deadline):
+        """Return (idle browser, whether to launch one, expired browsers to quit)"""
+        with self._ready:
+            #Quit browsers that have sat unused for too long, oldest first
+            now = time.monotonic()
+            expired = []
+            while self._idle and now - self._idle[0].idle_since >= self.idle_ttl:
+                expired.append(self._idle.pop(0))
+                self._open -= 1
+
+            if self._idle:
+                return self._idle.pop(), False, expired
+            if self._open < self.max_size:
+                self._open += 1
+                return None, True, expired
+            if not expired:
+                if now >= deadline:
+                    raise HTTPException(status_code=503, detail="All feedback browsers are busy. Please try again later.")
+                self._ready.wait(deadline - now)
+            return None, False, expired
+
+    def _release(self, entry):
+        entry.jobs += 1
+        recycle = entry.jobs >= self.max_jobs
+        keep = not recycle and self._reset(entry)
+
+        with self._ready:
+            if recycle:
+                self.recycled += 1
+            elif not keep:
+                self.unhealthy += 1
+
+            if keep and self._open <= self.max_size:
+                entry.idle_since = time.monotonic()
+                self._idle.append(entry)
+            else:
+                keep = False
+                self._open -= 1
+            self._ready.notify()
+
+        if not keep:
+            self._quit(entry)
+
+    def _closed(self):
+        #A browser slot was given up, let a waiting job take it
+        with self._ready:
+            self._open -= 1
+            self._ready.notify()
+
+    def _launch(self):
+        entry = _PooledBrowser(self.create())
+        with self._ready:
+            self.launched += 1
+        return entry
+
+    def _isHealthy(self, entry):
+        try:
+            entry.driver.execute_script("return 1")
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled browser failed its health check: {e}")
+            return False
+
+    def _reset(self, entry):
+        """Leave nothing of the last student in the browser, as a fresh incognito window would"""
+        driver = entry.driver
+        try:
+            try:
+                #DevTools clears cookies of every site, not just the current page's
+                driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": PORTAL_ORIGIN, "storageTypes": "all"})
+            except AttributeError:
+                driver.delete_all_cookies()
+            driver.get("about:blank")
+            return True
+        except Exception as e:
+            logger.warning(f"Could not reset pooled browser: {e}")
+            return False
+
+    def _quit(self, entry):
+        try:
+            entry.driver.quit()
+        except Exception as e:
+            logger.warning(f"Error quitting pooled browser: {e}")
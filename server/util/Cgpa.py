@@ -1,66 +1,61 @@
-from bs4 import BeautifulSoup
-from pandas import DataFrame
-from fastapi import HTTPException
+from .Records import SemesterRecord
+from .Parsing import parseDocument, findFirst, tableRecords
+from .Metrics import timed
+from .PortalUrls import portalUrl
 
-def getStudentCourses(session):
-    #Get the courses page using the current session
-    courses_page_url = "https://ecampus.psgtech.ac.in/studzone2/AttWfStudCourseSelection.aspx"
-    courses_page = session.get(courses_page_url)
+COURSES_PAGE_URL = portalUrl("/studzone2/AttWfStudCourseSelection.aspx")
+RESULTS_PAGE_URL = portalUrl("/studzone2/FrmEpsStudResult.aspx")
 
+#Map the letter grades to their corresponding numeric values
+LETTER_GRADES = {
+    "O":10,
+    "A+":9,
+    "A":8,
+    "B+":7,
+    "B":6,
+    "C":5,
+}
+
+async def getStudentCoursesAsync(client):
+    courses_page = await client.get(COURSES_PAGE_URL)
+
+    return parseStudentCourses(courses_page.text)
+
+
+@timed("parse:courses")
+def parseStudentCourses(html):
     #Get the html from the courses page
-    courses_soup = BeautifulSoup(courses_page.text, "lxml")
+    courses_page = parseDocument(html)
 
     #Get the completed courses table element
-    completed_courses_table = courses_soup.find("table",{"id":"PDGCourse"})
+    completed_courses_table = findFirst(courses_page, "//table[@id='PDGCourse']")
 
-    #Get the table rows
-    completed_table_rows = completed_courses_table.find_all("tr")
+    #Extract the records and values of the table rows and store in list of lists
+    data = tableRecords(completed_courses_table.iter("tr"))
     
-    #Extract the records and values and store in list of lists
-    data = []
-
-    for row in completed_table_rows:
-        record=[]
-        for cell in row.find_all("td"):
-            record.append(cell.text)
-        data.append(record)
-    
-    #Map the letter grades to their corresponding numeric values:
-    letter_grade = {
-        "O":10,
-        "A+":9,
-        "A":8,
-        "B+":7,
-        "B":6,
-        "C":5,
-    }
-
     #Convert required data to readable format
     completed_courses = []
     for row in data[1:]:
         completed_courses.append(row[1].strip())
         row[4] = int(row[4].strip())
-        row[6] = letter_grade[row[6].strip()]
+        row[6] = LETTER_GRADES[row[6].strip()]
         row[7] = int(row[7].strip())
 
     return data
 
 
-def getCompletedSemester(session):
-    results_page_url = "https://ecampus.psgtech.ac.in/studzone2/FrmEpsStudResult.aspx"
-    results_page     = session.get(results_page_url)
-    
-    results_page_soup = BeautifulSoup(results_page.text, "lxml")
-    results_table = results_page_soup.find("table",{"id":"DgResult"})
-    
-    rows = results_table.find_all("tr")
+async def getCompletedSemesterAsync(client):
+    results_page = await client.get(RESULTS_PAGE_URL)
+
+    return parseCompletedSemester(results_page.text)
+
+
+@timed("parse:completed_semester")
+def parseCompletedSemester(html):
+    results_page = parseDocument(html)
+    results_table = findFirst(results_page, "//table[@id='DgResult']")
     
-    data = []
-    for row in rows:
-        record = []
-        for cell in row.find_all("td"):
-            record.append(cell.text)
-        data.append(record)
+    data = tableRecords(results_table.iter("tr"))
     
     #Returns the least semester with RA or next semester if none
     for record in data[1:]:
@@ -72,54 +67,87 @@ def getCompletedSemester(session):
     return sem_index+1
 
 
-def getCGPA(data, completed_semester):
-    from pandas import DataFrame
-
+@timed("compute:cgpa")
+def getSemesterTotals(data, completed_semester):
+    """Grade points and credits of each completed semester, with running totals, in one pass"""
     #Get the most recent semester for iterating
     most_recent_semester = data[1][4]
 
-    #Create a dataframe with required columns
-    data[0][4]="COURSE_SEM"
-    df = DataFrame(data[1:],columns=data[0])
-    required_columns = ["COURSE_SEM","GRADE","CREDITS"]
-    df = df[required_columns]
+    #Total the grade points and credits of each semester in one pass over the courses
+    semester_totals = {}
+    for row in data[1:]:
+        product, credits = semester_totals.get(row[4], (0, 0))
+        semester_totals[row[4]] = (product + row[6] * row[7], credits + row[7])
 
-    #Declare an empty result table with header
-    result_headers = ["SEMESTER","GPA","CGPA"]
-    result = []
-    
-    #Initialize to calculate cgpa upto each semester
+    #Accumulate up to the first semester with backlogs, whose cgpa is still pending
     overall_product = 0
     overall_credits = 0
+    semesters = []
+    for semester in range(1, min(completed_semester, most_recent_semester+1)):
+        semester_product, semester_credits = semester_totals.get(semester, (0, 0))
 
-    #Initialize backlogs flag to handle pending cgpa calculation
-    backlogs = False
-    for semester in range(1,most_recent_semester+1): #index from 1st to most recent semester
-        if not backlogs:
-            courses = df.loc[df["COURSE_SEM"] == semester] #get all courses of particular semester
-            if semester >= completed_semester: #check for backlogs in particular semester
-                backlogs = True
-                record = [semester , "-", "-"]
-                result.append(record)
-            else:
-                semester_product = sum(courses["GRADE"] * courses["CREDITS"])
-                semester_credits = sum(courses["CREDITS"])
-
-                overall_product += semester_product
-                overall_credits += semester_credits
-
-                semester_gpa  = float(semester_product / semester_credits)
-                semester_cgpa = float(overall_product / overall_credits)
-                
-                semester_gpa = '{:.5f}'.format(semester_gpa)[:-1]
-                semester_cgpa = '{:.5f}'.format(semester_cgpa)[:-1]
-                
-                record = [semester , semester_gpa , semester_cgpa]
-                result.append(record)    
-        else:
-            record = [semester , "-", "-"]
-            result.append(record)
-    
-    result = DataFrame(result, columns=result_headers)
+        overall_product += semester_product
+        overall_credits += semester_credits
+
+        semesters.append([semester, semester_product, semester_credits, overall_product, overall_credits])
+
+    return {
+        "most_recent_semester": most_recent_semester,
+        "semesters": semesters
+    }
+
+
+@timed("compute:cgpa")
+def getSemesterRecords(totals):
+    """GPA and CGPA of every semester from the running totals, "-" from the first backlog on"""
+    result = []
+    for semester, semester_product, semester_credits, overall_product, overall_credits in totals["semesters"]:
+        semester_gpa  = formatGrade(semester_product / semester_credits)
+        semester_cgpa = formatGrade(overall_product / overall_credits)
+
+        result.append(SemesterRecord(semester, semester_gpa, semester_cgpa))
+
+    for semester in range(len(result)+1, totals["most_recent_semester"]+1):
+        result.append(SemesterRecord(semester, "-", "-"))
 
     return result
+
+
+@timed("compute:cgpa_projection")
+def projectCGPA(totals, courses):
+    """Projected CGPA if the pending courses get the given grades
+
+    Each course is a (grade, credits) pair, the grade either a letter or its points.
+    Only the last running total is needed, so this does not revisit any course.
+    """
+    overall_product, overall_credits = 0, 0
+    if totals["semesters"]:
+        overall_product, overall_credits = totals["semesters"][-1][3:]
+
+    pending_product = 0
+    pending_credits = 0
+    for grade, credits in courses:
+        if isinstance(grade, bool) or not isinstance(grade, (str, int, float)):
+            raise ValueError(f"Invalid grade: {grade}")
+        points = LETTER_GRADES.get(grade, grade)
+        if isinstance(points, bool) or not isinstance(points, (int, float)) or not 0 <= points <= 10:
+            raise ValueError(f"Invalid grade: {grade}")
+        if isinstance(credits, bool) or not isinstance(credits, int) or credits <= 0:
+            raise ValueError(f"Invalid credits: {credits}")
+        pending_product += points * credits
+        pending_credits += credits
+
+    projected_product = overall_product + pending_product
+    projected_credits = overall_credits + pending_credits
+
+    return {
+        "current_cgpa": formatGrade(overall_product / overall_credits) if overall_credits else "-",
+        "pending_gpa": formatGrade(pending_product / pending_credits) if pending_credits else "-",
+        "projected_cgpa": formatGrade(projected_product / projected_credits) if projected_credits else "-",
+        "credits": projected_credits
+    }
+
+
+def formatGrade(value):
+    #Round to five decimal places and drop the last digit
+    return '{:.5f}'.format(float(value))[:-1]
@@ -0,0 +1,108 @@
+from fastapi import HTTPException
+import logging
+import math
+import os
+import threading
+import time
+
+# Setup logging
+logger = logging.getLogger("nimora-api")
+
+#Breaker configuration (times in seconds)
+PORTAL_BREAKER_FAILURES = int(os.environ.get("PORTAL_BREAKER_FAILURES", "5"))
+PORTAL_BREAKER_COOLDOWN = float(os.environ.get("PORTAL_BREAKER_COOLDOWN", "30"))
+
+CLOSED    = "closed"
+OPEN      = "open"
+HALF_OPEN = "half_open"
+
+
+class PortalError(HTTPException):
+    """The portal answered with a server error, so its page must not be parsed or cached as data"""
+
+    def __init__(self, status_code=502, detail="The eCampus portal returned an error. Please try again shortly.",
+                 headers=None):
+        super().__init__(status_code=status_code, detail=detail, headers=headers)
+
+
+class PortalUnavailable(PortalError):
+    """Raised instead of contacting the portal while the circuit breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(
+            status_code=503,
+            detail="The eCampus portal is not responding. Please try again shortly.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+
+class CircuitBreaker:
+    """Stops sending requests to the portal while it is failing
+
+    After failures consecutive 5xx responses or transport errors the breaker
+    opens and every portal request fails at once with PortalUnavailable, so
+    workers are not tied up waiting on a dead portal. After cooldown seconds
+    the next request goes through as a probe, one at a time: if it succeeds the
+    breaker closes, otherwise it stays open for another cooldown.
+    """
+
+    def __init__(self, failures=PORTAL_BREAKER_FAILURES, cooldown=PORTAL_BREAKER_COOLDOWN):
+        self.failures   = failures
+        self.cooldown   = cooldown
+        self.state      = CLOSED
+        self._streak    = 0
+        self._opened_at = 0.0
+        self._probing   = False
+        self._lock      = threading.Lock()
+        self.opened     = 0
+        self.rejected   = 0
+        self.probes     = 0
+
+    def before(self):
+        """Admit a request, returning whether it is a probe; raises PortalUnavailable while open"""
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+            retry_after = self._opened_at + self.cooldown - time.monotonic()
+            if retry_after <= 0 and not self._probing:
+                self.state = HALF_OPEN
+                self._probing = True
+                self.probes += 1
+                return True
+            self.rejected += 1
+        raise PortalUnavailable(max(retry_after, 1))
+
+    def after(self, healthy, probe):
+        """Record how a request admitted by before() went; healthy is None when it never got an answer"""
+        with self._lock:
+            if probe:
+                self._probing = False
+            if healthy is None:
+                return
+            if healthy:
+                self._streak = 0
+                if self.state != CLOSED:
+                    self.state = CLOSED
+                    logger.warning("Portal is responding again, closing the circuit breaker")
+                return
+
+            self._streak += 1
+            if probe or (self.state == CLOSED and self._streak >= self.failures):
+                if self.state == CLOSED:
+                    self.opened += 1
+                    logger.warning(f"Portal failed {self._streak} times in a row, opening the circuit breaker")
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "failure_streak": self._streak,
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "probes": self.probes
+            }
+
+
+portal_breaker = CircuitBreaker()
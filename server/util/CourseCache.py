@@ -0,0 +1,148 @@
+from collections import OrderedDict
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+
+# Setup logging
+logger = logging.getLogger("nimora-api")
+
+#A student's course plan only changes between terms, so the per-student tier is long lived
+COURSE_MAP_TTL  = float(os.environ.get("COURSE_MAP_TTL", str(120 * 24 * 3600)))
+COURSE_MAP_SIZE = int(os.environ.get("COURSE_MAP_SIZE", "4096"))
+
+
+class CourseMapCache:
+    """Two-tier cache of course code to course initials maps
+
+    The session tier holds the map for as long as the portal session lives, so the
+    attendance, internals and timetable scrapers of one request share one fetch.
+    The student tier keeps the map across sessions until it expires or a course
+    code shows up that the cached map does not know about. Codes that are still
+    missing after a refetch are remembered so they do not trigger another one.
+    """
+
+    def __init__(self, ttl=COURSE_MAP_TTL, max_size=COURSE_MAP_SIZE):
+        self.ttl         = ttl
+        self.max_size    = max_size
+        self._sessions   = weakref.WeakKeyDictionary()
+        self._owners     = weakref.WeakKeyDictionary()
+        self._students   = OrderedDict()
+        self._lock       = threading.Lock()
+        self.hits        = 0
+        self.misses      = 0
+
+    def bindStudent(self, session, rollno):
+        """Record which student a portal session belongs to"""
+        with self._lock:
+            self._owners[session] = rollno
+
+    async def getAsync(self, client, fetch, codes=None):
+        """Return the course map for the portal client, awaiting fetch(client) only on a miss"""
+        slot, rollno = self._slot(client)
+
+        #Serialise lookups per client so concurrent scrapers wait for a single fetch
+        async with slot.async_lock():
+            course_map = self._lookup(slot, rollno, codes)
+            if course_map is None:
+                course_map = self._record(slot, rollno, codes, await fetch(client))
+            return course_map
+
+    def _slot(self, session):
+        with self._lock:
+            slot = self._sessions.get(session)
+            if slot is None:
+                slot = self._sessions[session] = _SessionSlot()
+            return slot, self._owners.get(session)
+
+    def _lookup(self, slot, rollno, codes):
+        if slot.course_map is not None and (slot.fresh or self._covers(slot.course_map, slot.unknown, codes)):
+            self._count(hit=True)
+            return slot.course_map
+
+        if slot.course_map is None and rollno is not None:
+            cached = self._student(rollno)
+            if cached is not None and self._covers(cached[0], cached[1], codes):
+                slot.course_map, slot.unknown = cached
+                self._count(hit=True)
+                return slot.course_map
+
+        self._count(hit=False)
+        return None
+
+    def _record(self, slot, rollno, codes, course_map):
+        unknown = frozenset(code for code in (codes or ()) if code not in course_map)
+        if slot.unknown:
+            unknown |= frozenset(code for code in slot.unknown if code not in course_map)
+        slot.course_map = course_map
+        slot.unknown = unknown
+        slot.fresh = True
+        if rollno is not None:
+            self._store(rollno, course_map, unknown)
+        return course_map
+
+    def invalidate(self, rollno):
+        with self._lock:
+            self._students.pop(rollno, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "students": len(self._students),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    @staticmethod
+    def _covers(course_map, unknown, codes):
+        #A cached map must know every requested code, or have already failed to find it
+        if not codes:
+            return True
+        return all(code in course_map or code in unknown for code in codes)
+
+    def _student(self, rollno):
+        with self._lock:
+            entry = self._students.get(rollno)
+            if entry is None:
+                return None
+            course_map, unknown, fetched_at = entry
+            if time.monotonic() - fetched_at >= self.ttl:
+                del self._students[rollno]
+                return None
+            self._students.move_to_end(rollno)
+            return course_map, unknown
+
+    def _store(self, rollno, course_map, unknown):
+        with self._lock:
+            self._students[rollno] = (course_map, unknown, time.monotonic())
+            self._students.move_to_end(rollno)
+            while len(self._students) > self.max_size:
+                self._students.popitem(last=False)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+class _SessionSlot:
+    __slots__ = ("_async_lock", "course_map", "unknown", "fresh")
+
+    def __init__(self):
+        self._async_lock = None
+        self.course_map  = None
+        self.unknown     = frozenset()
+        self.fresh       = False
+
+    def async_lock(self):
+        #Created lazily so it binds to the running event loop
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        return self._async_lock
+
+
+course_map_cache = CourseMapCache()
@@ -1,20 +1,23 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import StaleElementReferenceException
-from webdriver_manager.chrome import ChromeDriverManager
 from random import randint
 from fastapi import HTTPException
+from .BrowserPool import BrowserPool
+from .FeedbackHttp import submitFeedbackHttp, FormNotRecognised, FeedbackPortalError
+from .PortalUrls import portalUrl
+from .SessionPool import getPooledHomePageAttendance, discardPooledSessions
 import logging
 import os
 
 logger = logging.getLogger("nimora-feedback")
 
+# Selenium and webdriver_manager are imported inside the browser engine's functions,
+# so they load on the first job that needs a browser instead of with the app
+
 # Check if feedback feature is disabled
 FEEDBACK_DISABLED = os.environ.get("DISABLE_FEEDBACK", "false").lower() == "true"
 
+# "auto" posts the forms over HTTP and falls back to the browser, "http" or "browser" forces one
+FEEDBACK_ENGINE = os.environ.get("FEEDBACK_ENGINE", "auto").lower()
+
 
 def create_driver():
     """Set up and create a Chrome WebDriver instance"""
@@ -24,9 +27,15 @@ def create_driver():
             detail="Feedback automation is currently disabled. Please try again later or contact support."
         )
     
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
+    
     options = webdriver.ChromeOptions()
     # Use headless mode
     options.add_argument("--headless=new")
+    # Start every browser without a persistent profile
+    options.add_argument("--incognito")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage")
     options.add_argument("--window-size=1920,1080")
@@ -95,6 +104,11 @@ def create_driver():
 
 def intermediate_feedback(browser):
     """Process intermediate feedback form"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import StaleElementReferenceException
+    
     # Get the courses
     courses = browser.find_elements(By.CLASS_NAME, "intermediate-body")
 
@@ -126,12 +140,15 @@ def intermediate_feedback(browser):
         back = browser.find_element(By.CLASS_NAME, "overlay")
         browser.execute_script("arguments[0].click();", back)
     
-    browser.quit()
     return {"status": "success", "message": "Intermediate feedback completed"}
 
 
 def endsem_feedback(browser):
     """Process end-semester feedback form"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    
     wait = WebDriverWait(browser, 10)
     try:
         wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "div.staff-item")))
@@ -160,11 +177,14 @@ def endsem_feedback(browser):
     final_submit_button = browser.find_element(By.ID, "btnFinalSubmit")
     browser.execute_script("arguments[0].scrollIntoView();arguments[0].click()", final_submit_button)
     
-    browser.quit()
     return {"status": "success", "message": "End semester feedback completed"}
 
 
-async def auto_feedback_task(index, rollno, password):
+# Warm browsers shared by feedback jobs, returned to the pool instead of quit
+browser_pool = BrowserPool(create_driver)
+
+
+def auto_feedback_task(index, rollno, password):
     """Background task to complete feedback forms"""
     if FEEDBACK_DISABLED:
         logger.warning("Feedback automation is disabled")
@@ -173,54 +193,81 @@ async def auto_feedback_task(index, rollno, password):
             detail="Feedback automation is currently disabled. Please try again later or contact support."
         )
     
-    browser = None
+    if FEEDBACK_ENGINE != "browser":
+        try:
+            return http_feedback(index, rollno, password)
+        except FormNotRecognised as e:
+            if FEEDBACK_ENGINE == "http":
+                raise HTTPException(status_code=502, detail=f"Feedback form not recognised: {e}")
+            logger.warning(f"Feedback form not recognised, falling back to the browser: {e}")
+    
+    return browser_feedback(index, rollno, password)
+
+
+def http_feedback(index, rollno, password):
+    """Submit the feedback with form POSTs over the student's pooled portal session"""
+    session = getPooledHomePageAttendance(rollno, password)
+    if not session:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
     try:
-        # Create a webdriver with error handling
-        browser = create_driver()
-        wait = WebDriverWait(browser, 10)
-        
-        browser.get("https://ecampus.psgtech.ac.in/studzone")
-        
-        # Fill out the credentials
-        rollno_field = browser.find_element(By.ID, "rollno")
-        rollno_field.send_keys(rollno)
+        return submitFeedbackHttp(session, index)
+    except FeedbackPortalError:
+        # The portal failed or logged us out mid-way, the retry logs in afresh
+        discardPooledSessions(rollno, password)
+        raise
+    except (HTTPException, FormNotRecognised):
+        raise
+    except Exception:
+        # The session may have expired mid-way, log in afresh for the next try
+        discardPooledSessions(rollno, password)
+        raise
 
-        password_field = browser.find_element(By.ID, "password")
-        password_field.send_keys(password)
 
-        checkbox = browser.find_element(By.ID, "terms")
-        browser.execute_script("arguments[0].click();", checkbox)
+def browser_feedback(index, rollno, password):
+    """Submit the feedback by driving the portal in a pooled browser"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    
+    try:
+        # Borrow a clean browser from the pool, it is reset and returned afterwards
+        with browser_pool.browser() as browser:
+            wait = WebDriverWait(browser, 10)
+            
+            browser.get(portalUrl("/studzone"))
+            
+            # Fill out the credentials
+            rollno_field = browser.find_element(By.ID, "rollno")
+            rollno_field.send_keys(rollno)
 
-        login_button = browser.find_element(By.ID, "btnLogin")
-        browser.execute_script("arguments[0].click();", login_button)
-        
-        # Get the feedback index page
-        feedback_card = wait.until(EC.element_to_be_clickable((By.XPATH, f"//h5[text()='Feedback']")))
-        browser.execute_script("arguments[0].scrollIntoView();arguments[0].click();", feedback_card)
-        
-        wait.until(EC.element_to_be_clickable((By.CLASS_NAME, "card-body")))
-        feedbacks = browser.find_elements(By.CLASS_NAME, "card-body")
-        
-        # Click the desired feedback
-        browser.execute_script("arguments[0].click();", feedbacks[index])
-        
-        # Process the appropriate feedback form
-        if index == 0:
-            return endsem_feedback(browser)
-        else:
-            return intermediate_feedback(browser)
+            password_field = browser.find_element(By.ID, "password")
+            password_field.send_keys(password)
+
+            checkbox = browser.find_element(By.ID, "terms")
+            browser.execute_script("arguments[0].click();", checkbox)
+
+            login_button = browser.find_element(By.ID, "btnLogin")
+            browser.execute_script("arguments[0].click();", login_button)
+            
+            # Get the feedback index page
+            feedback_card = wait.until(EC.element_to_be_clickable((By.XPATH, f"//h5[text()='Feedback']")))
+            browser.execute_script("arguments[0].scrollIntoView();arguments[0].click();", feedback_card)
+            
+            wait.until(EC.element_to_be_clickable((By.CLASS_NAME, "card-body")))
+            feedbacks = browser.find_elements(By.CLASS_NAME, "card-body")
+            
+            # Click the desired feedback
+            browser.execute_script("arguments[0].click();", feedbacks[index])
             
+            # Process the appropriate feedback form
+            if index == 0:
+                return endsem_feedback(browser)
+            else:
+                return intermediate_feedback(browser)
+            
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in feedback automation: {str(e)}")
-        if browser:
-            try:
-                browser.quit()
-            except:
-                pass
         raise HTTPException(status_code=500, detail=f"Error in feedback automation: {str(e)}")
-    finally:
-        if browser:
-            try:
-                browser.quit()
-            except:
-                pass
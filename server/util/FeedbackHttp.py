@@ -0,0 +1,172 @@
+from urllib.parse import urljoin
+from random import randint
+from fastapi import HTTPException
+from .Parsing import parseDocument, findFirst, hasClass, text
+from .PortalUrls import portalUrl
+import logging
+
+logger = logging.getLogger("nimora-feedback")
+
+STUDENT_HOME_URL = portalUrl("/studzone")
+
+
+class FormNotRecognised(Exception):
+    """The feedback pages are not plain HTML forms this engine knows how to fill"""
+
+
+class FeedbackPortalError(HTTPException):
+    """The portal failed mid-way; the job is retried over HTTP instead of handed to the browser"""
+
+    def __init__(self, detail):
+        super().__init__(status_code=502, detail=detail)
+
+
+def submitFeedbackHttp(session, index):
+    """Fill and submit a feedback form with plain form POSTs over a logged-in studzone session
+
+    Follows the same path the browser takes (home page, Feedback card, the index-th
+    feedback) and posts every rating form on the feedback page with the choices the
+    Selenium engine would click. Raises FormNotRecognised whenever a page does not
+    look like a plain HTML form before the first rating is posted, so the caller can
+    fall back to the browser. Server errors, and anything going wrong once a rating
+    has been posted, raise FeedbackPortalError: the browser would post the ratings
+    a second time, so the job is retried over HTTP instead.
+    """
+    home_page = getPage(session, STUDENT_HOME_URL)
+    feedback_url = findFeedbackLink(home_page.text, str(home_page.url))
+
+    index_page = getPage(session, feedback_url)
+    form_url = findFeedbackCard(index_page.text, str(index_page.url), index)
+
+    form_page = getPage(session, form_url)
+    forms = findRatingForms(form_page.text, str(form_page.url))
+    if not forms:
+        if index == 0:
+            raise HTTPException(status_code=404, detail="No end-semester feedback forms found")
+        raise HTTPException(status_code=404, detail="No intermediate feedback forms found")
+
+    #Pick what the browser engine clicks: one of the first two stars at end semester, else the first option
+    choose = (lambda options: options[randint(0, min(2, len(options)) - 1)]) if index == 0 else (lambda options: options[0])
+
+    action, fields, radio_groups = forms[0]
+    submitForm(session, action, ratingPayload(fields, radio_groups, choose))
+
+    try:
+        for action, fields, radio_groups in forms[1:]:
+            submitForm(session, action, ratingPayload(fields, radio_groups, choose))
+
+        #The end semester page is closed with a separate final submit once every staff is rated
+        final_form = findFinalSubmit(getPage(session, form_url).text, form_url) if index == 0 else None
+        if final_form is not None:
+            submitForm(session, *final_form)
+    except FormNotRecognised as e:
+        #Ratings are saved already, switching to the browser now would submit them twice
+        raise FeedbackPortalError(f"Feedback stopped after its first ratings were saved: {e}")
+
+    if index == 0:
+        return {"status": "success", "message": "End semester feedback completed"}
+    return {"status": "success", "message": "Intermediate feedback completed"}
+
+
+def ratingPayload(fields, radio_groups, choose):
+    payload = dict(fields)
+    for name, options in radio_groups.items():
+        payload[name] = choose(options)
+    return payload
+
+
+def getPage(session, url):
+    response = session.get(url)
+    #A portal error says nothing about the form, it is worth another try later
+    if response.status_code >= 500:
+        raise FeedbackPortalError(f"GET {url} returned {response.status_code}")
+    return response
+
+
+def submitForm(session, action, payload):
+    response = session.post(action, data=payload)
+    if response.status_code >= 500:
+        raise FeedbackPortalError(f"Form POST to {action} returned {response.status_code}")
+    #The form was refused as posted, so it is not the plain form it looked like
+    if not response.ok:
+        raise FormNotRecognised(f"Form POST to {action} returned {response.status_code}")
+    #Bounced back to the login form means the post was not accepted
+    if 'id="rollno"' in response.text:
+        raise FormNotRecognised(f"Form POST to {action} ended on the login page")
+
+
+def findFeedbackLink(html, base_url):
+    page = parseDocument(html)
+    link = findFirst(page, "//a[@href][.//h5[normalize-space()='Feedback']]")
+    if link is None:
+        raise FormNotRecognised("No Feedback link on the student home page")
+    return urljoin(base_url, link.get("href"))
+
+
+def findFeedbackCard(html, base_url, index):
+    page = parseDocument(html)
+    cards = page.xpath(f"//div[{hasClass('card-body')}]")
+    if index >= len(cards):
+        raise HTTPException(status_code=404, detail="Feedback form not found")
+
+    #The card is a link itself, sits inside one, or holds one
+    card = cards[index]
+    link = findFirst(card, "ancestor-or-self::a[@href][1]")
+    if link is None:
+        link = findFirst(card, ".//a[@href]")
+    if link is None or link.get("href", "").startswith(("#", "javascript:")):
+        raise FormNotRecognised("Feedback card does not link to a form page")
+    return urljoin(base_url, link.get("href"))
+
+
+def formFields(form):
+    """Hidden and text inputs of the form with their values, and its radio groups with their options"""
+    fields = []
+    radio_groups = {}
+    for field in form.xpath(".//input[@name]"):
+        kind = (field.get("type") or "text").lower()
+        if kind == "radio":
+            radio_groups.setdefault(field.get("name"), []).append(field.get("value", "on"))
+        elif kind in ("hidden", "text"):
+            fields.append((field.get("name"), field.get("value", "")))
+    for area in form.xpath(".//textarea[@name]"):
+        fields.append((area.get("name"), text(area)))
+    return fields, radio_groups
+
+
+def submitButton(form):
+    button = findFirst(form, ".//*[self::input or self::button][@type='submit'][@name]")
+    if button is None:
+        return []
+    return [(button.get("name"), button.get("value", ""))]
+
+
+def findRatingForms(html, base_url):
+    """(action, fields, radio groups) of every form on the page that asks for ratings"""
+    page = parseDocument(html)
+    forms = []
+    for form in page.xpath("//form"):
+        fields, radio_groups = formFields(form)
+        if not radio_groups:
+            continue
+        #Ratings saved by script rather than a form post cannot be replayed here
+        if (form.get("method") or "get").lower() != "post":
+            raise FormNotRecognised("Rating form is not submitted with POST")
+        forms.append((urljoin(base_url, form.get("action") or base_url), fields + submitButton(form), radio_groups))
+
+    #Star ratings drawn outside any form are filled in by script
+    if not forms and page.xpath(f"//*[{hasClass('star-rating')} or {hasClass('intermediate-body')}]"):
+        raise FormNotRecognised("Ratings on the page are not inside a form")
+    return forms
+
+
+def findFinalSubmit(html, base_url):
+    page = parseDocument(html)
+    form = findFirst(page, "//form[.//*[@id='btnFinalSubmit']]")
+    if form is None:
+        return None
+    fields, _ = formFields(form)
+    button = findFirst(form, ".//*[@id='btnFinalSubmit']")
+    if button.get("name"):
+        fields.append((button.get("name"), button.get("value", "")))
+    return urljoin(base_url, form.get("action") or base_url), dict(fields)
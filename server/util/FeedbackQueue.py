@@ -0,0 +1,284 @@
+from fastapi import HTTPException
+from .SessionPool import credentialKey
+import heapq
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger("nimora-feedback")
+
+#Queue configuration (times in seconds)
+FEEDBACK_QUEUE_PATH    = os.environ.get("FEEDBACK_QUEUE_PATH", "/tmp/nimora-feedback.sqlite3")
+FEEDBACK_WORKERS       = int(os.environ.get("FEEDBACK_WORKERS", os.environ.get("BROWSER_POOL_SIZE", "2")))
+FEEDBACK_QUEUE_LIMIT   = int(os.environ.get("FEEDBACK_QUEUE_LIMIT", "500"))
+FEEDBACK_MAX_ATTEMPTS  = int(os.environ.get("FEEDBACK_MAX_ATTEMPTS", "3"))
+FEEDBACK_RETRY_BACKOFF = float(os.environ.get("FEEDBACK_RETRY_BACKOFF", "30"))
+FEEDBACK_JOB_RETENTION = float(os.environ.get("FEEDBACK_JOB_RETENTION", "604800"))
+
+QUEUED    = "queued"
+RUNNING   = "running"
+SUCCEEDED = "succeeded"
+FAILED    = "failed"
+
+
+class FeedbackJobStore:
+    """SQLite record of feedback jobs and their outcome; passwords are never written"""
+
+    def __init__(self, path=FEEDBACK_QUEUE_PATH):
+        self.path  = path
+        self._lock = threading.Lock()
+        self._db   = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS feedback_jobs ("
+            "job_id TEXT PRIMARY KEY, feedback_index INTEGER NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, owner INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def add(self, job_id, feedback_index, now):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO feedback_jobs (job_id, feedback_index, status, owner, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, feedback_index, QUEUED, os.getpid(), now, now)
+            )
+
+    def update(self, job_id, status, attempts, result=None, error=None):
+        with self._lock:
+            self._db.execute(
+                "UPDATE feedback_jobs SET status = ?, attempts = ?, result = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, attempts, None if result is None else json.dumps(result), error, time.time(), job_id)
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT job_id, feedback_index, status, attempts, result, error, created_at, updated_at "
+                "FROM feedback_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "feedback_index": row[1],
+            "status": row[2],
+            "attempts": row[3],
+            "result": None if row[4] is None else json.loads(row[4]),
+            "error": row[5],
+            "created_at": row[6],
+            "updated_at": row[7]
+        }
+
+    def abandon(self, error):
+        """Fail the jobs that processes no longer running left unfinished, their credentials died with them"""
+        abandoned = 0
+        with self._lock:
+            owners = self._db.execute(
+                "SELECT DISTINCT owner FROM feedback_jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall()
+            for (owner,) in owners:
+                #Other workers of the same server share the store and keep their own jobs
+                if owner != os.getpid() and isProcessRunning(owner):
+                    continue
+                cursor = self._db.execute(
+                    "UPDATE feedback_jobs SET status = ?, error = ?, updated_at = ? WHERE owner = ? AND status IN (?, ?)",
+                    (FAILED, error, time.time(), owner, QUEUED, RUNNING)
+                )
+                abandoned += cursor.rowcount
+        return abandoned
+
+    def prune(self, older_than):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM feedback_jobs WHERE updated_at < ? AND status IN (?, ?)",
+                (older_than, SUCCEEDED, FAILED)
+            )
+
+
+def isProcessRunning(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _Job:
+    __slots__ = ("job_id", "feedback_index", "rollno", "password", "attempts", "key")
+
+    def __init__(self, job_id, feedback_index, rollno, password, key):
+        self.job_id         = job_id
+        self.feedback_index = feedback_index
+        self.rollno         = rollno
+        self.password       = password
+        self.attempts       = 0
+        self.key            = key
+
+
+class FeedbackQueue:
+    """Feedback jobs run by a fixed number of worker threads, with retries and a status record
+
+    Jobs wait in memory, ordered by when they may next run, so the number of
+    browsers at work never exceeds the worker count however many students submit
+    at once. A job that fails on an unexpected error is retried with exponential
+    backoff; errors the portal gave a 4xx for (no forms, bad credentials) are final.
+    The outcome of every job is kept in the store for the status endpoint.
+    """
+
+    def __init__(self, run, store, workers=FEEDBACK_WORKERS, limit=FEEDBACK_QUEUE_LIMIT,
+                 max_attempts=FEEDBACK_MAX_ATTEMPTS, backoff=FEEDBACK_RETRY_BACKOFF):
+        self.run          = run
+        self.store        = store
+        self.workers      = workers
+        self.limit        = limit
+        self.max_attempts = max_attempts
+        self.backoff      = backoff
+        self._waiting     = []
+        self._active      = {}
+        self._order       = itertools.count()
+        self._threads     = []
+        self._stopping    = False
+        self._ready       = threading.Condition()
+        self.submitted    = 0
+        self.succeeded    = 0
+        self.failed       = 0
+        self.retried      = 0
+
+        abandoned = store.abandon("The server restarted before this job finished. Please submit it again.")
+        if abandoned:
+            logger.warning(f"Marked {abandoned} unfinished feedback jobs as failed")
+        store.prune(time.time() - FEEDBACK_JOB_RETENTION)
+
+    def submit(self, feedback_index, rollno, password):
+        """Queue a feedback job and return its id, or the id of the same job already queued"""
+        key = credentialKey(rollno, password) + (feedback_index,)
+        with self._ready:
+            if key in self._active:
+                return self._active[key].job_id
+            if len(self._active) >= self.limit:
+                raise HTTPException(status_code=503, detail="Too many feedback jobs are queued. Please try again later.")
+
+            job = _Job(uuid.uuid4().hex, feedback_index, rollno, password, key)
+            self.store.add(job.job_id, feedback_index, time.time())
+            self._active[key] = job
+            self.submitted += 1
+            self._schedule(job, time.monotonic())
+            self._startWorkers()
+        return job.job_id
+
+    def status(self, job_id):
+        job = self.store.get(job_id)
+        if job is not None and job["status"] == QUEUED:
+            job["position"] = self._position(job_id)
+        return job
+
+    def stats(self):
+        with self._ready:
+            return {
+                "workers": len(self._threads),
+                "queued": len(self._waiting),
+                "active": len(self._active),
+                "submitted": self.submitted,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "retried": self.retried
+            }
+
+    def shutdown(self):
+        """Stop taking jobs off the queue; jobs already running finish on their own"""
+        with self._ready:
+            self._stopping = True
+            self._ready.notify_all()
+
+    def _schedule(self, job, run_at):
+        heapq.heappush(self._waiting, (run_at, next(self._order), job))
+        self._ready.notify()
+
+    def _startWorkers(self):
+        #Workers are started with the first job, so importing the app launches nothing
+        while len(self._threads) < self.workers and not self._stopping:
+            thread = threading.Thread(target=self._work, name=f"feedback-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _position(self, job_id):
+        with self._ready:
+            ordered = sorted(self._waiting, key=lambda waiting: waiting[:2])
+            for position, (_, _, job) in enumerate(ordered, start=1):
+                if job.job_id == job_id:
+                    return position
+        return None
+
+    def _next(self):
+        with self._ready:
+            while not self._stopping:
+                if self._waiting:
+                    run_at = self._waiting[0][0]
+                    now = time.monotonic()
+                    if run_at <= now:
+                        return heapq.heappop(self._waiting)[2]
+                    self._ready.wait(run_at - now)
+                else:
+                    self._ready.wait()
+        return None
+
+    def _work(self):
+        while True:
+            job = self._next()
+            if job is None:
+                return
+
+            job.attempts += 1
+            self.store.update(job.job_id, RUNNING, job.attempts)
+            try:
+                result = self.run(job.feedback_index, job.rollno, job.password)
+            except Exception as e:
+                self._failed(job, e)
+            else:
+                self._finish(job, SUCCEEDED, result=result)
+
+    def _failed(self, job, error):
+        status_code = getattr(error, "status_code", 500)
+        detail = getattr(error, "detail", None) or str(error)
+
+        #Client-side errors will fail the same way again, anything else gets another go
+        if status_code < 500 or job.attempts >= self.max_attempts:
+            logger.error(f"Feedback job {job.job_id} failed after {job.attempts} attempts: {detail}")
+            self._finish(job, FAILED, error=detail)
+            return
+
+        delay = self.backoff * 2 ** (job.attempts - 1)
+        logger.warning(f"Feedback job {job.job_id} failed, retrying in {delay:.0f}s: {detail}")
+        self.store.update(job.job_id, QUEUED, job.attempts, error=detail)
+        with self._ready:
+            self.retried += 1
+            self._schedule(job, time.monotonic() + delay)
+
+    def _finish(self, job, status, result=None, error=None):
+        self.store.update(job.job_id, status, job.attempts, result=result, error=error)
+        with self._ready:
+            self._active.pop(job.key, None)
+            if status == SUCCEEDED:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+        #Drop the password as soon as the job is over
+        job.password = None
+
+
+def createFeedbackQueue(run):
+    try:
+        store = FeedbackJobStore(FEEDBACK_QUEUE_PATH)
+    except Exception as e:
+        #Statuses then only last as long as the process, which still beats losing them
+        logger.warning(f"Could not open feedback job store, keeping it in memory: {e}")
+        store = FeedbackJobStore(":memory:")
+    return FeedbackQueue(run, store)
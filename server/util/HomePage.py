@@ -1,107 +1,151 @@
-from requests import Session
-from bs4 import BeautifulSoup
-from datetime import datetime
-import pytz
+from .AsyncPortal import createPortalClient
+from .Parsing import parseDocument, findFirst, hasClass, inputValue
+from .LoginTokens import extractLoginTokens, cgpa_login_tokens, CGPA_LOGIN_URL
+from .Metrics import timed
+from .PortalUrls import portalUrl
 
+@timed("login:studzone")
 def getHomePageAttendance(rollno, password):
-    #Start a session
-    login_url = "https://ecampus.psgtech.ac.in/studzone"
-    session = Session()
+    #requests is only loaded by the first blocking login, async routes never need it
+    from .PortalSession import createPortalSession
+
+    #Start a session whose calls time out instead of hanging
+    login_url = portalUrl("/studzone")
+    session = createPortalSession(rollno)
 
     #Get the login page
     login_page = session.get(login_url)
 
-    #Extract the html from the page using lxml parser
-    login_soup = BeautifulSoup(login_page.text , "lxml")
-
-    #Get the dynamic token used for login
-    token = login_soup.find("input",{"name":"__RequestVerificationToken"})["value"]
-
     #Create a payload to POST to the login form
-    payload = {
-    "rollno"                     : rollno,
-    "password"                   : password,
-    "chkterms"                   : "on",
-    "__RequestVerificationToken" : token
-    }
+    payload = buildAttendancePayload(login_page.text, rollno, password)
 
     #Get the response from POST
     response = session.post(login_url, data=payload)
 
     #Check if we have landed on student home page
     #and the pass the current session for the next function
-    response_soup = BeautifulSoup(response.text , "lxml")
-    check = response_soup.find("nav",{"class":"navbar navbar-expand-lg navbar-light"})
-    if check:
+    if isStudentHomePage(response.text):
         return session
     else:
         return False
 
 
-def getHomePageCGPA(rollno, password):
-    #Start a session
-    login_url = "https://ecampus.psgtech.ac.in/studzone2/"
-    session = Session()
+@timed("login:studzone")
+async def getHomePageAttendanceAsync(rollno, password):
+    #Start a client on the shared portal connection pool
+    login_url = portalUrl("/studzone")
+    client = createPortalClient(rollno)
 
-    #Get the login page
-    login_page = session.get(login_url)
+    try:
+        #Get the login page and POST the credentials with its token
+        login_page = await client.get(login_url)
+        payload = buildAttendancePayload(login_page.text, rollno, password)
+        response = await client.post(login_url, data=payload)
+    except Exception:
+        await client.aclose()
+        raise
+
+    #Pass the client on only if we have landed on student home page
+    if isStudentHomePage(response.text):
+        return client
+    await client.aclose()
+    return False
 
+
+def buildAttendancePayload(login_html, rollno, password):
     #Extract the html from the page using lxml parser
-    login_soup = BeautifulSoup(login_page.text , "lxml")
+    login_page = parseDocument(login_html)
+
+    #Get the dynamic token used for login
+    token = inputValue(login_page, "__RequestVerificationToken")
 
+    return {
+    "rollno"                     : rollno,
+    "password"                   : password,
+    "chkterms"                   : "on",
+    "__RequestVerificationToken" : token
+    }
+
+
+def isStudentHomePage(html):
+    #The student home page carries the portal navbar, the login page does not
+    response_page = parseDocument(html)
+    check = findFirst(response_page, f"//nav[{hasClass('navbar navbar-expand-lg navbar-light')}]")
+    return check is not None
+
+
+@timed("login:studzone2")
+async def getHomePageCGPAAsync(rollno, password):
+    #Start a client on the shared portal connection pool
+    login_url = CGPA_LOGIN_URL
+    client = createPortalClient(rollno)
+
+    try:
+        #With prefetched tokens and their cookies the login is a single POST
+        bundle = cgpa_login_tokens.take()
+        if bundle is not None:
+            bundle.applyTo(client)
+            response = await client.post(login_url, data=cgpaLoginPayload(bundle.tokens, rollno, password))
+            if isCGPALoginAccepted(response.text):
+                cgpa_login_tokens.record(bundle, True)
+                return client
+            #Stale tokens or wrong credentials, a login with a fresh page tells which
+            client.cookies.clear()
+
+        #Get the login page and POST the credentials with its tokens
+        login_page = await client.get(login_url)
+        payload = buildCGPAPayload(login_page.text, rollno, password)
+        response = await client.post(login_url, data=payload)
+        if bundle is not None and isCGPALoginAccepted(response.text):
+            cgpa_login_tokens.record(bundle, False)
+    except Exception:
+        await client.aclose()
+        raise
+
+    return client
+
+
+def buildCGPAPayload(login_html, rollno, password):
     #Get the dynamic tokens used for login
-    viewstate           = login_soup.find("input",{"name":"__VIEWSTATE"})["value"]
-    viewstate_generator = login_soup.find("input",{"name":"__VIEWSTATEGENERATOR"})["value"]
-    event_validation    = login_soup.find("input",{"name" : "__EVENTVALIDATION"})["value"]
-    abcd3               = login_soup.find("input",{"name" : "abcd3"})["value"]
+    return cgpaLoginPayload(extractLoginTokens(login_html), rollno, password)
 
-    #Create a payload to POST to the login form
-    payload = {
+
+def cgpaLoginPayload(tokens, rollno, password):
+    return {
         "__EVENTTARGET"        : "",
         "__EVENTARGUMENT"      : "",
         "__LASTFOCUS"          : "",
-        "__VIEWSTATE"          : viewstate,
-        "__VIEWSTATEGENERATOR" : viewstate_generator,
-        "__EVENTVALIDATION"    : event_validation,
+        "__VIEWSTATE"          : tokens["__VIEWSTATE"],
+        "__VIEWSTATEGENERATOR" : tokens["__VIEWSTATEGENERATOR"],
+        "__EVENTVALIDATION"    : tokens["__EVENTVALIDATION"],
         "rdolst"               : "S",
         "txtusercheck"         : rollno,
         "txtpwdcheck"          : password,
-        "abcd3"                : abcd3
+        "abcd3"                : tokens["abcd3"]
     }
 
-def getHomePageCGPA(rollno, password):
-    #Start a session
-    login_url = "https://ecampus.psgtech.ac.in/studzone2/"
-    session = Session()
 
-    #Get the login page
-    login_page = session.get(login_url)
+def isCGPALoginAccepted(html):
+    #A rejected login serves the login form again
+    return "txtusercheck" not in html
 
-    #Extract the html from the page using lxml parser
-    login_soup = BeautifulSoup(login_page.text , "lxml")
 
-    #Get the dynamic tokens used for login
-    viewstate           = login_soup.find("input",{"name":"__VIEWSTATE"})["value"]
-    viewstate_generator = login_soup.find("input",{"name":"__VIEWSTATEGENERATOR"})["value"]
-    event_validation    = login_soup.find("input",{"name" : "__EVENTVALIDATION"})["value"]
-    abcd3               = login_soup.find("input",{"name" : "abcd3"})["value"]
+#Pages behind each login, used to check whether a pooled session is still logged in
+ATTENDANCE_CHECK_URL = portalUrl("/studzone/Attendance/courseplan")
+CGPA_CHECK_URL       = portalUrl("/studzone2/AttWfStudCourseSelection.aspx")
+
+
+def isAttendanceSessionAlive(session):
+    #Request a page behind the studzone login and check we were not bounced to the login form
+    response = session.get(ATTENDANCE_CHECK_URL, timeout=10)
+    return response.ok and 'id="rollno"' not in response.text
 
-    #Create a payload to POST to the login form
-    payload = {
-        "__EVENTTARGET"        : "",
-        "__EVENTARGUMENT"      : "",
-        "__LASTFOCUS"          : "",
-        "__VIEWSTATE"          : viewstate,
-        "__VIEWSTATEGENERATOR" : viewstate_generator,
-        "__EVENTVALIDATION"    : event_validation,
-        "rdolst"               : "S",
-        "txtusercheck"         : rollno,
-        "txtpwdcheck"          : password,
-        "abcd3"                : abcd3
-    }
 
-    #Send a POST request from current session
-    session.post(login_url, data=payload)
+async def isAttendanceSessionAliveAsync(client):
+    response = await client.get(ATTENDANCE_CHECK_URL, timeout=10)
+    return response.is_success and 'id="rollno"' not in response.text
 
-    return session
 
+async def isCGPASessionAliveAsync(client):
+    response = await client.get(CGPA_CHECK_URL, timeout=10)
+    return response.is_success and "txtusercheck" not in response.text
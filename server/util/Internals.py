@@ -1,43 +1,47 @@
-from bs4 import BeautifulSoup
-from pandas import DataFrame
-from .Attendance import getCourseNames
+from .Attendance import getCourseNamesAsync, courseCodes, mapCourseNames
+from .Parsing import parseDocument, findFirst, tableRecords
+from .Metrics import timed
+from .PortalUrls import portalUrl
+import math
 
-def getInternals(session):
-    internals_url = "https://ecampus.psgtech.ac.in/studzone/ContinuousAssessment/CAMarksView"
-    
-    internals_page = session.get(internals_url)
-    internals_soup = BeautifulSoup(internals_page.text, "lxml")
+INTERNALS_URL = portalUrl("/studzone/ContinuousAssessment/CAMarksView")
+
+async def getInternalsAsync(client):
+    internals_page = await client.get(INTERNALS_URL)
+
+    records = parseInternals(internals_page.text)
+    if records is False:
+        return False
+
+    course_map = await getCourseNamesAsync(client, codes=courseCodes(records))
+
+    return mapCourseNames(records, course_map)
+
+
+@timed("parse:internals")
+def parseInternals(html):
+    internals_page = parseDocument(html)
     
-    content_tables = internals_soup.find_all("table")
+    content_tables = internals_page.xpath("//table")
 
     #Check for the presence of both the tables
     if len(content_tables) != 2:
         return False
     
     # lab_table = content_tables[0]
-    theory_table_body = content_tables[1].find("tbody")
-    
-    theory_table_rows = theory_table_body.find_all("tr")
+    theory_table_body = findFirst(content_tables[1], ".//tbody")
     
-    course_map = getCourseNames(session)
-    
-    #Get the theory internal marks in the form of list
-    theory_table = []
-    for row in theory_table_rows:
-        record = []
-        cells = row.find_all("td")
-        for cell in cells:
-            record.append(cell.text)
-        try:
-            record[0] = ''.join( [ record[0], '   -   ', course_map[record[0]] ] )
-        except KeyError:
-            continue
-        theory_table.append(record)
-
-    return theory_table
+    #Get the cell values of each row
+    return tableRecords(theory_table_body.iter("tr"))
     
     
+@timed("compute:internal_targets")
 def getTargetScore(theory_table, target):
+    """End semester marks needed per course to pass and to reach the target
+
+    target may also be a list of targets (e.g. GRADE_BOUNDARIES values), in which
+    case the last column holds the marks needed for each of them, in order.
+    """
     #Check for temporary/final mark entry
     final = True
     for record in theory_table:
@@ -52,8 +56,12 @@ def getTargetScore(theory_table, target):
         if record[-2] in ['',' ','*']:
             row.extend(['*','*'])
         else:
-            pass_score = calculateTarget(record[-2],50)
-            sem_score = calculateTarget(record[-2],target)
+            internal = float(record[-2])
+            pass_score = calculateTarget(internal,50)
+            if isinstance(target, (list, tuple)):
+                sem_score = [calculateTarget(internal,each) for each in target]
+            else:
+                sem_score = calculateTarget(internal,target)
             row.extend([record[-2],pass_score,sem_score])
             row[1] = float(row[1])
             row[1] = '{:.2f}'.format(row[1])
@@ -64,13 +72,46 @@ def getTargetScore(theory_table, target):
     return result
     
 
+#Least total (/100) for each grade, the targets of the end semester grid
+GRADE_BOUNDARIES = {
+    "O":91,
+    "A+":81,
+    "A":71,
+    "B+":61,
+    "B":56,
+    "C":50,
+}
+
+#Least end semester mark (/100) that is counted, and the most there is
+MIN_TARGET = 45
+MAX_TARGET = 100
+
+
 def calculateTarget(internal,final):
+    """Least end semester mark from 45 to 100 that reaches the final total, '-' if none does"""
     # 0.8 = 0.4(internals weightage) * 2(convert /50 to /100)
     # 0.6 = (end semester exam weightage)
     internal = (float)(internal)
     final    = (float)(final)
-    for target in range(45,101):
-        if (float)(0.8 * internal) + (float)(0.6 * target) >= final:
-            return target
-        
-    return '-'
\ No newline at end of file
+    internal_score = (float)(0.8 * internal)
+
+    def reaches(target):
+        return internal_score + (float)(0.6 * target) >= final
+
+    #Solve 0.8 * internal + 0.6 * target >= final for target, then settle the
+    #float rounding at the boundary with the same comparison
+    needed = (final - internal_score) / 0.6
+    if math.isnan(needed):
+        #Only infinite or missing marks get here, where the target makes no difference
+        return MIN_TARGET if reaches(MIN_TARGET) else '-'
+    if needed > MAX_TARGET + 1:
+        return '-'
+    target = math.ceil(max(needed, MIN_TARGET))
+    while target > MIN_TARGET and reaches(target - 1):
+        target -= 1
+    while target <= MAX_TARGET and not reaches(target):
+        target += 1
+
+    if target > MAX_TARGET:
+        return '-'
+    return target
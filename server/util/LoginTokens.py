@@ -0,0 +1,180 @@
+from html import unescape
+from .AsyncPortal import createPortalClient
+from .Parsing import parseDocument, inputValue
+from .PortalUrls import portalUrl
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+
+# Setup logging
+logger = logging.getLogger("nimora-api")
+
+CGPA_LOGIN_URL = portalUrl("/studzone2/")
+
+#Hidden inputs the studzone2 login form must post back
+CGPA_LOGIN_TOKENS = ("__VIEWSTATE", "__VIEWSTATEGENERATOR", "__EVENTVALIDATION", "abcd3")
+
+#Prefetch configuration (sizes in bundles, times in seconds)
+LOGIN_TOKEN_POOL_SIZE = int(os.environ.get("LOGIN_TOKEN_POOL_SIZE", "4"))
+LOGIN_TOKEN_MAX_AGE   = float(os.environ.get("LOGIN_TOKEN_MAX_AGE", "300"))
+
+#A bundle that failed at some age is trusted only up to this share of it afterwards
+STALE_AGE_MARGIN = 0.8
+
+INPUT_TAG  = re.compile(r"<input\b[^>]*>", re.IGNORECASE)
+INPUT_ATTR = re.compile(r"""\b(name|value)\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE)
+
+
+def extractLoginTokens(login_html):
+    """The studzone2 login tokens, read with a regex pass over the input tags
+
+    Falls back to a full parse when the markup is not what the regex expects,
+    raising KeyError for a token the page does not carry.
+    """
+    tokens = {}
+    for tag in INPUT_TAG.finditer(login_html):
+        attributes = {}
+        for attribute in INPUT_ATTR.finditer(tag.group(0)):
+            value = attribute.group(2) if attribute.group(2) is not None else attribute.group(3)
+            attributes.setdefault(attribute.group(1).lower(), value)
+        name = attributes.get("name")
+        if name in CGPA_LOGIN_TOKENS and name not in tokens and "value" in attributes:
+            tokens[name] = unescape(attributes["value"])
+
+    if len(tokens) < len(CGPA_LOGIN_TOKENS):
+        login_page = parseDocument(login_html)
+        tokens = {name: inputValue(login_page, name) for name in CGPA_LOGIN_TOKENS}
+    return tokens
+
+
+class TokenBundle:
+    """Login form tokens with the cookies the portal set when it served them"""
+
+    __slots__ = ("tokens", "cookies", "fetched_at")
+
+    def __init__(self, tokens, cookies, fetched_at):
+        self.tokens     = tokens
+        self.cookies    = cookies
+        self.fetched_at = fetched_at
+
+    def age(self):
+        return time.monotonic() - self.fetched_at
+
+    def applyTo(self, client):
+        for cookie in self.cookies:
+            client.cookies.jar.set_cookie(cookie)
+
+
+class LoginTokenPool:
+    """Small pool of fresh, unused studzone2 login token bundles fetched in the background
+
+    A login that takes a bundle only has to POST the form. Every bundle is used
+    once, and bundles older than max_age are dropped unused. Whether the login
+    a bundle went into succeeded is reported back with its age, which tracks how
+    long the portal's tokens stay valid; once a bundle fails older than any that
+    worked, later bundles are trusted for a little less than the age it failed at.
+    """
+
+    def __init__(self, size=LOGIN_TOKEN_POOL_SIZE, max_age=LOGIN_TOKEN_MAX_AGE):
+        self.size          = size
+        self.max_age       = max_age
+        self._bundles      = []
+        self._refill       = None
+        self._lock         = threading.Lock()
+        self.fetched       = 0
+        self.used          = 0
+        self.expired       = 0
+        self.valid         = 0
+        self.stale         = 0
+        self.max_valid_age = None
+        self.min_stale_age = None
+
+    def take(self):
+        """Return the freshest unexpired bundle, or None, and top the pool up in the background"""
+        bundle = None
+        with self._lock:
+            fresh = [pooled for pooled in self._bundles if pooled.age() < self.max_age]
+            self.expired += len(self._bundles) - len(fresh)
+            self._bundles = fresh
+            if fresh:
+                bundle = fresh.pop()
+                self.used += 1
+        self._startRefill()
+        return bundle
+
+    def record(self, bundle, valid):
+        """Report whether the login made with the bundle was accepted"""
+        age = bundle.age()
+        with self._lock:
+            if valid:
+                self.valid += 1
+                self.max_valid_age = age if self.max_valid_age is None else max(self.max_valid_age, age)
+                return
+            self.stale += 1
+            self.min_stale_age = age if self.min_stale_age is None else min(self.min_stale_age, age)
+            if self.max_valid_age is None or age > self.max_valid_age:
+                self.max_age = min(self.max_age, age * STALE_AGE_MARGIN)
+            else:
+                #Younger than bundles that worked, so the portal reset its tokens: the pooled ones went with it
+                self.expired += len(self._bundles)
+                self._bundles = []
+        logger.warning(f"Prefetched studzone2 login tokens were rejected after {age:.0f}s")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pooled": len(self._bundles),
+                "fetched": self.fetched,
+                "used": self.used,
+                "expired": self.expired,
+                "valid": self.valid,
+                "stale": self.stale,
+                "max_age": self.max_age,
+                "max_valid_age": self.max_valid_age,
+                "min_stale_age": self.min_stale_age
+            }
+
+    def _startRefill(self):
+        #One background refill at a time, each fetching bundles until the pool is full
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            #A refill left behind on a loop that has since closed no longer counts
+            if self._refill is not None and self._refill.get_loop() is loop:
+                return
+            if len(self._bundles) >= self.size:
+                return
+            self._refill = loop.create_task(self._fill())
+
+    async def _fill(self):
+        try:
+            while True:
+                with self._lock:
+                    if len(self._bundles) >= self.size:
+                        return
+                bundle = await self.fetch()
+                with self._lock:
+                    self._bundles.append(bundle)
+                    self.fetched += 1
+        except Exception as e:
+            logger.warning(f"Could not prefetch studzone2 login tokens: {e}")
+        finally:
+            with self._lock:
+                if self._refill is asyncio.current_task():
+                    self._refill = None
+
+    @staticmethod
+    async def fetch():
+        #A client of its own, so the bundle carries only the cookies of this page load
+        client = createPortalClient()
+        try:
+            login_page = await client.get(CGPA_LOGIN_URL)
+            tokens = extractLoginTokens(login_page.text)
+            return TokenBundle(tokens, list(client.cookies.jar), time.monotonic())
+        finally:
+            await client.aclose()
+
+
+cgpa_login_tokens = LoginTokenPool()
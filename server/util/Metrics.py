@@ -0,0 +1,164 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from fastapi.responses import JSONResponse
+from functools import wraps
+import bisect
+import contextvars
+import inspect
+import logging
+import os
+import threading
+import time
+
+# Setup logging
+logger = logging.getLogger("nimora-api")
+
+#Requests slower than this many seconds are logged with their stage breakdown, 0 turns the log off
+SLOW_REQUEST_SECONDS = float(os.environ.get("SLOW_REQUEST_SECONDS", "0"))
+
+#Histogram bucket bounds in seconds, from a cached parse up to a portal timeout
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+#Seconds spent in each stage by the current request, see collectSpans()
+request_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+def collectSpans():
+    """Start collecting, for the current request, the time spent in each stage"""
+    spans = defaultdict(float)
+    request_spans.set(spans)
+    return spans
+
+
+class Histogram:
+    """Cumulative latency histogram per label value, in the Prometheus layout"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, label, seconds):
+        series = self._series.get(label)
+        if series is None:
+            series = self._series[label] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, seconds)] += 1
+        series[1] += seconds
+
+    def render(self, name, label_name):
+        lines = []
+        for label, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label_name}="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label_name}="{label}"}} {total:.6f}')
+            lines.append(f'{name}_count{{{label_name}="{label}"}} {cumulative}')
+        return lines
+
+
+class Metrics:
+    """Request, stage and portal timings exported in the Prometheus text format
+
+    Stages are named by kind and subject, e.g. "login:studzone", "fetch:/studzone2/FrmEpsStudResult.aspx",
+    "parse:attendance" or "compute:cgpa", so the time a request takes can be split
+    between the portal, lxml and our own computation.
+    """
+
+    def __init__(self):
+        self._lock     = threading.Lock()
+        self.requests  = Histogram()
+        self.stages    = Histogram()
+        self.responses = defaultdict(int)
+
+    def observeStage(self, stage, seconds):
+        with self._lock:
+            self.stages.observe(stage, seconds)
+        spans = request_spans.get()
+        if spans is not None:
+            spans[stage] += seconds
+
+    def observeRequest(self, route, seconds):
+        with self._lock:
+            self.requests.observe(route, seconds)
+
+    def observePortal(self, method, path, status, seconds):
+        """Record a portal round trip; status is None when no response came back"""
+        self.observeStage(f"fetch:{path}", seconds)
+        with self._lock:
+            self.responses[(method, path, "error" if status is None else str(status))] += 1
+
+    def render(self, caches):
+        """The metrics as Prometheus text, with the hit ratio of each cache in caches (name -> stats())"""
+        with self._lock:
+            lines = [
+                "# HELP nimora_request_seconds Time to handle each API route",
+                "# TYPE nimora_request_seconds histogram",
+                *self.requests.render("nimora_request_seconds", "route"),
+                "# HELP nimora_stage_seconds Time spent in each stage of request handling",
+                "# TYPE nimora_stage_seconds histogram",
+                *self.stages.render("nimora_stage_seconds", "stage"),
+                "# HELP nimora_portal_responses_total Portal responses by page and status code",
+                "# TYPE nimora_portal_responses_total counter",
+            ]
+            for (method, path, status), count in sorted(self.responses.items()):
+                lines.append(f'nimora_portal_responses_total{{method="{method}",path="{path}",status="{status}"}} {count}')
+
+        lines += [
+            "# HELP nimora_cache_hit_ratio Share of lookups each cache answered",
+            "# TYPE nimora_cache_hit_ratio gauge",
+        ]
+        for name, stats in caches.items():
+            hits = stats.get("hits", 0) + stats.get("stale_hits", 0)
+            lookups = hits + stats.get("misses", 0)
+            lines.append(f'nimora_cache_hit_ratio{{cache="{name}"}} {hits / lookups if lookups else 0:.4f}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as a stage of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observeStage(stage, time.perf_counter() - started)
+
+
+def timed(stage):
+    """Decorator timing every call of a function, or coroutine function, as the given stage"""
+    def decorate(function):
+        if inspect.iscoroutinefunction(function):
+            @wraps(function)
+            async def awaiting(*args, **kwargs):
+                with span(stage):
+                    return await function(*args, **kwargs)
+            return awaiting
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def logSlowRequest(method, path, seconds, spans):
+    if not SLOW_REQUEST_SECONDS or seconds < SLOW_REQUEST_SECONDS:
+        return
+    #Sections run side by side, so the stages can add up to more than the request took
+    breakdown = ", ".join(f"{stage} {spent:.3f}s" for stage, spent in
+                          sorted(spans.items(), key=lambda item: item[1], reverse=True))
+    logger.warning(f"Slow request: {method} {path} took {seconds:.3f}s ({breakdown or 'no stages'})")
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that times rendering the body as the serialize stage"""
+
+    def render(self, content):
+        with span("serialize"):
+            return super().render(content)
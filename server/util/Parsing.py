@@ -0,0 +1,63 @@
+from lxml import etree
+import threading
+
+#lxml parsers must not be shared between threads, so each thread keeps its own
+_parsers = threading.local()
+
+#Plain strings, so extracted text does not keep the whole page tree alive
+_string = etree.XPath("string()", smart_strings=False)
+
+
+def _parser():
+    parser = getattr(_parsers, "html", None)
+    if parser is None:
+        parser = _parsers.html = etree.HTMLParser(encoding="utf-8")
+    return parser
+
+
+def parseDocument(html):
+    """Parse page html straight into an lxml tree, without building a BeautifulSoup tree"""
+    if isinstance(html, str):
+        html = html.encode("utf-8")
+    document = etree.fromstring(html, _parser()) if html.strip() else None
+    #An empty page behaves like a document with no elements, as it did with BeautifulSoup
+    if document is None:
+        document = etree.Element("html")
+    return document
+
+
+def hasClass(name):
+    """XPath predicate matching BeautifulSoup's {"class": name} attribute filter"""
+    if " " in name:
+        #A multi-word filter only matches the whole (whitespace-normalised) class attribute
+        return f"normalize-space(@class)='{name}'"
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def findFirst(element, path):
+    """Return the first element matching the XPath, or None"""
+    matches = element.xpath(path)
+    return matches[0] if matches else None
+
+
+def text(element):
+    """All text inside the element, the same string BeautifulSoup's .text returns"""
+    return _string(element)
+
+
+def rowCells(row):
+    """The text of every td inside a table row"""
+    return [text(cell) for cell in row.iter("td")]
+
+
+def tableRecords(rows):
+    """The cell texts of each table row, one list per row"""
+    return [rowCells(row) for row in rows]
+
+
+def inputValue(document, name):
+    """The value of the first input with the given name, raising KeyError when it has none"""
+    field = findFirst(document, f"//input[@name='{name}']")
+    if field is None or field.get("value") is None:
+        raise KeyError(name)
+    return field.get("value")
@@ -0,0 +1,235 @@
+from collections import OrderedDict, deque
+import asyncio
+import logging
+import os
+import threading
+import time
+
+# Setup logging
+logger = logging.getLogger("nimora-api")
+
+#Outbound limits towards the portal (rates in requests per second, times in seconds)
+PORTAL_RATE_LIMIT        = float(os.environ.get("PORTAL_RATE_LIMIT", "40"))
+PORTAL_BURST             = float(os.environ.get("PORTAL_BURST", "20"))
+PORTAL_CONCURRENCY_MIN   = int(os.environ.get("PORTAL_CONCURRENCY_MIN", "2"))
+PORTAL_CONCURRENCY_START = int(os.environ.get("PORTAL_CONCURRENCY_START", "16"))
+PORTAL_CONCURRENCY_MAX   = int(os.environ.get("PORTAL_CONCURRENCY_MAX", "64"))
+PORTAL_LATENCY_TARGET    = float(os.environ.get("PORTAL_LATENCY_TARGET", "3"))
+PORTAL_QUEUE_TIMEOUT     = float(os.environ.get("PORTAL_QUEUE_TIMEOUT", "30"))
+
+#Weight of the newest sample in the moving average of portal latency
+LATENCY_SMOOTHING = 0.2
+
+#Requests sent on nobody's behalf, such as background prefetches, queue under this owner
+SHARED_OWNER = ""
+
+
+class _Waiter:
+    """A request waiting for its turn, woken from whichever thread grants it"""
+
+    __slots__ = ("owner", "granted", "_event", "_future", "_loop")
+
+    def __init__(self, owner, loop=None):
+        self.owner   = owner
+        self.granted = False
+        self._loop   = loop
+        self._event  = None if loop is not None else threading.Event()
+        self._future = loop.create_future() if loop is not None else None
+
+    def grant(self):
+        self.granted = True
+        if self._event is not None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        if not self._future.done():
+            self._future.set_result(True)
+
+    def wait(self, timeout):
+        return self._event.wait(timeout)
+
+    async def waitAsync(self, timeout):
+        await asyncio.wait([self._future], timeout=timeout)
+        return self.granted
+
+
+class PortalLimiter:
+    """Outbound limiter shared by every portal request, async or blocking
+
+    A token bucket caps the request rate at rate per second with bursts of up to
+    burst, and an AIMD window caps how many requests are in flight: it grows by
+    one per window of responses that come back fast and healthy, and halves
+    (at most once per latency target) on a 5xx, a transport error or a response
+    slower than the latency target. Requests over the limits wait in one queue per
+    owner, served round robin, so one student's burst cannot starve the others.
+    """
+
+    def __init__(self, rate=PORTAL_RATE_LIMIT, burst=PORTAL_BURST, min_window=PORTAL_CONCURRENCY_MIN,
+                 start_window=PORTAL_CONCURRENCY_START, max_window=PORTAL_CONCURRENCY_MAX,
+                 latency_target=PORTAL_LATENCY_TARGET, queue_timeout=PORTAL_QUEUE_TIMEOUT):
+        self.rate           = rate
+        self.burst          = burst
+        self.min_window     = min_window
+        self.max_window     = max_window
+        self.latency_target = latency_target
+        self.queue_timeout  = queue_timeout
+        self.window         = float(min(max(start_window, min_window), max_window))
+        self._tokens        = burst
+        self._refilled_at   = time.monotonic()
+        self._decreased_at  = 0.0
+        self._in_flight     = 0
+        self._queues        = OrderedDict()
+        self._queued        = 0
+        self._lock          = threading.Lock()
+        self.latency        = None
+        self.sent           = 0
+        self.waited         = 0
+        self.rejected       = 0
+        self.failures       = 0
+        self.decreases      = 0
+
+    def acquire(self, owner=SHARED_OWNER):
+        """Block until the request may be sent; False when it waited longer than the queue timeout"""
+        with self._lock:
+            if self._admitNow():
+                return True
+            waiter = self._enqueue(owner)
+
+        deadline = time.monotonic() + self.queue_timeout
+        while not waiter.granted:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or waiter.wait(min(remaining, self._retryAfter())):
+                break
+            with self._lock:
+                self._dispatch()
+        return self._settle(waiter)
+
+    async def acquireAsync(self, owner=SHARED_OWNER):
+        """Wait without blocking the event loop until the request may be sent"""
+        with self._lock:
+            if self._admitNow():
+                return True
+            waiter = self._enqueue(owner, asyncio.get_running_loop())
+
+        deadline = time.monotonic() + self.queue_timeout
+        try:
+            while not waiter.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or await waiter.waitAsync(min(remaining, self._retryAfter())):
+                    break
+                with self._lock:
+                    self._dispatch()
+        except BaseException:
+            #Cancelled while queued: leave the queue, or hand back a slot granted meanwhile
+            if self._settle(waiter):
+                self.release(None, True)
+            raise
+        return self._settle(waiter)
+
+    def release(self, latency, healthy):
+        """Give the slot back with how long the portal took and whether the response was healthy"""
+        with self._lock:
+            self._in_flight -= 1
+            if latency is not None:
+                self.latency = latency if self.latency is None else (
+                    LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * self.latency)
+
+            slow = latency is not None and latency > self.latency_target
+            if not healthy:
+                self.failures += 1
+            if not healthy or slow:
+                now = time.monotonic()
+                if now - self._decreased_at >= self.latency_target:
+                    self._decreased_at = now
+                    self.decreases += 1
+                    self.window = max(self.min_window, self.window / 2)
+            elif latency is not None:
+                self.window = min(self.max_window, self.window + 1 / self.window)
+            self._dispatch()
+
+    def stats(self):
+        with self._lock:
+            self._refill()
+            return {
+                "window": round(self.window, 2),
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "tokens": round(self._tokens, 2),
+                "latency": None if self.latency is None else round(self.latency, 3),
+                "sent": self.sent,
+                "waited": self.waited,
+                "rejected": self.rejected,
+                "failures": self.failures,
+                "decreases": self.decreases
+            }
+
+    def _admitNow(self):
+        #Skip the queue only when nobody is already waiting in it
+        if self._queued == 0 and self._canSend():
+            self._take()
+            return True
+        return False
+
+    def _enqueue(self, owner, loop=None):
+        waiter = _Waiter(owner, loop)
+        self._queues.setdefault(owner, deque()).append(waiter)
+        self._queued += 1
+        self.waited += 1
+        return waiter
+
+    def _settle(self, waiter):
+        """Whether the waiter got its slot, taking it out of the queue if it did not"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            queue = self._queues.get(waiter.owner)
+            if queue is not None and waiter in queue:
+                queue.remove(waiter)
+                self._queued -= 1
+                if not queue:
+                    del self._queues[waiter.owner]
+            self.rejected += 1
+            return False
+
+    def _dispatch(self):
+        #Round robin over owners: each turn serves the head of the first queue, then moves it to the back
+        while self._queues and self._canSend():
+            owner, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._queues.move_to_end(owner)
+            else:
+                del self._queues[owner]
+            self._take()
+            waiter.grant()
+
+    def _canSend(self):
+        if self._in_flight >= int(self.window):
+            return False
+        if self.rate <= 0:
+            return True
+        self._refill()
+        return self._tokens >= 1
+
+    def _take(self):
+        self._in_flight += 1
+        self.sent += 1
+        if self.rate > 0:
+            self._tokens -= 1
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _retryAfter(self):
+        #Waiters look again when the next token is due, in case no release wakes them first
+        if self.rate <= 0:
+            return self.queue_timeout
+        return max(1 / self.rate, 0.005)
+
+
+portal_limiter = PortalLimiter()
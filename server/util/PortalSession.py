@@ -0,0 +1,82 @@
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectTimeout
+from .AsyncPortal import PORTAL_TIMEOUT
+from .PortalLimiter import portal_limiter, SHARED_OWNER
+from .CircuitBreaker import portal_breaker, PortalError
+from .Metrics import metrics
+from urllib.parse import urlsplit
+import time
+
+#Blocking portal sessions live apart from the async clients so that requests is only imported
+#by the first blocking login, not on every cold start
+
+
+class PortalAdapter(HTTPAdapter):
+    """Requests adapter that gives every portal call PORTAL_TIMEOUT unless the caller passed its own,
+    and sends it through the circuit breaker and shared limiter like the async clients. The limiter
+    slot is held until the body has been read, or for a streamed response until it is closed"""
+
+    def __init__(self, owner=SHARED_OWNER, **kwargs):
+        super().__init__(**kwargs)
+        self.owner = owner
+
+    def send(self, request, timeout=None, **kwargs):
+        probe = portal_breaker.before()
+        if not portal_limiter.acquire(self.owner):
+            portal_breaker.after(None, probe)
+            raise ConnectTimeout("Portal request queue is full", request=request)
+        started = time.monotonic()
+        path = urlsplit(request.url).path
+
+        def finished(response=None):
+            latency = time.monotonic() - started
+            if response is None:
+                portal_limiter.release(None, False)
+                portal_breaker.after(False, probe)
+                metrics.observePortal(request.method, path, None, latency)
+                return
+            healthy = response.status_code < 500
+            portal_limiter.release(latency, healthy)
+            portal_breaker.after(healthy, probe)
+            metrics.observePortal(request.method, path, response.status_code, latency)
+
+        try:
+            response = super().send(request, timeout=PORTAL_TIMEOUT if timeout is None else timeout, **kwargs)
+            if not kwargs.get("stream"):
+                #Session.send reads the body after the adapter returns, read it here while the slot is held
+                response.content
+        except Exception:
+            finished()
+            raise
+
+        #An error page is not the page asked for, scrapers would read it as "no data" and cache that
+        if response.status_code >= 500:
+            response.close()
+            finished(response)
+            raise PortalError()
+
+        if kwargs.get("stream"):
+            #A streamed body holds the slot until the caller closes the response
+            close = response.close
+            def closeAndRelease():
+                try:
+                    close()
+                finally:
+                    if response.close is closeAndRelease:
+                        response.close = close
+                        finished(response)
+            response.close = closeAndRelease
+            return response
+
+        finished(response)
+        return response
+
+
+def createPortalSession(owner=SHARED_OWNER):
+    """Create a requests session whose portal calls can never hang without a timeout"""
+    session = Session()
+    adapter = PortalAdapter(owner)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
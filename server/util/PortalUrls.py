@@ -0,0 +1,9 @@
+import os
+
+#Root of the eCampus portal, overridable to point the API at a stand-in such as bench/mock_portal.py
+PORTAL_BASE_URL = os.environ.get("PORTAL_BASE_URL", "https://ecampus.psgtech.ac.in").rstrip("/")
+
+
+def portalUrl(path):
+    """Absolute URL of a path on the portal, e.g. portalUrl("/studzone")"""
+    return PORTAL_BASE_URL + path
@@ -0,0 +1,51 @@
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class SemesterRecord:
+    """GPA and CGPA of one semester, "-" while the semester has backlogs"""
+    semester: int
+    gpa: str
+    cgpa: str
+
+    def toDict(self):
+        return {"SEMESTER": self.semester, "GPA": self.gpa, "CGPA": self.cgpa}
+
+
+@dataclass(slots=True)
+class ExamRecord:
+    """One exam on the schedule, course code already mapped to its initials"""
+    course_code: str
+    date: str
+    time: str
+
+    def toDict(self):
+        return {"COURSE_CODE": self.course_code, "DATE": self.date, "TIME": self.time}
+
+
+@dataclass(slots=True)
+class LeaveRecord:
+    """Attendance of one course and the classes that can be skipped (negative: must attend, None: no classes yet)"""
+    course_code: str
+    attendance: int
+    bunks: int
+
+    def toDict(self):
+        return {"Course Code": self.course_code, "Attendance": self.attendance, "Bunks": self.bunks}
+
+
+@dataclass(slots=True)
+class LeaveTableRecord:
+    """Attendance of one course and the classes that can be skipped at each threshold"""
+    course_code: str
+    attendance: int
+    bunks: dict
+
+    def toDict(self):
+        return {"Course Code": self.course_code, "Attendance": self.attendance, "Bunks": self.bunks}
+
+
+def toRecords(records):
+    """The records as a list of dicts, the shape DataFrame.to_dict(orient='records') gave"""
+    return [record.toDict() for record in records]
+
@@ -0,0 +1,252 @@
+from collections import OrderedDict
+from .SessionPool import credentialKey
+from .SingleFlight import single_flight
+from .CircuitBreaker import PortalError
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Setup logging
+logger = logging.getLogger("nimora-api")
+
+#How long each kind of data is served without revalidation (seconds)
+RESPONSE_CACHE_TTLS = {
+    "attendance": float(os.environ.get("CACHE_TTL_ATTENDANCE", "600")),
+    "internals":  float(os.environ.get("CACHE_TTL_INTERNALS", "1800")),
+    "timetable":  float(os.environ.get("CACHE_TTL_TIMETABLE", "3600")),
+    "user_info":  float(os.environ.get("CACHE_TTL_USER_INFO", "21600")),
+    "cgpa":       float(os.environ.get("CACHE_TTL_CGPA", "21600")),
+}
+
+#The semester totals behind the CGPA table go stale with it
+RESPONSE_CACHE_TTLS["cgpa_totals"] = RESPONSE_CACHE_TTLS["cgpa"]
+
+#How long past its TTL an entry may still be served while it is refreshed in the background
+RESPONSE_CACHE_MAX_STALE = float(os.environ.get("CACHE_MAX_STALE", "86400"))
+
+#"memory" for an in-process LRU, "sqlite" for an on-disk store that survives restarts
+RESPONSE_CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory").lower()
+RESPONSE_CACHE_PATH    = os.environ.get("CACHE_PATH", "/tmp/nimora-cache.sqlite3")
+RESPONSE_CACHE_SIZE    = int(os.environ.get("CACHE_SIZE", "10000"))
+
+#Expired entries are swept from the store once every this many writes
+PRUNE_EVERY = 500
+
+#Kinds a request was served from old entries because the portal was down or failing, see collectStaleKinds()
+stale_kinds = contextvars.ContextVar("stale_kinds", default=None)
+
+
+def collectStaleKinds():
+    """Start collecting, for the current request, the kinds served stale while the portal is down or failing"""
+    kinds = set()
+    stale_kinds.set(kinds)
+    return kinds
+
+
+class MemoryStore:
+    """In-process LRU store of (payload, stored_at) entries"""
+
+    def __init__(self, max_size=RESPONSE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock    = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, payload, stored_at):
+        with self._lock:
+            self._entries[key] = (payload, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def prune(self, older_than):
+        with self._lock:
+            for key in [key for key, (_, stored_at) in self._entries.items() if stored_at < older_than]:
+                del self._entries[key]
+
+
+class SQLiteStore:
+    """On-disk store of JSON payloads so cached data survives restarts"""
+
+    def __init__(self, path=RESPONSE_CACHE_PATH):
+        self.path  = path
+        self._lock = threading.Lock()
+        self._db   = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, payload TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT payload, stored_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, payload, stored_at):
+        encoded = json.dumps(payload)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO response_cache (key, payload, stored_at) VALUES (?, ?, ?)",
+                (key, encoded, stored_at)
+            )
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+
+    def prune(self, older_than):
+        with self._lock:
+            self._db.execute("DELETE FROM response_cache WHERE stored_at < ?", (older_than,))
+
+
+class ResponseCache:
+    """Per-student cache of scraped payloads with stale-while-revalidate
+
+    Entries are keyed by data kind, roll number and credential fingerprint, so a
+    cached payload is only ever served to the exact credentials that produced it.
+    Within its TTL an entry is served as is; after that, and for up to max_stale
+    seconds more, it is still served at once while a background task refetches it.
+    Concurrent fetches of the same entry are coalesced into one scrape. When the
+    portal answers with a server error, or the circuit breaker is open, an entry of
+    any age is served rather than the error.
+    """
+
+    def __init__(self, store, ttls=RESPONSE_CACHE_TTLS, max_stale=RESPONSE_CACHE_MAX_STALE, flights=single_flight):
+        self.store       = store
+        self.flights     = flights
+        self.ttls        = ttls
+        self.max_stale   = max_stale
+        self._refreshing = {}
+        self._writes     = 0
+        self._lock       = threading.Lock()
+        self.hits        = 0
+        self.stale_hits  = 0
+        self.misses      = 0
+        self.refreshes   = 0
+        self.fallbacks   = 0
+
+    async def get(self, kind, rollno, password, fetch, force_refresh=False):
+        """Return the cached payload for the student, awaiting fetch() on a miss or forced refresh"""
+        key = self._key(kind, rollno, password)
+
+        if not force_refresh:
+            entry = self.store.get(key)
+            if entry is not None:
+                payload, stored_at = entry
+                age = time.time() - stored_at
+                if age < self.ttls[kind]:
+                    self._count("hits")
+                    return payload
+                if age < self.ttls[kind] + self.max_stale:
+                    self._count("stale_hits")
+                    self._revalidate(kind, key, fetch)
+                    return payload
+
+        self._count("misses")
+        try:
+            return await self._fetch(kind, key, fetch)
+        except PortalError:
+            #The last good payload, however old, beats an error while the portal is down or failing
+            entry = self.store.get(key)
+            if entry is None:
+                raise
+            self._count("fallbacks")
+            kinds = stale_kinds.get()
+            if kinds is not None:
+                kinds.add(kind)
+            return entry[0]
+
+    def isFresh(self, kind, rollno, password):
+        """Whether get() would serve the student's entry without fetching it in any way"""
+        entry = self.store.get(self._key(kind, rollno, password))
+        return entry is not None and time.time() - entry[1] < self.ttls[kind]
+
+    def peek(self, kind, rollno, password):
+        """Return the last stored payload for the student regardless of age, or None"""
+        entry = self.store.get(self._key(kind, rollno, password))
+        return None if entry is None else entry[0]
+
+    def invalidate(self, kind, rollno, password):
+        self.store.delete(self._key(kind, rollno, password))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "fallbacks": self.fallbacks
+            }
+
+    async def _fetch(self, kind, key, fetch):
+        return await self.flights.do(kind, key, lambda: self._load(key, fetch))
+
+    async def _load(self, key, fetch):
+        payload = await fetch()
+        now = time.time()
+        self.store.set(key, payload, now)
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        if prune:
+            self.store.prune(now - max(self.ttls.values()) - self.max_stale)
+        return payload
+
+    def _revalidate(self, kind, key, fetch):
+        #Only one background refresh per entry at a time
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self.refreshes += 1
+            task = asyncio.ensure_future(self._fetch(kind, key, fetch))
+            self._refreshing[key] = task
+        task.add_done_callback(lambda done: self._refreshed(key, done))
+
+    def _refreshed(self, key, task):
+        with self._lock:
+            self._refreshing.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Background refresh failed: {task.exception()}")
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @staticmethod
+    def _key(kind, rollno, password):
+        rollno, fingerprint = credentialKey(rollno, password)
+        return f"{kind}:{rollno}:{fingerprint}"
+
+
+def createResponseStore():
+    if RESPONSE_CACHE_BACKEND == "sqlite":
+        try:
+            return SQLiteStore(RESPONSE_CACHE_PATH)
+        except Exception as e:
+            logger.warning(f"Could not open SQLite response cache, using memory: {e}")
+    return MemoryStore()
+
+
+response_cache = ResponseCache(createResponseStore())
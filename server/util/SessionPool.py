@@ -0,0 +1,263 @@
+from collections import OrderedDict
+from .HomePage import getHomePageAttendance, isAttendanceSessionAlive
+from .HomePage import getHomePageAttendanceAsync, getHomePageCGPAAsync, isAttendanceSessionAliveAsync, isCGPASessionAliveAsync
+from .CourseCache import course_map_cache
+from .SingleFlight import single_flight
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import threading
+import time
+
+# Setup logging
+logger = logging.getLogger("nimora-api")
+
+#Pool configuration (sizes in entries, times in seconds)
+SESSION_POOL_SIZE        = int(os.environ.get("SESSION_POOL_SIZE", "256"))
+SESSION_POOL_TTL         = float(os.environ.get("SESSION_POOL_TTL", "900"))
+SESSION_POOL_CHECK_AFTER = float(os.environ.get("SESSION_POOL_CHECK_AFTER", "60"))
+
+#Secret used to fingerprint credentials so raw passwords never become keys
+CREDENTIAL_KEY_SECRET = os.environ.get("CREDENTIAL_KEY_SECRET", "nimora_credential_key_2025")
+
+ATTENDANCE_PORTAL = "studzone"
+CGPA_PORTAL       = "studzone2"
+
+#Async portal clients are pooled separately from requests sessions
+ATTENDANCE_PORTAL_ASYNC = "studzone:async"
+CGPA_PORTAL_ASYNC       = "studzone2:async"
+
+
+def credentialKey(rollno, password):
+    """Return a (rollno, fingerprint) pair identifying a student's credentials"""
+    fingerprint = hmac.new(
+        CREDENTIAL_KEY_SECRET.encode("utf-8"),
+        f"{rollno}:{password}".encode("utf-8"),
+        hashlib.sha256
+    ).hexdigest()
+    return (rollno, fingerprint)
+
+
+class _PooledSession:
+    __slots__ = ("session", "created_at", "verified_at")
+
+    def __init__(self, session):
+        now = time.monotonic()
+        self.session     = session
+        self.created_at  = now
+        self.verified_at = now
+
+
+class SessionPool:
+    """LRU pool of logged-in portal sessions with TTL expiry and liveness checks"""
+
+    def __init__(self, max_size=SESSION_POOL_SIZE, ttl=SESSION_POOL_TTL, check_after=SESSION_POOL_CHECK_AFTER):
+        self.max_size    = max_size
+        self.ttl         = ttl
+        self.check_after = check_after
+        self._entries    = OrderedDict()
+        self._lock       = threading.Lock()
+        self.hits        = 0
+        self.misses      = 0
+        self.relogins    = 0
+
+    def acquire(self, portal, rollno, password, login, is_alive):
+        """Return a pooled session for the credentials, logging in only when needed"""
+        key = (portal,) + credentialKey(rollno, password)
+        entry = self._take(key)
+
+        if entry is not None and self._needsCheck(entry):
+            try:
+                alive = is_alive(entry.session)
+            except Exception as e:
+                logger.warning(f"Session liveness check failed: {e}")
+                alive = False
+            entry = self._checked(key, entry, alive)
+
+        if entry is not None:
+            return self._hit(entry)
+
+        self._miss()
+        session = login(rollno, password)
+        if session:
+            self._put(key, _PooledSession(session))
+        return session
+
+    async def acquireAsync(self, portal, rollno, password, login, is_alive):
+        """Async variant of acquire() for portal clients with awaitable login and liveness check"""
+        key = (portal,) + credentialKey(rollno, password)
+        entry = self._take(key)
+
+        if entry is not None and self._needsCheck(entry):
+            try:
+                alive = await is_alive(entry.session)
+            except Exception as e:
+                logger.warning(f"Session liveness check failed: {e}")
+                alive = False
+            entry = self._checked(key, entry, alive)
+
+        if entry is not None:
+            return self._hit(entry)
+
+        self._miss()
+        session = await login(rollno, password)
+        if session:
+            self._put(key, _PooledSession(session))
+        return session
+
+    def _needsCheck(self, entry):
+        #Re-verify sessions that have been idle for a while
+        return time.monotonic() - entry.verified_at >= self.check_after
+
+    def _checked(self, key, entry, alive):
+        if alive:
+            entry.verified_at = time.monotonic()
+            return entry
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+            self.relogins += 1
+        self._close(entry)
+        return None
+
+    def _hit(self, entry):
+        with self._lock:
+            self.hits += 1
+        return entry.session
+
+    def _miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def discard(self, portal, rollno, password):
+        """Drop the pooled session for the credentials, e.g. after a scrape failure"""
+        key = (portal,) + credentialKey(rollno, password)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._close(entry)
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._close(entry)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "relogins": self.relogins
+            }
+
+    def _take(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.created_at < self.ttl:
+                self._entries.move_to_end(key)
+                return entry
+            del self._entries[key]
+        self._close(entry)
+        return None
+
+    def _put(self, key, entry):
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                evicted.append(previous)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_size:
+                evicted.append(self._entries.popitem(last=False)[1])
+        for old in evicted:
+            self._close(old)
+
+    @staticmethod
+    def _close(entry):
+        #Async clients hold no sockets of their own, the shared transport owns them
+        close = getattr(entry.session, "close", None)
+        if close is None:
+            return
+        try:
+            close()
+        except Exception:
+            pass
+
+
+session_pool = SessionPool()
+
+
+def getPooledHomePageAttendance(rollno, password):
+    session = session_pool.acquire(ATTENDANCE_PORTAL, rollno, password,
+                                   getHomePageAttendance, isAttendanceSessionAlive)
+    if session:
+        #Let the course map cache share the student's course plan across sessions
+        course_map_cache.bindStudent(session, rollno)
+    return session
+
+
+async def getPooledHomePageAttendanceAsync(rollno, password):
+    #Concurrent requests for the same student share one login
+    client = await single_flight.do("login:" + ATTENDANCE_PORTAL, credentialKey(rollno, password),
+                                    lambda: session_pool.acquireAsync(ATTENDANCE_PORTAL_ASYNC, rollno, password,
+                                                                      getHomePageAttendanceAsync,
+                                                                      isAttendanceSessionAliveAsync))
+    if client:
+        course_map_cache.bindStudent(client, rollno)
+    return client
+
+
+async def getPooledHomePageCGPAAsync(rollno, password):
+    return await single_flight.do("login:" + CGPA_PORTAL, credentialKey(rollno, password),
+                                  lambda: session_pool.acquireAsync(CGPA_PORTAL_ASYNC, rollno, password,
+                                                                    getHomePageCGPAAsync,
+                                                                    isCGPASessionAliveAsync))
+
+
+def discardPooledSessions(rollno, password):
+    for portal in (ATTENDANCE_PORTAL, ATTENDANCE_PORTAL_ASYNC, CGPA_PORTAL_ASYNC):
+        session_pool.discard(portal, rollno, password)
+
+
+class PortalLogins:
+    """The studzone and studzone2 logins of one request, run side by side
+
+    Each login is started at most once, by start() as soon as the request knows it
+    will need it or else on first use, and neither waits for the other; a section
+    awaits only the portal it scrapes. Both go through the session pool, so a live
+    pooled session skips the handshake and a fresh one is pooled for later requests.
+    """
+
+    def __init__(self, rollno, password):
+        self.rollno          = rollno
+        self.password        = password
+        self.attendance_task = None
+        self.cgpa_task       = None
+
+    def start(self, attendance=True, cgpa=True):
+        if attendance and self.attendance_task is None:
+            self.attendance_task = self._launch(getPooledHomePageAttendanceAsync)
+        if cgpa and self.cgpa_task is None:
+            self.cgpa_task = self._launch(getPooledHomePageCGPAAsync)
+
+    async def attendance(self):
+        self.start(cgpa=False)
+        #Shielded so a section that gives up waiting does not cancel the login for the others
+        return await asyncio.shield(self.attendance_task)
+
+    async def cgpa(self):
+        self.start(attendance=False)
+        return await asyncio.shield(self.cgpa_task)
+
+    def _launch(self, login):
+        task = asyncio.ensure_future(login(self.rollno, self.password))
+        #A login started early may end up awaited by nobody, do not report its error as unretrieved
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return task
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+
+class SingleFlight:
+    """Coalesce concurrent identical async calls into one in-flight execution
+
+    Callers passing the same key while a call is running await that call's result
+    (or exception) instead of starting their own. Counters are kept per resource
+    so the coalescing rate of logins and each scrape can be read back.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._counters = {}
+        self._lock     = threading.Lock()
+
+    async def do(self, resource, key, fn):
+        """Run fn() once per (resource, key) at a time and share its result"""
+        flight_key = (resource, key)
+        with self._lock:
+            counters = self._counters.setdefault(resource, {"calls": 0, "executions": 0, "coalesced": 0})
+            counters["calls"] += 1
+            task = self._inflight.get(flight_key)
+            if task is None:
+                counters["executions"] += 1
+                task = asyncio.ensure_future(fn())
+                self._inflight[flight_key] = task
+                task.add_done_callback(lambda done: self._landed(flight_key, done))
+            else:
+                counters["coalesced"] += 1
+
+        #Shield the shared task so one caller going away does not cancel it for the others
+        return await asyncio.shield(task)
+
+    def inflight(self):
+        with self._lock:
+            return len(self._inflight)
+
+    def stats(self):
+        with self._lock:
+            return {resource: dict(counters) for resource, counters in self._counters.items()}
+
+    def _landed(self, flight_key, task):
+        with self._lock:
+            if self._inflight.get(flight_key) is task:
+                del self._inflight[flight_key]
+        #Mark the exception as retrieved when every caller has gone away
+        if not task.cancelled():
+            task.exception()
+
+
+single_flight = SingleFlight()
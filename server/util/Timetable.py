@@ -1,6 +1,8 @@
-from pandas import DataFrame
-from bs4 import BeautifulSoup
-from .Attendance import getCourseNames
+from .Attendance import getCourseNamesAsync
+from .Parsing import parseDocument, findFirst, hasClass, text
+from .Metrics import timed
+from .PortalUrls import portalUrl
+from .Records import ExamRecord
 import re
 from datetime import datetime
 import logging
@@ -9,72 +11,87 @@ import os
 # Setup logging
 logger = logging.getLogger("nimora-api")
 
-def getExamSchedule(session):
+SCHEDULE_PAGE_URL = portalUrl("/studzone/ContinuousAssessment/CATestTimeTable")
+
+async def getExamScheduleAsync(client):
     #Get the exam schedule page
-    schedule_page_url = "https://ecampus.psgtech.ac.in/studzone/ContinuousAssessment/CATestTimeTable"
-    schedule_page = session.get(schedule_page_url)
+    schedule_page = await client.get(SCHEDULE_PAGE_URL)
+
+    exams = findExamContainers(schedule_page.text)
+    if not exams:
+        return []
+
+    #Map the course codes with course initials and store in list of records
+    course_map = await getCourseNamesAsync(client)
+
+    return buildExamSchedule(exams, course_map)
 
+@timed("parse:exam_schedule")
+def findExamContainers(html):
+    """Return the html element of each exam on the schedule page, or an empty list"""
     #Get the html of the page
-    schedule_page_soup = BeautifulSoup(schedule_page.text , "lxml")
+    schedule_page = parseDocument(html)
 
     # Save HTML for debugging (optional)
-    # saveHtmlForDebugging(schedule_page.text, "exam_schedule_debug.html")
+    # saveHtmlForDebugging(html, "exam_schedule_debug.html")
 
     #Check for presence of schedule content
-    content_flag = schedule_page_soup.find("div",{"class":"Test-card"})
+    content_flag = findFirst(schedule_page, f"//div[{hasClass('Test-card')}]")
 
     if content_flag is None:
         logger.warning("No Test-card div found on the page")
         # Try alternative selectors
-        content_flag = schedule_page_soup.find("div",{"class":"test-card"})
+        content_flag = findFirst(schedule_page, f"//div[{hasClass('test-card')}]")
         if content_flag is None:
-            content_flag = schedule_page_soup.find("div",{"class":"exam-card"})
+            content_flag = findFirst(schedule_page, f"//div[{hasClass('exam-card')}]")
         if content_flag is None:
-            content_flag = schedule_page_soup.find("table")
+            content_flag = findFirst(schedule_page, "//table")
         if content_flag is None:
             logger.error("No exam content found on the page")
             return []
 
     #Get the html of each exam's content - try multiple selectors
-    exams_soup = schedule_page_soup.find_all("div",{"class":"text-left"})
+    exams = schedule_page.xpath(f"//div[{hasClass('text-left')}]")
     
-    if not exams_soup:
+    if not exams:
         # Try alternative selectors
-        exams_soup = schedule_page_soup.find_all("div",{"class":"exam-item"})
-    if not exams_soup:
-        exams_soup = schedule_page_soup.find_all("tr")
-    if not exams_soup:
-        exams_soup = schedule_page_soup.find_all("div",{"class":"card"})
+        exams = schedule_page.xpath(f"//div[{hasClass('exam-item')}]")
+    if not exams:
+        exams = schedule_page.xpath("//tr")
+    if not exams:
+        exams = schedule_page.xpath(f"//div[{hasClass('card')}]")
 
     # Check if we found any exams
-    if not exams_soup:
+    if not exams:
         logger.warning("No exam containers found on the page")
         return []
 
-    logger.info(f"Found {len(exams_soup)} exam containers")
+    logger.info(f"Found {len(exams)} exam containers")
 
+    return exams
+
+@timed("parse:exam_schedule")
+def buildExamSchedule(exams, course_map):
+    """Extract course, date and time of each exam into a list of exam records"""
     #Extract exam details and append the records to a list
     schedule_data = []
 
-    #Map the course codes with course initials and store in list of records
-    course_map = getCourseNames(session)
-
     #Get the required details of each courses' exam
-    for i, exam in enumerate(exams_soup):
+    for i, exam in enumerate(exams):
         # logger.info(f"Processing exam {i+1}")
         
         #Get the html contents of each exam - try multiple selectors
-        exam_contents = exam.find_all("span",{"class":"sol"})
+        exam_contents = exam.xpath(f".//span[{hasClass('sol')}]")
         
         if not exam_contents:
             # Try alternative selectors
-            exam_contents = exam.find_all("td")
+            exam_contents = exam.xpath(".//td")
         if not exam_contents:
-            exam_contents = exam.find_all("div",{"class":"exam-detail"})
+            exam_contents = exam.xpath(f".//div[{hasClass('exam-detail')}]")
         if not exam_contents:
-            exam_contents = exam.find_all("span")
+            exam_contents = exam.xpath(".//span")
         if not exam_contents:
-            exam_contents = exam.find_all("p")
+            exam_contents = exam.xpath(".//p")
         
         # logger.info(f"Found {len(exam_contents)} content elements")
         
@@ -89,23 +106,23 @@ def getExamSchedule(session):
         
         # Look for course code (usually first element)
         if exam_contents:
-            course_code = exam_contents[0].text.strip()
+            course_code = text(exam_contents[0]).strip()
             if course_code.startswith(':'):
                 course_code = course_code[1:].strip()
         
         # Look for date and time in the remaining elements
         for content in exam_contents[1:]:
-            text = content.text.strip()
-            if text.startswith(':'):
-                text = text[1:].strip()
+            content_text = text(content).strip()
+            if content_text.startswith(':'):
+                content_text = content_text[1:].strip()
             
             # Try to identify if this is a date
-            if isDate(text):
-                date_str = text
+            if isDate(content_text):
+                date_str = content_text
                 # logger.info(f"Found date: '{date_str}'")
             # Try to identify if this is a time
-            elif isTime(text):
-                time_str = text
+            elif isTime(content_text):
+                time_str = content_text
                 # logger.info(f"Found time: '{time_str}'")
         
         # If we couldn't find date/time, try alternative approach
@@ -113,11 +130,11 @@ def getExamSchedule(session):
             # Try to extract from specific positions
             if len(exam_contents) >= 3:
                 if not date_str:
-                    date_str = exam_contents[2].text.strip()
+                    date_str = text(exam_contents[2]).strip()
                     if date_str.startswith(':'):
                         date_str = date_str[1:].strip()
                 if len(exam_contents) >= 5 and not time_str:
-                    time_str = exam_contents[4].text.strip()
+                    time_str = text(exam_contents[4]).strip()
                     if time_str.startswith(':'):
                         time_str = time_str[1:].strip()
         
@@ -125,21 +142,22 @@ def getExamSchedule(session):
         if not date_str or not time_str:
             # Look for date/time by searching for labels
             for content in exam_contents:
-                text = content.text.strip().lower()
-                if 'date' in text or 'day' in text:
+                content_text = text(content)
+                label = content_text.strip().lower()
+                if 'date' in label or 'day' in label:
                     # Extract the actual date from this element or next element
-                    date_match = re.search(r'(\d{1,2}[/\-\.]\d{1,2}[/\-\.]\d{2,4})', content.text)
+                    date_match = re.search(r'(\d{1,2}[/\-\.]\d{1,2}[/\-\.]\d{2,4})', content_text)
                     if date_match:
                         date_str = date_match.group(1)
-                elif 'time' in text:
+                elif 'time' in label:
                     # Extract the actual time from this element or next element
-                    time_match = re.search(r'(\d{1,2}:\d{2})', content.text)
+                    time_match = re.search(r'(\d{1,2}:\d{2})', content_text)
                     if time_match:
                         time_str = time_match.group(1)
         
         # If still no date/time, try to extract from the entire exam container
         if not date_str or not time_str:
-            exam_text = exam.get_text()
+            exam_text = text(exam)
             # Look for date patterns in the entire exam text
             date_matches = re.findall(r'(\d{1,2}[/\-\.]\d{1,2}[/\-\.]\d{2,4})', exam_text)
             if date_matches:
@@ -168,9 +186,8 @@ def getExamSchedule(session):
             logger.warning(f"Could not parse date: '{date_str}'")
             continue
         
-        # Create the row
-        row = [course_code, formatted_date, time_str]
-        schedule_data.append(row)
+        # Create the record
+        schedule_data.append(ExamRecord(course_code, formatted_date, time_str))
         # logger.info(f"Added exam: {course_code} on {formatted_date} at {time_str}")
 
     # If no valid data was found, return empty list
@@ -178,14 +195,8 @@ def getExamSchedule(session):
         logger.warning("No valid exam data found")
         return []
 
-    #Set the dataframe headers
-    df_headers = ["COURSE_CODE","DATE","TIME"]
-
-    #Create and return a dataframe
-    df = DataFrame(schedule_data, columns = df_headers)
-    
-    logger.info(f"Returning {len(df)} exams")
-    return df
+    logger.info(f"Returning {len(schedule_data)} exams")
+    return schedule_data
 
 def saveHtmlForDebugging(html_content, filename):
     """Save HTML content to a file for debugging"""